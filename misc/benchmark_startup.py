@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the startup time of snsxt
+
+Runs ``snsxt/run.py --profile-startup`` several times, summarizes the per-phase and per-import timings from the JSON files it writes, and appends the summary to a history file so that startup times can be tracked over time. The summary is compared against the previous entry in the history file.
+
+Examples
+--------
+Example usage::
+
+    snsxt$ misc/benchmark_startup.py -n 5 -t task_lists/none.yml
+    snsxt$ misc/benchmark_startup.py -n 5 -t task_lists/default.yml -d snsxt/fixtures/sns_output/sns_analysis1
+
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import shutil
+import subprocess
+import collections
+
+scriptdir = os.path.dirname(os.path.realpath(__file__))
+snsxt_parent_dir = os.path.dirname(scriptdir)
+run_script = os.path.join(snsxt_parent_dir, 'snsxt', 'run.py')
+default_analysis_dir = os.path.join(snsxt_parent_dir, 'snsxt', 'fixtures', 'sns_output', 'sns_analysis1')
+default_task_list = os.path.join(snsxt_parent_dir, 'task_lists', 'none.yml')
+default_history_file = os.path.join(snsxt_parent_dir, 'logs', 'startup_benchmark.jsonl')
+
+
+def median(values):
+    """
+    Returns the median of a list of numbers
+    """
+    values = sorted(values)
+    if not values:
+        return(None)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return(values[middle])
+    return((values[middle - 1] + values[middle]) / 2.0)
+
+def git_commit():
+    """
+    Returns the current git commit of the repo, or ``None``
+    """
+    try:
+        return(subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd = snsxt_parent_dir).strip().decode('utf-8'))
+    except (subprocess.CalledProcessError, OSError):
+        return(None)
+
+def run_profiles(num_runs, analysis_dir, task_list_file):
+    """
+    Runs the program startup profile the given number of times
+
+    Returns
+    -------
+    list
+        a list of the profile dictionaries loaded from the JSON output of each run
+    """
+    profiles = []
+    tmpdir = tempfile.mkdtemp(prefix = 'snsxt_startup_')
+    try:
+        for i in range(num_runs):
+            output_file = os.path.join(tmpdir, 'startup.{0}.json'.format(i))
+            command = [sys.executable, run_script, '-d', analysis_dir, '-t', task_list_file, '--profile-startup', output_file]
+            start = time.time()
+            with open(os.devnull, 'w') as devnull:
+                subprocess.check_call(command, cwd = snsxt_parent_dir, stdout = devnull)
+            elapsed = time.time() - start
+            with open(output_file) as f:
+                profile = json.load(f)
+            # include interpreter startup, which the program can not time itself
+            profile['process'] = elapsed
+            profiles.append(profile)
+    finally:
+        shutil.rmtree(tmpdir)
+    return(profiles)
+
+def summarize(profiles, top_imports = 15):
+    """
+    Summarizes the timings from several profiles by their median
+
+    Returns
+    -------
+    dict
+        a dictionary with the median process, total, per-phase, and per-import times
+    """
+    summary = collections.OrderedDict()
+    summary['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    summary['hostname'] = socket.gethostname()
+    summary['commit'] = git_commit()
+    summary['runs'] = len(profiles)
+    summary['process'] = median([p['process'] for p in profiles])
+    summary['total'] = median([p['total'] for p in profiles])
+
+    phases = collections.OrderedDict()
+    for profile in profiles:
+        for name, value in profile['phases'].items():
+            phases.setdefault(name, []).append(value)
+    summary['phases'] = collections.OrderedDict([(name, median(values)) for name, values in phases.items()])
+
+    imports = collections.defaultdict(list)
+    for profile in profiles:
+        for name, value in profile['imports'].items():
+            imports[name].append(value)
+    slowest = sorted([(median(values), name) for name, values in imports.items()], reverse = True)[:top_imports]
+    summary['imports'] = collections.OrderedDict([(name, value) for value, name in slowest])
+    return(summary)
+
+def load_last_entry(history_file):
+    """
+    Returns the last summary saved in the history file, or ``None``
+    """
+    if not os.path.exists(history_file):
+        return(None)
+    last = None
+    with open(history_file) as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return(last)
+
+def print_summary(summary, previous = None):
+    """
+    Prints the summary, with the change from the previous summary if one was passed
+    """
+    def line(name, value, old_value):
+        change = ''
+        if old_value:
+            change = '{0:+.1f}%'.format(100.0 * (value - old_value) / old_value)
+        print('{0:<40} {1:>9.3f}s {2:>9}'.format(name, value, change))
+
+    previous = previous or {}
+    print('snsxt startup benchmark; {0} runs, commit {1}'.format(summary['runs'], summary['commit']))
+    line('process', summary['process'], previous.get('process', None))
+    line('total', summary['total'], previous.get('total', None))
+    print('\nphases:')
+    for name, value in summary['phases'].items():
+        line(name, value, previous.get('phases', {}).get(name, None))
+    print('\nslowest imports:')
+    for name, value in summary['imports'].items():
+        line(name, value, previous.get('imports', {}).get(name, None))
+
+def main(**kwargs):
+    """
+    Main control function for the script
+    """
+    num_runs = kwargs.pop('num_runs')
+    analysis_dir = kwargs.pop('analysis_dir')
+    task_list_file = kwargs.pop('task_list_file')
+    history_file = kwargs.pop('history_file')
+
+    profiles = run_profiles(num_runs = num_runs, analysis_dir = analysis_dir, task_list_file = task_list_file)
+    summary = summarize(profiles)
+    summary['task_list_file'] = os.path.relpath(task_list_file, snsxt_parent_dir)
+
+    previous = load_last_entry(history_file)
+    print_summary(summary, previous = previous)
+
+    if history_file:
+        with open(history_file, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+def parse():
+    """
+    Parses the script args
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of snsxt')
+    parser.add_argument('-n', '--num_runs', dest = 'num_runs', type = int, default = 5, help = 'Number of times to run the program')
+    parser.add_argument('-d', '--analysis_dir', dest = 'analysis_dir', default = default_analysis_dir, help = 'Analysis directory to pass to the program')
+    parser.add_argument('-t', '--task-list', dest = 'task_list_file', default = default_task_list, help = 'Task list file to pass to the program')
+    parser.add_argument('--history', dest = 'history_file', default = default_history_file, help = 'JSON lines file to append the benchmark summary to')
+    args = parser.parse_args()
+    main(**vars(args))
+
+if __name__ == "__main__":
+    parse()
@@ -21,3 +21,18 @@ analysis_dir="/ifs/data/molecpathlab/NGS580_WES"
 
 # name of the symlink to create to the fastq dir for an analysis
 fastq_linkname="fastq"
+
+# path to a local clone or worktree of the snsxt repo to clone new analyses from instead of the snsxt_repo_URL; leave empty to clone from the URL
+snsxt_local_repo=""
+
+# number of analyses to prepare at the same time when deploying several sequencer runs
+deploy_threads=4
+
+# directory to keep local bare mirrors of the snsxt repo and its submodules in; new analyses are checked out from the mirrors, sharing their objects. Leave empty to clone from the snsxt_repo_URL
+snsxt_mirror_dir=""
+
+# which files to track in the git repo created in a new analysis dir; 'manifest' to only track the files matching git_track_patterns, or 'all' to track every file
+git_mode="manifest"
+
+# comma-delimited string of .gitignore patterns, relative to the analysis dir, for the files to track in 'manifest' git_mode
+git_track_patterns="*.csv,*.xml,*.yml,*.yaml,*.txt,*.json"
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Collects SGE accounting data for the qsub jobs of a run, and summarizes the resources used by each task
+
+All the accounting records for the user since the run started are read with a single ``qacct`` call and filtered down to the job IDs submitted by the run, instead of calling ``qacct -j`` once per job. The job IDs, and the task and sample each job belongs to, come from the ``metrics`` records of the run.
+
+Two tables are written to the analysis dir: one row per job with its queue wait, wall clock, CPU time, maximum virtual memory, and I/O; and a per-task summary with the percentiles of each of these, to help set the resources requested for each task. Jobs far above the other jobs of the same task are flagged as outliers.
+
+Examples
+--------
+Example usage::
+
+    snsxt$ snsxt/accounting.py -d /path/to/analysis_dir -m logs/run.py.2018-01-01-12-00-00.metrics.jsonl
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import re
+import sys
+import json
+import time
+import getpass
+import argparse
+import subprocess
+import collections
+import job_packing
+
+# ~~~~~ GLOBALS ~~~~~ #
+job_fields = ['job_id', 'job_name', 'task', 'sample', 'hostname', 'failed', 'exit_status', 'wait_time', 'wallclock', 'cpu', 'maxvmem', 'io', 'outlier']
+"""
+Columns of the per-job accounting table
+"""
+
+summary_metrics = ['wait_time', 'wallclock', 'cpu', 'maxvmem', 'io']
+"""
+Per-job values that are summarized for each task
+"""
+
+percentiles = [50, 90, 99]
+
+_memory_units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+_qacct_time_format = '%a %b %d %H:%M:%S %Y'
+
+_number_pattern = re.compile(r'[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?')
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def parse_memory(value):
+    """
+    Converts a ``qacct`` memory value such as ``'1.234G'`` to bytes
+
+    Returns
+    -------
+    float or None
+        the number of bytes, or ``None`` if the value could not be parsed
+    """
+    value = value.strip()
+    unit = ''
+    if value and value[-1].upper() in _memory_units:
+        unit = value[-1].upper()
+        value = value[:-1]
+    try:
+        return(float(value) * _memory_units[unit])
+    except ValueError:
+        return(None)
+
+def parse_time(value):
+    """
+    Converts a ``qacct`` date such as ``'Tue Feb 13 10:00:00 2018'`` to seconds since the epoch
+
+    Returns
+    -------
+    float or None
+        the time, or ``None`` if the value could not be parsed
+    """
+    try:
+        return(time.mktime(time.strptime(value.strip(), _qacct_time_format)))
+    except ValueError:
+        return(None)
+
+def parse_float(value):
+    """
+    Converts a ``qacct`` number to a float, ignoring any trailing unit or text; e.g. newer SGE versions report times as ``'100.000s'``
+
+    Returns
+    -------
+    float or None
+        the number, or ``None`` if the value could not be parsed
+    """
+    match = _number_pattern.match(value.strip())
+    if not match:
+        return(None)
+    return(float(match.group(0)))
+
+def iter_qacct_records(lines):
+    """
+    Parses the output of ``qacct -j`` into one dictionary per job record
+
+    Parameters
+    ----------
+    lines: iterable
+        the lines of ``qacct`` output; records are separated by lines of ``=`` characters
+
+    Yields
+    ------
+    dict
+        the ``qacct`` fields for a job record
+    """
+    record = {}
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.startswith('====='):
+            if record:
+                yield(record)
+            record = {}
+            continue
+        parts = line.split(None, 1)
+        if len(parts) == 2:
+            record[parts[0]] = parts[1].strip()
+    if record:
+        yield(record)
+
+def get_job_info(metrics_records):
+    """
+    Gets the task and sample of every qsub job submitted in a run, from the run's metrics records
+
+    Parameters
+    ----------
+    metrics_records: list
+        records made by ``metrics.record()``
+
+    Returns
+    -------
+    dict
+        a dictionary in the format ``{job_id: {'task': task, 'sample': sample, 'timestamp': submit_time}}``
+    """
+    jobs = collections.OrderedDict()
+    for record in metrics_records:
+        if record.get('event', None) == 'submit' and record.get('job_id', None):
+            jobs[str(record['job_id'])] = {'task': record.get('task', None), 'sample': record.get('sample', None), 'timestamp': record.get('timestamp', None)}
+    return(jobs)
+
+def load_metrics_file(metrics_file):
+    """
+    Loads the records from a metrics JSON lines file
+
+    Returns
+    -------
+    list
+        the records
+    """
+    records = []
+    with open(metrics_file) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return(records)
+
+def collect(jobs, begin_time = None, owner = None, qacct_command = 'qacct'):
+    """
+    Gets the accounting data for a set of jobs with a single ``qacct`` call
+
+    Parameters
+    ----------
+    jobs: dict
+        a dictionary in the format ``{job_id: {'task': task, 'sample': sample}}``, see ``get_job_info()``
+    begin_time: float
+        only read accounting records for jobs started after this time; defaults to one hour before the earliest submission in ``jobs``
+    owner: str
+        only read accounting records for jobs owned by this user; defaults to the current user
+    qacct_command: str
+        the ``qacct`` executable
+
+    Returns
+    -------
+    list
+        a list of dictionaries with the keys in ``job_fields``; array jobs have one row per task
+    """
+    if not jobs:
+        return([])
+    if begin_time is None:
+        submit_times = [job['timestamp'] for job in jobs.values() if job.get('timestamp', None)]
+        begin_time = min(submit_times) - 3600 if submit_times else time.time() - 86400
+    owner = owner or getpass.getuser()
+    command = [qacct_command, '-o', owner, '-b', time.strftime('%Y%m%d%H%M', time.localtime(begin_time)), '-j']
+    logger.debug('Collecting accounting data: {0}'.format(' '.join(command)))
+
+    rows = []
+    # read stdout and stderr together, so that neither pipe fills up and blocks qacct
+    proc = subprocess.Popen(command, stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True)
+    stdout, stderr = proc.communicate()
+    for record in iter_qacct_records(stdout.splitlines()):
+        job_id = record.get('jobnumber', None)
+        if job_id not in jobs:
+            continue
+        qsub_time = parse_time(record.get('qsub_time', ''))
+        start_time = parse_time(record.get('start_time', ''))
+        wait_time = None
+        if qsub_time and start_time:
+            wait_time = start_time - qsub_time
+        row = collections.OrderedDict()
+        row['job_id'] = job_id if record.get('taskid', 'undefined') == 'undefined' else '{0}.{1}'.format(job_id, record['taskid'])
+        row['job_name'] = record.get('jobname', None)
+        row['task'] = jobs[job_id].get('task', None)
+        row['sample'] = jobs[job_id].get('sample', None)
+        row['hostname'] = record.get('hostname', None)
+        row['failed'] = record.get('failed', '').split(' ')[0] or None
+        row['exit_status'] = record.get('exit_status', '').split(' ')[0] or None
+        row['wait_time'] = wait_time
+        row['wallclock'] = parse_float(record.get('ru_wallclock', ''))
+        row['cpu'] = parse_float(record.get('cpu', ''))
+        row['maxvmem'] = parse_memory(record.get('maxvmem', ''))
+        row['io'] = parse_float(record.get('io', ''))
+        row['outlier'] = ''
+        rows.append(row)
+    if proc.returncode != 0:
+        logger.warning('qacct did not complete successfully: {0}'.format(stderr.strip()))
+    missing = set(jobs) - set(row['job_id'].split('.')[0] for row in rows)
+    if missing:
+        logger.warning('No accounting data was found for {0} jobs: {1}'.format(len(missing), sorted(missing)))
+    return(rows)
+
+def percentile(values, pct):
+    """
+    Gets a percentile of a list of numbers, interpolating between the closest ranks
+
+    Parameters
+    ----------
+    values: list
+        the numbers
+    pct: float
+        the percentile, between 0 and 100
+
+    Returns
+    -------
+    float or None
+        the percentile, or ``None`` if no values were passed
+    """
+    values = sorted(values)
+    if not values:
+        return(None)
+    rank = (len(values) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return(values[lower] + (values[upper] - values[lower]) * (rank - lower))
+
+def flag_outliers(rows, metric_names = ('wallclock', 'maxvmem')):
+    """
+    Marks the jobs whose wall clock or memory use is far above the other jobs of the same task (above the third quartile plus 1.5 times the interquartile range) in their ``outlier`` column
+
+    Parameters
+    ----------
+    rows: list
+        rows returned by ``collect()``
+    metric_names: list
+        the per-job values to check
+    """
+    rows_by_task = collections.defaultdict(list)
+    for row in rows:
+        rows_by_task[row['task']].append(row)
+    for task_rows in rows_by_task.values():
+        # too few jobs to tell what is unusual
+        if len(task_rows) < 4:
+            continue
+        for name in metric_names:
+            values = [row[name] for row in task_rows if row[name] is not None]
+            q1 = percentile(values, 25)
+            q3 = percentile(values, 75)
+            if q1 is None:
+                continue
+            limit = q3 + 1.5 * (q3 - q1)
+            for row in task_rows:
+                if row[name] is not None and row[name] > limit:
+                    row['outlier'] = ','.join([item for item in [row['outlier'], name] if item])
+
+def summarize(rows):
+    """
+    Gets the percentiles of the resources used by the jobs of each task
+
+    Parameters
+    ----------
+    rows: list
+        rows returned by ``collect()``
+
+    Returns
+    -------
+    list
+        a list of dictionaries, one per task, with the number of jobs, failed jobs, and outliers, and the percentiles and maximum of each of the ``summary_metrics``
+    """
+    rows_by_task = collections.OrderedDict()
+    for row in rows:
+        rows_by_task.setdefault(row['task'], []).append(row)
+    summary = []
+    for task, task_rows in rows_by_task.items():
+        item = collections.OrderedDict()
+        item['task'] = task
+        item['jobs'] = len(task_rows)
+        item['failed'] = len([row for row in task_rows if row['failed'] not in (None, '0') or row['exit_status'] not in (None, '0')])
+        item['outliers'] = ','.join(sorted(set([str(row['sample'] or row['job_id']) for row in task_rows if row['outlier']])))
+        for name in summary_metrics:
+            values = [row[name] for row in task_rows if row[name] is not None]
+            for pct in percentiles:
+                item['{0}_p{1}'.format(name, pct)] = percentile(values, pct)
+            item['{0}_max'.format(name)] = max(values) if values else None
+        summary.append(item)
+    return(summary)
+
+def write_table(rows, output_file, fields = None):
+    """
+    Writes a list of dictionaries to a tab-separated file
+
+    Parameters
+    ----------
+    rows: list
+        the rows to write
+    output_file: str
+        path to the file
+    fields: list
+        the columns to write; defaults to the keys of the first row
+    """
+    if fields is None:
+        fields = list(rows[0].keys()) if rows else []
+    with open(output_file, 'w') as f:
+        f.write('\t'.join(fields) + '\n')
+        for row in rows:
+            values = []
+            for field in fields:
+                value = row.get(field, None)
+                if value is None:
+                    value = 'NA'
+                elif isinstance(value, float):
+                    value = '{0:.2f}'.format(value)
+                values.append(str(value))
+            f.write('\t'.join(values) + '\n')
+    return(output_file)
+
+def accounting_report(analysis_dir, metrics_records, jobs_file = 'snsxt_accounting.tsv', summary_file = 'snsxt_accounting_summary.tsv'):
+    """
+    Collects the accounting data for all the qsub jobs of a run and writes the per-job and per-task tables to the analysis dir
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis dir
+    metrics_records: list
+        the run's records made by ``metrics.record()``
+    jobs_file: str
+        name of the per-job table file
+    summary_file: str
+        name of the per-task summary table file
+
+    Returns
+    -------
+    tuple
+        the paths to the per-job and per-task tables, or ``None`` if the run did not submit any jobs
+    """
+    jobs = get_job_info(metrics_records)
+    if not jobs:
+        logger.debug('No qsub jobs were submitted; skipping accounting report')
+        return(None)
+    rows = collect(jobs = jobs)
+    # the commands that job_packing submitted as jobs of their own only have their durations recorded here
+    job_packing.record_accounting_durations(rows)
+    flag_outliers(rows)
+    jobs_path = write_table(rows, os.path.join(analysis_dir, jobs_file), fields = job_fields)
+    summary_path = write_table(summarize(rows), os.path.join(analysis_dir, summary_file))
+    logger.info('qsub job accounting saved to files:\n{0}\n{1}'.format(jobs_path, summary_path))
+    return((jobs_path, summary_path))
+
+def main(**kwargs):
+    """
+    Main control function for the script
+    """
+    analysis_dir = kwargs.pop('analysis_dir')
+    metrics_file = kwargs.pop('metrics_file')
+    accounting_report(analysis_dir = analysis_dir, metrics_records = load_metrics_file(metrics_file))
+
+def parse():
+    """
+    Parses the script args
+    """
+    parser = argparse.ArgumentParser(description = 'Collect SGE accounting data for the qsub jobs of an snsxt run')
+    parser.add_argument('-d', '--analysis_dir', dest = 'analysis_dir', required = True, help = 'Analysis dir to save the accounting tables to')
+    parser.add_argument('-m', '--metrics', dest = 'metrics_file', required = True, help = 'The run.py metrics JSON lines file listing the qsub jobs of the run')
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, stream = sys.stdout, format = '%(message)s')
+    main(**vars(args))
+
+if __name__ == "__main__":
+    parse()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Writes log records to their files in a background thread
+
+The program's log files (``run.logpath()`` and ``run.email_logpath()``) are passed to every task, sample, and job as the ``extra_handlers``, and in debug mode every qsub submission logs its whole command, stdout, and stderr. With plain ``logging.FileHandler``'s, each of these lines is written and flushed to the network file system in the thread that logged it, which slows down job submission.
+
+``AsyncHandler`` wraps a handler, and only puts the records on a queue in the thread that logged them. A single listener thread formats them and writes them to their handlers' files, flushing each file once per batch of records instead of once per record. The Python 2 ``logging`` module does not have ``QueueHandler`` and ``QueueListener``, so they are implemented here.
+
+- records of level ``ERROR`` and above are written before the logging call returns, so they are in the file if the program crashes right after
+- the queue is written out when the program exits (``atexit``) and when ``flush()`` is called, e.g. before the log file is emailed
+- in a child process forked from the program (e.g. by a ``multiprocessing`` pool), which does not have the listener thread, records are written directly to the file, as a plain handler would
+
+Examples
+--------
+Example usage::
+
+    import async_logging
+    handler = async_logging.AsyncHandler(logging.FileHandler('run.log'))
+    logger.addHandler(handler)
+    ...
+    async_logging.flush()
+
+"""
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import copy
+import time
+import atexit
+import logging
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+# ~~~~~ GLOBALS ~~~~~ #
+batch_size = 500
+"""
+Maximum number of records written before the files are flushed
+"""
+
+flush_interval = 0.5
+"""
+Maximum seconds that records wait in the listener before the files are flushed
+"""
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def get_listener():
+    """
+    Gets the listener that writes the records of all the ``AsyncHandler``'s in this process, starting it if needed
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is None or _listener.pid != os.getpid():
+            _listener = QueueListener()
+            _listener.start()
+    return(_listener)
+
+def flush(timeout = 30):
+    """
+    Waits until all of the queued records have been written and flushed to their files
+
+    Parameters
+    ----------
+    timeout: int
+        maximum seconds to wait
+    """
+    if _listener is not None and _listener.pid == os.getpid():
+        _listener.flush(timeout = timeout)
+
+def stop():
+    """
+    Writes all queued records and stops the listener thread; a new one is started if more records are logged
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None and _listener.pid == os.getpid():
+            _listener.stop()
+        _listener = None
+
+atexit.register(stop)
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class QueueListener(object):
+    """
+    Background thread that writes the records queued by the ``AsyncHandler``'s to their target handlers
+    """
+    _stop = object()
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target = self._run, name = 'async_logging')
+        # do not keep the program running; the queue is written out at exit by `stop()`
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, handler, record):
+        self.queue.put((handler, record))
+
+    def flush(self, timeout = 30):
+        """
+        Waits until the records queued so far are written and flushed
+        """
+        done = threading.Event()
+        self.queue.put((None, done))
+        done.wait(timeout)
+
+    def stop(self, timeout = 30):
+        if self.thread and self.thread.is_alive():
+            self.queue.put((None, self._stop))
+            self.thread.join(timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            # wait for a record, then take everything else that is queued, up to the batch size or flush interval
+            items = [self.queue.get()]
+            deadline = time.time() + flush_interval
+            while len(items) < batch_size:
+                try:
+                    items.append(self.queue.get(timeout = max(0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            handlers = set()
+            events = []
+            for handler, record in items:
+                if handler is None:
+                    if record is self._stop:
+                        running = False
+                    else:
+                        events.append(record)
+                    continue
+                handler.write(record)
+                handlers.add(handler)
+            for handler in handlers:
+                handler.flush_target()
+            for event in events:
+                event.set()
+
+
+class AsyncHandler(logging.Handler):
+    """
+    Logging handler that passes its records to a target handler in a background thread
+
+    The level and formatter are set on this handler, e.g. by the ``logging.yml`` config; the target's are not used. Records to a ``logging.StreamHandler`` (which includes ``logging.FileHandler``) are written to its stream, and flushed once per batch; records to other handlers are passed to their ``handle()`` method.
+
+    Attributes
+    ----------
+    target: logging.Handler
+        the handler that writes the records
+    """
+    def __init__(self, target, level = logging.NOTSET):
+        logging.Handler.__init__(self, level = level)
+        self.target = target
+        self.pid = os.getpid()
+        self._fork_child = False
+
+    @property
+    def baseFilename(self):
+        # the path to the log file, for code that looks for the file of a FileHandler
+        return(getattr(self.target, 'baseFilename', None))
+
+    def prepare(self, record):
+        """
+        Copies a record with its message and traceback resolved to text, so later changes to its args do not change it; the original record is still passed to the logger's other handlers
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return(record)
+
+    def handle(self, record):
+        if os.getpid() != self.pid:
+            # forked child process without the listener thread; the locks may have been held by a parent thread when it forked
+            self.pid = os.getpid()
+            self.createLock()
+            self.target.createLock()
+            self._fork_child = True
+        return(logging.Handler.handle(self, record))
+
+    def emit(self, record):
+        try:
+            if self._fork_child:
+                self.write(record)
+                self.flush_target()
+                return()
+            listener = get_listener()
+            listener.put(self, self.prepare(record))
+            if record.levelno >= logging.ERROR:
+                listener.flush()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def write(self, record):
+        """
+        Writes a record to the target; called by the listener thread
+        """
+        try:
+            if isinstance(self.target, logging.StreamHandler):
+                message = self.format(record)
+                with_lock = self.target.lock
+                if with_lock:
+                    with_lock.acquire()
+                try:
+                    if self.target.stream is None:
+                        # FileHandler opened with delay = True
+                        self.target.stream = self.target._open()
+                    self.target.stream.write(message + '\n')
+                finally:
+                    if with_lock:
+                        with_lock.release()
+            else:
+                self.target.handle(record)
+        except Exception:
+            self.handleError(record)
+
+    def flush_target(self):
+        try:
+            self.target.flush()
+        except Exception:
+            pass
+
+    def flush(self):
+        flush()
+
+    def close(self):
+        flush()
+        self.target.close()
+        logging.Handler.close(self)
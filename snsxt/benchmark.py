@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the program's own overhead on synthetic analyses of different sizes
+
+For each number of samples, a synthetic ``sns`` analysis directory is generated with ``synthetic_analysis``, and the tasks are run on it with ``run_tasks.run_tasks()`` and the ``dry-run`` executor, so no jobs are run and only the time spent by the program itself is measured. Each size is run in its own process, so that the caches and the memory use of one run do not affect the next.
+
+For each run, the report has:
+
+- the wall time of the whole run, and the number of jobs submitted
+- the number of calls to ``os.stat()``, ``os.lstat()``, ``os.listdir()``, ``os.scandir()``, and ``open()``, and the read and write system calls from ``/proc/self/io`` (Linux only)
+- the maximum resident memory, CPU time, and context switches of the process
+- the time spent in each phase of each task, from the ``metrics`` records
+
+The report is printed and saved to a JSON file. If a report from an earlier run is passed as the ``--baseline``, runs that got slower, made more calls, or used more memory than the baseline by more than the ``--tolerance`` are listed, and the script exits with status 1, so it can be used to catch regressions in the task framework.
+
+Examples
+--------
+Example usage::
+
+    snsxt$ snsxt/benchmark.py -n 10 100 1000 -o benchmark.json
+    snsxt$ snsxt/benchmark.py -n 10 100 1000 --baseline benchmark.json
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import subprocess
+import collections
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+import synthetic_analysis
+import job_management
+import run_tasks
+import metrics
+
+# ~~~~~ GLOBALS ~~~~~ #
+default_sample_counts = [10, 100, 1000]
+
+default_tasks = ['DemoQsubSampleTask', 'DemoQsubAnalysisTask', 'GATKDepthOfCoverageCustom', 'BamCoverage', 'Delly2', 'MuTect2Split']
+"""
+Tasks run on each synthetic analysis
+"""
+
+counted_calls = ['stat', 'lstat', 'listdir', 'scandir']
+"""
+Functions of the ``os`` module whose calls are counted; calls to the builtin ``open()`` are counted too
+"""
+
+compared_values = ['wall_time', 'file_calls', 'syscr', 'syscw', 'max_rss']
+"""
+Values of each run that are compared to the baseline
+"""
+
+min_wall_time_difference = 0.5
+"""
+Differences in wall time from the baseline smaller than this many seconds are not regressions, since short runs vary too much
+"""
+
+scriptpath = os.path.realpath(__file__)
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class CallCounter(object):
+    """
+    Context manager that counts the calls made to the ``counted_calls`` functions and ``open()`` inside it, from any module
+
+    Examples
+    --------
+    Example usage::
+
+        with CallCounter() as calls:
+            os.listdir('.')
+        calls['listdir']
+
+    """
+    def __init__(self):
+        self.counts = collections.OrderedDict([(name, 0) for name in counted_calls + ['open']])
+        self._originals = {}
+
+    def _wrap(self, name, function):
+        counts = self.counts
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            return(function(*args, **kwargs))
+        return(counted)
+
+    def __enter__(self):
+        for name in counted_calls:
+            if hasattr(os, name):
+                self._originals[name] = getattr(os, name)
+                setattr(os, name, self._wrap(name, self._originals[name]))
+        self._originals['open'] = builtins.open
+        builtins.open = self._wrap('open', self._originals['open'])
+        return(self.counts)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        builtins.open = self._originals.pop('open')
+        for name, function in self._originals.items():
+            setattr(os, name, function)
+        self._originals = {}
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def read_proc_io():
+    """
+    Reads the I/O counters of this process from ``/proc/self/io``
+
+    Returns
+    -------
+    dict
+        the counters, e.g. ``syscr`` and ``syscw`` for the number of read and write system calls; empty if the file is not available
+    """
+    counters = {}
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                name, value = line.split(':')
+                counters[name.strip()] = int(value)
+    except (IOError, OSError, ValueError):
+        pass
+    return(counters)
+
+def get_rusage():
+    """
+    Gets the resources used by this process so far
+
+    Returns
+    -------
+    dict
+        the maximum resident memory in bytes, the user and system CPU time in seconds, and the voluntary and involuntary context switches
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # kilobytes on Linux, bytes on macOS
+    max_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return({'max_rss': max_rss, 'user_time': usage.ru_utime, 'system_time': usage.ru_stime,
+            'voluntary_switches': usage.ru_nvcsw, 'involuntary_switches': usage.ru_nivcsw})
+
+def run_benchmark(num_samples, work_dir, tasks = None, num_targets = 1000, pair_fraction = 0.5, placeholder_size = 0, keep = False):
+    """
+    Generates a synthetic analysis and runs the tasks on it with the ``dry-run`` executor; should be run in a fresh process
+
+    Parameters
+    ----------
+    num_samples: int
+        number of samples in the analysis
+    work_dir: str
+        directory to generate the analysis in
+    tasks: list
+        the names of the tasks to run; defaults to ``default_tasks``
+    num_targets: int
+        number of regions in the targets .bed file
+    pair_fraction: float
+        fraction of the samples that are in a tumor-normal pair
+    placeholder_size: int
+        size in bytes of the placeholder output files
+    keep: bool
+        whether to keep the analysis directory after the run
+
+    Returns
+    -------
+    dict
+        the measurements of the run
+    """
+    tasks = tasks or default_tasks
+    analysis_dir = os.path.join(work_dir, 'analysis_{0}_samples'.format(num_samples))
+    del metrics.records[:]
+    metrics.metrics_file = None
+
+    with metrics.timer('generate', task = 'benchmark'):
+        synthetic_analysis.make_analysis_dir(output_dir = analysis_dir, num_samples = num_samples, num_targets = num_targets,
+                                            pair_fraction = pair_fraction, placeholder_size = placeholder_size)
+    executor = job_management.set_executor('dry-run')
+
+    logger.info('Running {0} tasks on {1} samples in: {2}'.format(len(tasks), num_samples, analysis_dir))
+    io_start = read_proc_io()
+    usage_start = get_rusage()
+    start = time.time()
+    with CallCounter() as calls:
+        with metrics.timer('run_tasks', task = 'benchmark'):
+            analysis = synthetic_analysis.SyntheticAnalysis(analysis_dir = analysis_dir)
+            run_tasks.run_tasks(tasks = collections.OrderedDict([(task, None) for task in tasks]), analysis = analysis)
+    wall_time = time.time() - start
+    io_end = read_proc_io()
+    usage_end = get_rusage()
+
+    result = collections.OrderedDict()
+    result['num_samples'] = num_samples
+    result['num_targets'] = num_targets
+    result['tasks'] = list(tasks)
+    result['wall_time'] = wall_time
+    result['jobs'] = len(executor.jobs)
+    result['calls'] = dict(calls)
+    result['file_calls'] = sum(calls.values())
+    for name in ['syscr', 'syscw', 'rchar', 'wchar']:
+        if name in io_start and name in io_end:
+            result[name] = io_end[name] - io_start[name]
+    for name in ['user_time', 'system_time', 'voluntary_switches', 'involuntary_switches']:
+        result[name] = usage_end[name] - usage_start[name]
+    result['max_rss'] = usage_end['max_rss']
+    result['phases'] = metrics.summarize()
+
+    if not keep:
+        shutil.rmtree(analysis_dir, ignore_errors = True)
+    return(result)
+
+def run_benchmarks(sample_counts, work_dir, **kwargs):
+    """
+    Runs ``run_benchmark()`` for each number of samples, each in a new process
+
+    Parameters
+    ----------
+    sample_counts: list
+        the numbers of samples to run
+    work_dir: str
+        directory to generate the analyses in
+    kwargs: dict
+        the other args of ``run_benchmark()``
+
+    Returns
+    -------
+    list
+        the measurements of each run
+    """
+    results = []
+    for num_samples in sample_counts:
+        result_file = os.path.join(work_dir, 'result_{0}_samples.json'.format(num_samples))
+        command = [sys.executable, scriptpath, '--single', str(num_samples), '--work-dir', work_dir, '--output', result_file,
+                    '--targets', str(kwargs.get('num_targets', 1000)),
+                    '--pair-fraction', str(kwargs.get('pair_fraction', 0.5)),
+                    '--placeholder-size', str(kwargs.get('placeholder_size', 0)),
+                    '--log-level', logging.getLevelName(logging.getLogger().getEffectiveLevel())]
+        for task in kwargs.get('tasks', None) or []:
+            command += ['--task', task]
+        if kwargs.get('keep', False):
+            command.append('--keep')
+        logger.info('Benchmarking {0} samples'.format(num_samples))
+        returncode = subprocess.call(command)
+        if returncode != 0:
+            raise RuntimeError('Benchmark of {0} samples failed with exit code {1}'.format(num_samples, returncode))
+        with open(result_file) as f:
+            results.append(json.load(f))
+        os.remove(result_file)
+    return(results)
+
+def compare_results(results, baseline, tolerance = 0.25):
+    """
+    Compares benchmark results to the results of an earlier run, for the same numbers of samples
+
+    Parameters
+    ----------
+    results: list
+        the measurements of each run, from ``run_benchmarks()``
+    baseline: list
+        the measurements of the earlier runs
+    tolerance: float
+        the fraction by which a value can be larger than in the baseline before it is a regression
+
+    Returns
+    -------
+    list
+        a message for each value that regressed
+    """
+    baseline_results = dict([(item['num_samples'], item) for item in baseline])
+    regressions = []
+    for result in results:
+        base = baseline_results.get(result['num_samples'], None)
+        if not base:
+            continue
+        for name in compared_values:
+            if name not in result or not base.get(name, None):
+                continue
+            if result[name] <= base[name] * (1 + tolerance):
+                continue
+            if name == 'wall_time' and result[name] - base[name] < min_wall_time_difference:
+                continue
+            regressions.append('{0} samples: {1} went from {2} to {3} (+{4:.0f}%)'.format(result['num_samples'], name, base[name], result[name], 100.0 * (result[name] - base[name]) / base[name]))
+    return(regressions)
+
+def format_report(results):
+    """
+    Formats the benchmark results as text tables: one row per run, then the time spent in each phase of each run
+
+    Returns
+    -------
+    str
+        the tables
+    """
+    lines = []
+    header = ['samples', 'jobs', 'wall_time', 'stat', 'lstat', 'listdir', 'scandir', 'open', 'syscr', 'syscw', 'max_rss_MB', 'cpu_time', 'ctx_switches']
+    lines.append('\t'.join(header))
+    for result in results:
+        calls = result['calls']
+        row = [result['num_samples'], result['jobs'], '{0:.2f}'.format(result['wall_time'])]
+        row += [calls.get(name, 0) for name in counted_calls + ['open']]
+        row += [result.get('syscr', 'NA'), result.get('syscw', 'NA'), '{0:.1f}'.format(result['max_rss'] / 1024.0 / 1024.0)]
+        row += ['{0:.2f}'.format(result['user_time'] + result['system_time']), result['voluntary_switches'] + result['involuntary_switches']]
+        lines.append('\t'.join([str(value) for value in row]))
+    for result in results:
+        lines.append('')
+        lines.append('{0} samples'.format(result['num_samples']))
+        lines.append('\t'.join(['task', 'event', 'count', 'wall_time', 'max_wall_time']))
+        for phase in result['phases']:
+            lines.append('\t'.join([phase['task'], phase['event'], str(phase['count']), '{0:.3f}'.format(phase['wall_time']), '{0:.3f}'.format(phase['max_wall_time'])]))
+    return('\n'.join(lines))
+
+def main(**kwargs):
+    """
+    Main control function for the script
+    """
+    output_file = kwargs.pop('output_file')
+    single = kwargs.pop('single')
+    sample_counts = kwargs.pop('sample_counts')
+    baseline_file = kwargs.pop('baseline_file')
+    tolerance = kwargs.pop('tolerance')
+    work_dir = kwargs.pop('work_dir')
+
+    if single:
+        # one size, in the process started by run_benchmarks()
+        result = run_benchmark(num_samples = single, work_dir = work_dir, **kwargs)
+        with open(output_file, 'w') as f:
+            json.dump(result, f, indent = 4)
+        return(0)
+
+    remove_work_dir = not work_dir
+    if not work_dir:
+        work_dir = tempfile.mkdtemp(prefix = 'snsxt_benchmark.')
+    try:
+        results = run_benchmarks(sample_counts = sample_counts, work_dir = work_dir, **kwargs)
+    finally:
+        if remove_work_dir and not kwargs['keep']:
+            shutil.rmtree(work_dir, ignore_errors = True)
+
+    print(format_report(results))
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent = 4)
+    logger.info('Benchmark results saved to file: {0}'.format(output_file))
+
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results = results, baseline = baseline, tolerance = tolerance)
+        if regressions:
+            print('\nRegressions from baseline {0}:\n{1}'.format(baseline_file, '\n'.join(regressions)))
+            return(1)
+        print('\nNo regressions from baseline {0}'.format(baseline_file))
+    return(0)
+
+def parse():
+    """
+    Parses the script args
+    """
+    parser = argparse.ArgumentParser(description = 'Measure the overhead of running the snsxt tasks on synthetic analyses of different sizes')
+    parser.add_argument('-n', '--samples', dest = 'sample_counts', type = int, nargs = '+', default = default_sample_counts, help = 'Numbers of samples to benchmark')
+    parser.add_argument('-t', '--task', dest = 'tasks', action = 'append', default = None, help = 'Task to run; can be given many times. Defaults to: {0}'.format(', '.join(default_tasks)))
+    parser.add_argument('--targets', dest = 'num_targets', type = int, default = 1000, help = 'Number of regions in the targets .bed file')
+    parser.add_argument('--pair-fraction', dest = 'pair_fraction', type = float, default = 0.5, help = 'Fraction of the samples in tumor-normal pairs')
+    parser.add_argument('--placeholder-size', dest = 'placeholder_size', type = int, default = 0, help = 'Size in bytes of the placeholder .bam, .vcf, and coverage files')
+    parser.add_argument('--work-dir', dest = 'work_dir', default = None, help = 'Directory to generate the analyses in; defaults to a temporary directory')
+    parser.add_argument('--keep', dest = 'keep', action = 'store_true', help = 'Keep the generated analyses')
+    parser.add_argument('-o', '--output', dest = 'output_file', default = 'snsxt_benchmark.json', help = 'JSON file to save the results to')
+    parser.add_argument('--baseline', dest = 'baseline_file', default = None, help = 'JSON results of an earlier benchmark to compare to')
+    parser.add_argument('--tolerance', dest = 'tolerance', type = float, default = 0.25, help = 'Fraction by which a value can exceed the baseline before it is a regression')
+    parser.add_argument('--log-level', dest = 'log_level', default = 'WARNING', help = 'Level of the log messages to print')
+    parser.add_argument('--single', dest = 'single', type = int, default = None, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level = getattr(logging, args.log_level.upper()), stream = sys.stderr, format = '%(message)s')
+    kwargs = vars(args)
+    kwargs.pop('log_level')
+    sys.exit(main(**kwargs))
+
+if __name__ == "__main__":
+    parse()
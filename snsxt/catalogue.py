@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Catalogue of the output files in an ``sns`` analysis directory
+
+Tasks used to find their input files with ``sample.get_output_files()`` and ``sample.get_files()``, which search the analysis directory again for every sample. The catalogue lists the analysis directory once, and answers the lookups from dictionaries keyed by the analysis step (the subdirectory of the analysis directory, e.g. ``BAM-GATK-RA-RC``) and the file name, i.e. the sample ID and the suffix.
+
+The listing of every directory is saved to an index file in the analysis directory along with the directory's modification time. When the catalogue is refreshed, by the next task or the next run of the program, only the directories that were modified since (i.e. had files added or removed) are listed again.
+
+Uses ``os.scandir`` (or the ``scandir`` package on Python 2) when available, since it avoids an extra ``stat`` call per directory entry, and falls back to ``os.listdir`` otherwise.
+
+Examples
+--------
+Example usage::
+
+    import catalogue
+    analysis_catalogue = catalogue.get_catalogue(analysis_dir = '/ifs/data/molecpathlab/NGS580_WES/180131_NB501073_0032_AHT5F3BGX3/results_2018-02-01_12-00-00')
+    analysis_catalogue.get(analysis_step = 'BAM-GATK-RA-RC', sampleID = 'Sample1', suffix = '.dd.ra.rc.bam')
+    analysis_catalogue.find(analysis_step = 'BAM-GATK-RA-RC', sampleID = 'Sample1', pattern = '*.dd.ra.rc.bam')
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import json
+import time
+import fnmatch
+import sequencer_index
+
+# ~~~~~ GLOBALS ~~~~~ #
+index_version = 1
+"""
+Version of the format of the index file; index files of other versions are ignored
+"""
+
+static_files = {
+'targets_bed': 'targets.bed',
+'probes_bed': 'probes.bed',
+'paired_samples': 'samples.pairs.csv',
+'settings': 'settings.txt',
+'summary_combined': 'summary-combined.wes.csv',
+'samples_fastq_raw': 'samples.fastq-raw.csv'
+}
+"""
+The files in the top level of the analysis directory that are shared by all samples, by the names used for them in ``sample.get_files()``
+"""
+
+mtime_grace = 2
+"""
+Directories modified less than this many seconds before they are listed are listed again at the next refresh, since files added within the resolution of the file system's modification times would not change it
+"""
+
+_catalogues = {}
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def get_catalogue(analysis_dir, index_file = None, exclusion_dirs = None):
+    """
+    Gets the catalogue of an analysis directory, refreshed with any changes since it was last used. The catalogue is shared by all of the tasks in the program, and its index is saved to the ``index_file``.
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+    index_file: str
+        path to the file to save the index to; not saved if ``None``
+    exclusion_dirs: list
+        ``fnmatch`` patterns for the names of subdirectories that should not be catalogued
+
+    Returns
+    -------
+    AnalysisCatalogue
+        the catalogue
+    """
+    key = os.path.realpath(analysis_dir)
+    if key not in _catalogues:
+        _catalogues[key] = AnalysisCatalogue(analysis_dir = analysis_dir, index_file = index_file, exclusion_dirs = exclusion_dirs)
+    else:
+        _catalogues[key].refresh()
+    return(_catalogues[key])
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class AnalysisCatalogue(object):
+    """
+    Catalogue of the files in an analysis directory, by analysis step and file name
+
+    Attributes
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+    dirs: dict
+        the listing of every directory, in the format ``{relative_path: {'mtime': mtime, 'files': [names], 'dirs': [names]}}``; the analysis directory itself is ``''``
+    steps: dict
+        the files of every analysis step, in the format ``{analysis_step: {file_name: [paths]}}``, where the files in the top level of the analysis directory are under the step ``''``
+    """
+    def __init__(self, analysis_dir, index_file = None, exclusion_dirs = None):
+        """
+        Parameters
+        ----------
+        analysis_dir: str
+            path to the analysis directory
+        index_file: str
+            path to the file to save the index to; not saved if ``None``
+        exclusion_dirs: list
+            ``fnmatch`` patterns for the names of subdirectories that should not be catalogued
+        """
+        self.analysis_dir = os.path.abspath(analysis_dir)
+        self.index_file = index_file
+        self.exclusion_dirs = exclusion_dirs
+        self.dirs = {}
+        self.steps = {}
+        self.load()
+        self.refresh()
+
+    def load(self):
+        """
+        Loads the directory listings saved in the ``index_file``
+        """
+        if not self.index_file or not os.path.exists(self.index_file):
+            return()
+        try:
+            with open(self.index_file) as f:
+                index = json.load(f)
+        except ValueError:
+            logger.warning('Could not read the catalogue index file: {0}'.format(self.index_file))
+            return()
+        if index.get('version', None) == index_version and index.get('analysis_dir', None) == self.analysis_dir:
+            self.dirs = index['dirs']
+
+    def save(self):
+        """
+        Saves the directory listings to the ``index_file``
+        """
+        if not self.index_file:
+            return()
+        index = {'version': index_version, 'analysis_dir': self.analysis_dir, 'dirs': self.dirs}
+        tmp_file = '{0}.tmp.{1}'.format(self.index_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp_file, self.index_file)
+
+    def refresh(self):
+        """
+        Updates the catalogue with the changes in the analysis directory; directories are only listed again if they were modified since they were last listed
+
+        Returns
+        -------
+        int
+            the number of directories that were listed
+        """
+        start = time.time()
+        dirs = {}
+        listed = 0
+        stack = ['']
+        while stack:
+            relpath = stack.pop()
+            path = os.path.join(self.analysis_dir, relpath)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            cached = self.dirs.get(relpath, None)
+            if cached and cached['mtime'] is not None and cached['mtime'] == mtime:
+                entry = cached
+            else:
+                try:
+                    files, subdirs = sequencer_index.list_dir(path)
+                except OSError:
+                    logger.warning('Could not list directory: {0}'.format(path))
+                    continue
+                if self.exclusion_dirs:
+                    subdirs = [name for name in subdirs if sequencer_index.matches_patterns(name, exclusion_patterns = self.exclusion_dirs)]
+                # files added in the same second would not change the mtime; list it again next time
+                entry = {'mtime': mtime if start - mtime > mtime_grace else None, 'files': sorted(files), 'dirs': sorted(subdirs)}
+                listed += 1
+            dirs[relpath] = entry
+            for name in entry['dirs']:
+                stack.append(os.path.join(relpath, name))
+        changed = listed > 0 or len(dirs) != len(self.dirs)
+        self.dirs = dirs
+        self._index_steps()
+        if changed:
+            self.save()
+        logger.debug('Catalogued {0} directories in {1:.2f}s; {2} were listed'.format(len(dirs), time.time() - start, listed))
+        return(listed)
+
+    def _index_steps(self):
+        """
+        Builds the lookup tables of the files of every analysis step from the directory listings
+        """
+        steps = {}
+        for relpath, entry in self.dirs.items():
+            step = relpath.split(os.sep, 1)[0]
+            step_files = steps.setdefault(step, {})
+            for name in entry['files']:
+                step_files.setdefault(name, []).append(os.path.join(self.analysis_dir, relpath, name))
+        self.steps = steps
+
+    def get(self, analysis_step, sampleID = None, suffix = ''):
+        """
+        Gets the files with the exact name ``<sampleID><suffix>`` in an analysis step
+
+        Parameters
+        ----------
+        analysis_step: str
+            the name of the analysis step's subdirectory; ``''`` for the top level of the analysis directory
+        sampleID: str
+            the sample ID, or ``None`` for files that do not belong to a sample
+        suffix: str
+            the rest of the file name
+
+        Returns
+        -------
+        list
+            the paths to the files
+        """
+        return(list(self.steps.get(analysis_step, {}).get((sampleID or '') + suffix, [])))
+
+    def find(self, analysis_step, sampleID = None, pattern = '*'):
+        """
+        Finds the files of a sample in an analysis step that match a pattern. A sample's files are the ones named ``<sampleID>.<suffix>``.
+
+        Parameters
+        ----------
+        analysis_step: str
+            the name of the analysis step's subdirectory; ``''`` for the top level of the analysis directory
+        sampleID: str
+            the sample ID, or ``None`` to search all of the files in the step
+        pattern: str
+            ``fnmatch`` pattern that the file name must match
+
+        Returns
+        -------
+        list
+            the paths to the matching files, sorted
+        """
+        matches = []
+        for name, paths in self.steps.get(analysis_step, {}).items():
+            if sampleID and not name.startswith(sampleID + '.'):
+                continue
+            if fnmatch.fnmatch(name, pattern):
+                matches.extend(paths)
+        return(sorted(matches))
+
+    def get_static_file(self, name):
+        """
+        Gets a file from the top level of the analysis directory by the name used for it in ``sample.get_files()``, e.g. ``'targets_bed'``
+
+        Returns
+        -------
+        list
+            the paths to the file, or an empty list if it is not in the ``static_files`` or the analysis directory
+        """
+        if name not in static_files:
+            return([])
+        return(self.get(analysis_step = '', suffix = static_files[name]))
@@ -4,6 +4,8 @@
 Module to load all of the individual config files
 Set up internal config dictionary for use throughout the program
 do any config re-mapping & aggregation here
+
+All YAML files used by the program should be loaded through ``load_yaml()``, which parses each file only once with the safe YAML loader (C-accelerated when available) and caches the result based on the file's path and modification time.
 """
 # ~~~~~ LOGGING ~~~~~~ #
 import logging
@@ -13,18 +15,221 @@ logger.debug("loading config module")
 # ~~~~~ SETUP ~~~~~~ #
 import yaml
 import os
+import collections
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 # path to this file's dir
 scriptdir = os.path.dirname(os.path.realpath(__file__))
 
+
+# ~~~~~ CLASSES ~~~~~ #
+class FrozenDict(dict):
+    """
+    A read-only ``dict``, used for the cached contents of YAML files so that they can be shared without being copied
+    """
+    _frozen = False
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._frozen = True
+
+    def _check_frozen(self):
+        if self._frozen:
+            raise TypeError('{0} object does not support item assignment'.format(type(self).__name__))
+
+    def __setitem__(self, key, value):
+        self._check_frozen()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._check_frozen()
+        dict.__delitem__(self, key)
+
+    def _readonly(self, *args, **kwargs):
+        self._check_frozen()
+
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return(self.__class__, (dict(self),))
+
+class FrozenOrderedDict(collections.OrderedDict):
+    """
+    A read-only ``OrderedDict``, used for cached YAML files whose key order matters, such as task lists
+    """
+    _frozen = False
+
+    def __init__(self, *args, **kwargs):
+        collections.OrderedDict.__init__(self, *args, **kwargs)
+        self._frozen = True
+
+    def _check_frozen(self):
+        if self._frozen:
+            raise TypeError('{0} object does not support item assignment'.format(type(self).__name__))
+
+    def __setitem__(self, key, value, *args, **kwargs):
+        self._check_frozen()
+        collections.OrderedDict.__setitem__(self, key, value, *args, **kwargs)
+
+    def __delitem__(self, key, *args, **kwargs):
+        self._check_frozen()
+        collections.OrderedDict.__delitem__(self, key, *args, **kwargs)
+
+    def _readonly(self, *args, **kwargs):
+        self._check_frozen()
+
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return(self.__class__, (list(self.items()),))
+
+class OrderedSafeLoader(SafeLoader):
+    """
+    Safe YAML loader that reads mappings as ``OrderedDict``'s
+    """
+    pass
+
+def _ordered_dict_constructor(loader, node):
+    loader.flatten_mapping(node)
+    return(collections.OrderedDict(loader.construct_pairs(node)))
+
+def _ordered_dict_representer(dumper, data):
+    return(dumper.represent_dict(data.items()))
+
+OrderedSafeLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, _ordered_dict_constructor)
+yaml.add_representer(collections.OrderedDict, _ordered_dict_representer)
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+_yaml_cache = {}
+"""
+Parsed YAML files, in the format ``{(path, ordered): (mtime, data)}``
+"""
+
+_task_configs_cache = {}
+"""
+Task configs created from the parsed YAML files, in the format ``{path: (data, task_configs)}``
+"""
+
+def freeze(obj):
+    """
+    Recursively converts the contents of a parsed YAML file to read-only objects; dicts become ``FrozenDict`` or ``FrozenOrderedDict``, and lists become tuples
+
+    Parameters
+    ----------
+    obj: object
+        an object loaded from a YAML file
+
+    Returns
+    -------
+    object
+        a read-only copy of the object
+    """
+    if isinstance(obj, collections.OrderedDict):
+        return(FrozenOrderedDict([(key, freeze(value)) for key, value in obj.items()]))
+    if isinstance(obj, dict):
+        return(FrozenDict([(key, freeze(value)) for key, value in obj.items()]))
+    if isinstance(obj, (list, tuple)):
+        return(tuple(freeze(item) for item in obj))
+    return(obj)
+
+def thaw(obj):
+    """
+    Recursively converts the read-only objects made by ``freeze()`` back to regular mutable dicts and lists
+
+    Parameters
+    ----------
+    obj: object
+        an object returned by ``load_yaml()``
+
+    Returns
+    -------
+    object
+        a mutable copy of the object
+    """
+    if isinstance(obj, collections.OrderedDict):
+        return(collections.OrderedDict([(key, thaw(value)) for key, value in obj.items()]))
+    if isinstance(obj, dict):
+        return(dict([(key, thaw(value)) for key, value in obj.items()]))
+    if isinstance(obj, tuple):
+        return([thaw(item) for item in obj])
+    return(obj)
+
+def load_yaml(path, ordered = False):
+    """
+    Loads a YAML formatted file. Files are only parsed once; the result is cached and reused until the file's modification time changes.
+
+    Parameters
+    ----------
+    path: str
+        path to the YAML file
+    ordered: bool
+        whether mappings should keep the order they have in the file
+
+    Returns
+    -------
+    object
+        the read-only contents of the YAML file, see ``freeze()``; an empty ``FrozenDict`` or ``FrozenOrderedDict`` if the file is empty
+    """
+    path = os.path.realpath(path)
+    mtime = os.path.getmtime(path)
+    key = (path, ordered)
+    cached = _yaml_cache.get(key, None)
+    if cached and cached[0] == mtime:
+        return(cached[1])
+    logger.debug('Parsing YAML file: {0}'.format(path))
+    if ordered:
+        loader = OrderedSafeLoader
+    else:
+        loader = SafeLoader
+    with open(path, "r") as f:
+        data = yaml.load(f, Loader = loader)
+    # an empty file parses to None; treat it as an empty mapping so callers can still use .get()
+    if data is None:
+        if ordered:
+            data = collections.OrderedDict()
+        else:
+            data = {}
+    data = freeze(data)
+    _yaml_cache[key] = (mtime, data)
+    return(data)
+
+def load_task_configs(config_filepath):
+    """
+    Gets the configs for an analysis task from its YAML formatted config file
+
+    Parameters
+    ----------
+    config_filepath: str
+        path to the task's YAML config file
+
+    Returns
+    -------
+    FrozenDict
+        the read-only task configs, with the path to the file added under the ``config_file`` key. The same object is returned for every task built from an unchanged file.
+    """
+    data = load_yaml(config_filepath)
+    cached = _task_configs_cache.get(config_filepath, None)
+    if cached and cached[0] is data:
+        return(cached[1])
+    task_configs = dict(data or {})
+    task_configs['config_file'] = config_filepath
+    task_configs = FrozenDict(task_configs)
+    _task_configs_cache[config_filepath] = (data, task_configs)
+    return(task_configs)
+
+
 logger.debug("loading configurations...")
 
 # ~~~~ GET EXTERNAL CONFIGS ~~~~~~ #
-with open(os.path.join(scriptdir, "snsxt.yml"), "r") as f:
-    snsxt = yaml.load(f)
+snsxt = thaw(load_yaml(os.path.join(scriptdir, "snsxt.yml")))
 
 
 # ~~~~ CREATE INTERNAL CONFIGS ~~~~~~ #
 config = {}
 
 config.update(snsxt)
+# settings to use globally across the 'snsxt' program
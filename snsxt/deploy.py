@@ -19,6 +19,10 @@ Need to get the ``parse_run_params_xml.py`` script and output integrated
 # ~~~~~ LOGGING ~~~~~~ #
 import os
 import sys
+# record startup timings before anything else is imported, if requested
+import startup_profile
+if startup_profile.is_requested():
+    startup_profile.install_import_hook()
 from util import log
 # path to this script's dir
 scriptdir = os.path.dirname(os.path.realpath(__file__))
@@ -38,6 +42,7 @@ snsxt_parent_dir = os.path.realpath(os.path.dirname(os.path.dirname(__file__)) )
 # set a timestamped log file for debug log
 log_file = os.path.join(snsxt_parent_dir, 'logs', '{0}.{1}.log'.format(scriptname, script_timestamp))
 email_log_file = os.path.join(snsxt_parent_dir, 'logs', '{0}.{1}.email.log'.format(scriptname, script_timestamp))
+startup_profile_file = os.path.join(snsxt_parent_dir, 'logs', '{0}.{1}.startup.json'.format(scriptname, script_timestamp))
 
 # logging config files
 primary_config_yaml = os.path.join(scriptdir, 'logging.yml')
@@ -56,21 +61,37 @@ email_logpath = log._email_logpath
 """
 Bound function from ``log`` module
 """
-logger = log.logger_from_configs(name = __name__, primary_config_yaml = primary_config_yaml, backup_config_yaml = backup_config_yaml, logger_name = 'deploy')
+with startup_profile.phase('logging_setup'):
+    logger = log.logger_from_configs(name = __name__, primary_config_yaml = primary_config_yaml, backup_config_yaml = backup_config_yaml, logger_name = 'deploy')
 log.print_filehandler_filepaths_to_log(logger)
 
 # ~~~~ LOAD MORE PACKAGES ~~~~~~ #
 # load the `settings.py` from the parent directory
-sys.path.insert(0, parentdir)
-import settings
-sys.path.pop(0)
-import argparse
-from util import tools
-from util import find
-from util import git
-import _exceptions as _e
-import shutil
-
+with startup_profile.phase('config_load'):
+    sys.path.insert(0, parentdir)
+    import settings
+    sys.path.pop(0)
+with startup_profile.phase('module_imports'):
+    import argparse
+    from util import tools
+    from util import find
+    from util import git
+    from sequencer_index import SequencerDirIndex
+    import snapshot
+    import _exceptions as _e
+    import shutil
+    import threading
+    from collections import OrderedDict
+    from multiprocessing.pool import ThreadPool
+
+# done timing module imports
+startup_profile.remove_import_hook()
+
+
+_chdir_lock = threading.Lock()
+"""
+Lock held while running functions which change the current working directory, since the working directory is shared by all threads
+"""
 
 # ~~~~~ FUNCTIONS ~~~~~~ #
 def find_sequencer_dir(analysis_id):
@@ -92,7 +113,7 @@ def find_sequencer_dir(analysis_id):
         raise _e.AnalysisFileMissing(message = 'sequencer_output_path does not exist: {0}'.format(sequencer_output_path), errors = '')
     return(sequencer_output_path)
 
-def fastq_present(search_dir):
+def fastq_present(search_dir, index = None):
     """
     Checks that '.fastq.gz' files are present in a directory
 
@@ -100,6 +121,8 @@ def fastq_present(search_dir):
     ----------
     search_dir: str
         path to directory to search
+    index: SequencerDirIndex
+        index of the files in the ``search_dir``; if ``None``, the directory will be searched directly
 
     Returns
     -------
@@ -109,10 +132,13 @@ def fastq_present(search_dir):
     """
     matches = None
     # check that .fastq files are present in the output
-    matches = find.find(search_dir = search_dir, inclusion_patterns = ('*.fastq.gz',), search_type = 'file', num_limit = 1)
+    if index:
+        matches = index.find(inclusion_patterns = ('*.fastq.gz',), num_limit = 1)
+    else:
+        matches = find.find(search_dir = search_dir, inclusion_patterns = ('*.fastq.gz',), search_type = 'file', num_limit = 1)
     return(bool(matches))
 
-def validate_sequencer_dir(sequencer_output_path):
+def validate_sequencer_dir(sequencer_output_path, index = None):
     """
     Runs validations against the sequencing data output directory. Raises an exception if an error is found
 
@@ -120,12 +146,14 @@ def validate_sequencer_dir(sequencer_output_path):
     ----------
     sequencer_output_path: str
         path to directory to search
+    index: SequencerDirIndex
+        index of the files in the ``sequencer_output_path``
     """
-    if not fastq_present(search_dir = sequencer_output_path):
+    if not fastq_present(search_dir = sequencer_output_path, index = index):
         raise _e.AnalysisFileMissing(message = 'sequencer_output_path does not contain .fastq.gz files: {0}'.format(sequencer_output_path), errors = '')
     # add more validations here
 
-def find_fastq_parent_dir(sequencer_output_path):
+def find_fastq_parent_dir(sequencer_output_path, index = None):
     """
     Searches for the subdirectory containing .fastq.gz files. If .fastq.gz files are not found two levels deep in the passed ``sequencer_output_path``, then a subdirectory containing .fastq.gz files will be returned, if found. Otherwise, raises an exception if no .fastq.gz files could be found.
 
@@ -133,6 +161,8 @@ def find_fastq_parent_dir(sequencer_output_path):
     ----------
     sequencer_output_path: str
         path to directory to search
+    index: SequencerDirIndex
+        index of the files in the ``sequencer_output_path``; if ``None``, a new index will be built
 
     Returns
     -------
@@ -146,28 +176,25 @@ def find_fastq_parent_dir(sequencer_output_path):
     inclusion_patterns = ('*.fastq.gz',)
     exclusion_patterns = ('*Undetermined*',)
 
+    if not index:
+        index = SequencerDirIndex(search_dir = sequencer_output_path)
+
     # search just the top 2 levels
     matches = []
-    matches = find.find(search_dir = sequencer_output_path,
-                        inclusion_patterns = inclusion_patterns,
+    matches = index.find(inclusion_patterns = inclusion_patterns,
                         exclusion_patterns = exclusion_patterns,
-                        search_type = 'file',
                         num_limit = 1,
-                        level_limit = 2,
-                        match_mode = "any")
+                        level_limit = 2)
     if len(matches) > 0:
         logger.debug('Found .fastq files near the top level of the sequencer_output_path, returning sequencer_output_path: {0}'.format(sequencer_output_path))
         return(sequencer_output_path)
 
-    # search deeper; this might take a while
+    # search deeper
     logger.debug('.fastq files were not found near the top level of the sequencer_output_path, searching deeper...')
     matches = []
-    matches = find.find(search_dir = sequencer_output_path,
-                        inclusion_patterns = inclusion_patterns,
+    matches = index.find(inclusion_patterns = inclusion_patterns,
                         exclusion_patterns = exclusion_patterns,
-                        search_type = 'file',
-                        num_limit = 1,
-                        match_mode = "any")
+                        num_limit = 1)
     if len(matches) > 0:
         fastq_dir = os.path.dirname(matches[0])
         logger.debug('Found .fastq files in directory: {0}\nThis directory will be used for the sns analysis'.format(fastq_dir))
@@ -186,7 +213,7 @@ def make_results_ID():
     """
     return('results_{0}'.format(tools.timestamp2()))
 
-def copy_sequencer_files(analysis_dir, sequencer_output_path, other_files = None):
+def copy_sequencer_files(analysis_dir, sequencer_output_path, other_files = None, index = None):
     """
     Copies files specified in ``settings.py`` from the ``sequencer_output_path`` directory to the ``analysis_dir``
 
@@ -198,7 +225,11 @@ def copy_sequencer_files(analysis_dir, sequencer_output_path, other_files = None
         path to the directory to copy analysis files to
     other_files: list
         a list of other files to copy over to the analysis_dir, or ``None``
+    index: SequencerDirIndex
+        index of the files in the ``sequencer_output_path``; if ``None``, a new index will be built
     """
+    if not index:
+        index = SequencerDirIndex(search_dir = sequencer_output_path)
     # get the file basenames to search for from the settings
     sequencer_files = settings.sequencer_files.split(',')
     # get the files form the sequencer_dir to copy over
@@ -206,11 +237,7 @@ def copy_sequencer_files(analysis_dir, sequencer_output_path, other_files = None
     for sequencer_file in sequencer_files:
         logger.debug(sequencer_file)
         inclusion_patterns = (sequencer_file,)
-        matches = find.find(search_dir = sequencer_output_path,
-                            inclusion_patterns = inclusion_patterns,
-                            search_type = 'file',
-                            num_limit = 1,
-                            match_mode = "any")
+        matches = index.find(inclusion_patterns = inclusion_patterns, num_limit = 1)
         logger.debug(matches)
         if len(matches) > 0:
             copy_files.append(matches[0])
@@ -252,7 +279,142 @@ def copy_pairs_sheet(pairs_sheet, analysis_dir):
     return(output_path)
 
 
-def clone_snsxt(target_dir, branch = None):
+def _run_git(command):
+    """
+    Runs a ``git`` shell command, and raises an exception if it does not complete successfully
+
+    Parameters
+    ----------
+    command: str
+        the shell command to run
+
+    Returns
+    -------
+    SubprocessCmd
+        the ``tools.SubprocessCmd`` object for the command that was run
+    """
+    logger.debug(command)
+    run_cmd = tools.SubprocessCmd(command = command).run()
+    logger.debug(run_cmd.proc_stdout)
+    logger.debug(run_cmd.proc_stderr)
+    if run_cmd.process.returncode != 0:
+        err_message = 'git command did not complete successfully:\n{0}\n{1}'.format(command, run_cmd.proc_stderr)
+        raise _e.SubprocessCmdError(message = err_message, errors = '')
+    return(run_cmd)
+
+def get_mirror_path(mirror_dir, repo_URL):
+    """
+    Gets the path to the bare mirror for a repo
+
+    Parameters
+    ----------
+    mirror_dir: str
+        path to the directory holding the mirrors
+    repo_URL: str
+        the URL of the repo
+
+    Returns
+    -------
+    str
+        path to the mirror, named after the host and path of the ``repo_URL``; e.g. ``github.com/NYU-Molecular-Pathology/util.git``
+    """
+    name = repo_URL.split('://', 1)[-1].replace(':', '/').strip('/')
+    if not name.endswith('.git'):
+        name = name + '.git'
+    return(os.path.join(mirror_dir, name))
+
+def get_submodule_URLs(mirror_path):
+    """
+    Gets the URLs of the submodules of a repo from the ``.gitmodules`` file on the mirror's default branch
+
+    Parameters
+    ----------
+    mirror_path: str
+        path to the bare mirror of the repo
+
+    Returns
+    -------
+    list
+        a list of the submodule URLs
+    """
+    command = 'git --git-dir="{0}" show HEAD:.gitmodules'.format(mirror_path)
+    run_cmd = tools.SubprocessCmd(command = command).run()
+    if run_cmd.process.returncode != 0:
+        # the repo has no submodules
+        return([])
+    urls = []
+    for line in run_cmd.proc_stdout.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and key.strip() == 'url':
+            urls.append(value.strip())
+    return(urls)
+
+def update_mirrors(repo_URL, mirror_dir, refresh = False, mirrors = None):
+    """
+    Creates bare mirrors of a repo and all of its submodules, recursively, in the ``mirror_dir``
+
+    Parameters
+    ----------
+    repo_URL: str
+        the URL of the repo
+    mirror_dir: str
+        path to the directory holding the mirrors
+    refresh: bool
+        whether mirrors that already exist should be updated from their URL
+    mirrors: dict
+        mirrors that have already been set up; used for the recursion
+
+    Returns
+    -------
+    dict
+        a dictionary in the format ``{repo_URL: mirror_path}`` for the repo and its submodules
+
+    Notes
+    -----
+    Checkouts made from the mirrors with ``git clone --shared`` borrow the mirror's objects instead of copying them, so automatic garbage collection is disabled in the mirrors to make sure no objects used by an existing checkout get deleted.
+    """
+    if mirrors is None:
+        mirrors = {}
+    if repo_URL in mirrors:
+        return(mirrors)
+    mirror_path = get_mirror_path(mirror_dir = mirror_dir, repo_URL = repo_URL)
+    mirrors[repo_URL] = mirror_path
+    if not tools.item_exists(item = mirror_path, item_type = 'dir'):
+        logger.info('Creating mirror of repo {0} in: {1}'.format(repo_URL, mirror_path))
+        tools.mkdirs(path = os.path.dirname(mirror_path))
+        _run_git('git clone --mirror "{0}" "{1}"'.format(repo_URL, mirror_path))
+        _run_git('git --git-dir="{0}" config gc.auto 0'.format(mirror_path))
+        _run_git('git --git-dir="{0}" config gc.pruneExpire never'.format(mirror_path))
+    elif refresh:
+        logger.info('Updating mirror of repo {0} in: {1}'.format(repo_URL, mirror_path))
+        _run_git('git --git-dir="{0}" fetch --prune'.format(mirror_path))
+    for submodule_URL in get_submodule_URLs(mirror_path = mirror_path):
+        update_mirrors(repo_URL = submodule_URL, mirror_dir = mirror_dir, refresh = refresh, mirrors = mirrors)
+    return(mirrors)
+
+def clone_snsxt_from_mirrors(snsxt_dir, mirrors, branch = None):
+    """
+    Creates a checkout of the ``snsxt`` repo and its submodules from local bare mirrors made with ``update_mirrors()``. The checkout shares the objects of the mirrors instead of copying them, so it only takes up the space of the checked out files.
+
+    Parameters
+    ----------
+    snsxt_dir: str
+        path to create the checkout at
+    mirrors: dict
+        a dictionary in the format ``{repo_URL: mirror_path}``
+    branch: str
+        git repo branch to checkout
+    """
+    snsxt_repo_URL = settings.snsxt_repo_URL
+    # redirect the submodule URLs to the mirrors for the commands run here only; the URLs saved in the checkout are left pointing at the original repos
+    # git 2.38.1+ refuses to clone submodules from local paths unless 'protocol.file.allow' is set
+    url_rewrites = '-c protocol.file.allow=always ' + ' '.join(['-c url."{0}".insteadOf="{1}"'.format(mirror_path, repo_URL) for repo_URL, mirror_path in sorted(mirrors.items())])
+    _run_git('git clone --shared --no-checkout "{0}" "{1}"'.format(mirrors[snsxt_repo_URL], snsxt_dir))
+    _run_git('cd "{0}" && git remote set-url origin "{1}"'.format(snsxt_dir, snsxt_repo_URL))
+    _run_git('cd "{0}" && git checkout {1}'.format(snsxt_dir, str(branch or 'HEAD')))
+    _run_git('cd "{0}" && git {1} submodule update --init --recursive'.format(snsxt_dir, url_rewrites))
+
+def clone_snsxt(target_dir, branch = None, clone_from = None, mirrors = None):
     """
     Creates a ``git`` clone of the ``snsxt`` repo in the target directory
 
@@ -260,26 +422,215 @@ def clone_snsxt(target_dir, branch = None):
     ----------
     target_dir: str
         path to the location to clone the new copy of the repo
+    branch: str
+        git repo branch to checkout after cloning
+    clone_from: str
+        path to a local clone or worktree of the repo to clone from instead of ``settings.snsxt_repo_URL``; the new clone's ``origin`` remote is pointed back at ``settings.snsxt_repo_URL`` afterwards
+    mirrors: dict
+        local bare mirrors of the repo and its submodules to make the checkout from, see ``update_mirrors()``; takes precedence over ``clone_from``
     """
     snsxt_dir = os.path.join(target_dir, 'snsxt')
+    if mirrors:
+        clone_snsxt_from_mirrors(snsxt_dir = snsxt_dir, mirrors = mirrors, branch = branch)
+        return()
     snsxt_repo_URL = settings.snsxt_repo_URL
     git_clone_command = settings.git_clone_command
-    command = '{0} {1}'.format(git_clone_command, snsxt_repo_URL)
-    # git clone --recursive https://github.com/NYU-Molecular-Pathology/snsxt.git
-    with tools.DirHop(target_dir) as d:
-        run_cmd = tools.SubprocessCmd(command = command).run()
-        logger.debug(run_cmd.proc_stdout)
-        logger.debug(run_cmd.proc_stderr)
+    # clone into an explicit path instead of changing directories, so that several clones can run at once
+    command = '{0} "{1}" "{2}"'.format(git_clone_command, clone_from or snsxt_repo_URL, snsxt_dir)
+    # git clone --recursive https://github.com/NYU-Molecular-Pathology/snsxt.git /path/to/analysis_dir/snsxt
+    _run_git(command)
+    if not tools.item_exists(snsxt_dir):
+        raise _e.AnalysisFileMissing(message = 'snsxt_dir does not exist: {0}'.format(snsxt_dir), errors = '')
+    if clone_from:
+        logger.debug('Setting git remote origin to: {0}'.format(snsxt_repo_URL))
+        _run_git('cd "{0}" && git remote set-url origin "{1}"'.format(snsxt_dir, snsxt_repo_URL))
     if branch:
-        if tools.item_exists(snsxt_dir):
-            with tools.DirHop(snsxt_dir) as d:
-                logger.debug('Checking out git branch: {0}'.format(str(branch)))
-                git_checkout_cmd = 'git checkout {0}'.format(str(branch))
-                run_cmd = tools.SubprocessCmd(command = git_checkout_cmd).run()
-                logger.debug(run_cmd.proc_stdout)
-                logger.debug(run_cmd.proc_stderr)
-        else:
-            raise _e.AnalysisFileMissing(message = 'snsxt_dir does not exist: {0}'.format(snsxt_dir), errors = '')
+        logger.debug('Checking out git branch: {0}'.format(str(branch)))
+        _run_git('cd "{0}" && git checkout {1}'.format(snsxt_dir, str(branch)))
+
+def deploy_analysis(analysis_id, pairs_sheet = None, other_files = None, branch = None, clone_from = None, mirrors = None, git_mode = 'manifest', run_phases = None):
+    """
+    Prepares a new analysis directory for a single sequencer run
+
+    Parameters
+    ----------
+    analysis_id: str
+        ID of the sequencer output directory to use as input for the new analysis
+    pairs_sheet: str
+        samplesheet to use for paired analysis
+    other_files: list
+        a list of other files to copy over to the analysis_dir, or ``None``
+    branch: str
+        git repo branch to checkout
+    clone_from: str
+        path to a local clone or worktree of the repo to clone from
+    mirrors: dict
+        local bare mirrors of the repo and its submodules to make the checkout from
+    git_mode: str
+        ``'manifest'`` to only track the files matching ``settings.git_track_patterns`` in the analysis directory's git repo, or ``'all'`` to track every file
+    run_phases: dict
+        a dict to add the time spent in each phase of the deployment to, for the ``--profile-startup`` output; each run gets its own, since the runs are deployed at the same time
+
+    Returns
+    -------
+    str
+        the shell commands to run to start the analysis
+    """
+    output_pairs_sheet = None
+    if run_phases is None:
+        run_phases = OrderedDict()
+
+    # get the path to the sequencer directory matching the analysis ID
+    logger.debug('Getting sequencer_output_path')
+    with startup_profile.phase('find_sequencer_dir', record = run_phases):
+        sequencer_output_path = find_sequencer_dir(analysis_id = analysis_id)
+    logger.debug('sequencer_output_path is: {0}'.format(sequencer_output_path))
+
+    # walk the directory once; all of the file lookups below use the index
+    logger.debug('Indexing sequencer_output_path ...')
+    with startup_profile.phase('index_sequencer_dir', record = run_phases):
+        index = SequencerDirIndex(search_dir = sequencer_output_path)
+
+    # validate the directory
+    logger.debug('Validating sequencer_output_path ...')
+    with startup_profile.phase('validate_sequencer_dir', record = run_phases):
+        validate_sequencer_dir(sequencer_output_path = sequencer_output_path, index = index)
+
+    # get the path to the .fastq file directory to use
+    logger.debug('Finding fastq_dir')
+    with startup_profile.phase('find_fastq_dir', record = run_phases):
+        fastq_dir = find_fastq_parent_dir(sequencer_output_path = sequencer_output_path, index = index)
+    logger.debug('fastq_dir is: {0}'.format(fastq_dir))
+
+    # make a results_id
+    results_id = make_results_ID()
+    logger.debug('results_id is: {0}'.format(results_id))
+
+    # make the path the the analysis_dir where the analysis will be prepared
+    analysis_dir = tools.mkdirs(path = os.path.join(settings.analysis_dir, analysis_id, results_id), return_path = True)
+    logger.debug('analysis_dir will be: {0}'.format(analysis_dir))
+
+    # copy over files found in the sequencer_dir to the analysis dir
+    logger.debug('Copying over files for the analysis from sequencer_dir')
+    with startup_profile.phase('copy_sequencer_files', record = run_phases):
+        copy_sequencer_files(analysis_dir = analysis_dir, sequencer_output_path = sequencer_output_path, other_files = other_files, index = index)
+
+    # make a symlink to the fastq dir from the analysis_dir
+    logger.debug('Setting up symlink to fastq_dir inside analysis_dir')
+    fastq_linkname = settings.fastq_linkname
+    link_path = os.path.join(analysis_dir, fastq_linkname)
+    os.symlink(fastq_dir, link_path)
+
+    # clone the repo
+    logger.debug('Cloning a new copy of the repo...')
+    with startup_profile.phase('clone_snsxt', record = run_phases):
+        clone_snsxt(target_dir = analysis_dir, branch = branch, clone_from = clone_from, mirrors = mirrors)
+    snsxt_dir = os.path.join(analysis_dir, 'snsxt')
+
+    # make sure the dir exists
+    if not tools.item_exists(item = snsxt_dir, item_type = 'dir'):
+        raise _e.AnalysisFileMissing(message = 'snsxt_dir did not get created correctly: {0}'.format(snsxt_dir), errors = '')
+
+    # make a command to use to start the snsxt analysis
+    # check if a pairs_sheet was passed and copied
+    if pairs_sheet:
+        output_pairs_sheet = copy_pairs_sheet(pairs_sheet = pairs_sheet, analysis_dir = analysis_dir)
+
+    # make a git repo in the dir
+    logger.debug('Setting up git repo in analysis_dir')
+    if git_mode == 'manifest':
+        write_manifest_gitignore(analysis_dir = analysis_dir, track_patterns = settings.git_track_patterns.split(','))
+    with startup_profile.phase('git_init', record = run_phases):
+        # `git.init` changes the working directory, so only one thread can run it at a time
+        with _chdir_lock:
+            git.init(dir = analysis_dir, add_all = True)
+
+    if output_pairs_sheet:
+        snsxt_command_base = 'snsxt/run.py --pairs_sheet {0} -t task_lists/default_pairs.yml'.format(output_pairs_sheet)
+    else:
+        snsxt_command_base = 'snsxt/run.py -t task_lists/default.yml'
+
+    snsxt_command = """
+cd {0}
+{1} -a {2} -r {3} -f {4}/ -d {5}
+    """.format(
+    snsxt_dir, # 0
+    snsxt_command_base, # 1
+    analysis_id, # 2
+    results_id, # 3
+    link_path, # 4
+    analysis_dir # 5
+    )
+    logger.info('Run these commands in a new "screen" session to start the analysis:\n\n{0}\n\n'.format(snsxt_command))
+    return(snsxt_command)
+
+def write_manifest_gitignore(analysis_dir, track_patterns):
+    """
+    Writes a ``.gitignore`` file to the analysis directory that ignores everything except the files matching the ``track_patterns``, so that the analysis directory's git repo only tracks its configs, sample sheets, and task lists and not the pipeline output
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+    track_patterns: list
+        ``.gitignore`` style patterns for the files to track, relative to the ``analysis_dir``
+
+    Returns
+    -------
+    str
+        path to the ``.gitignore`` file
+    """
+    gitignore_file = os.path.join(analysis_dir, '.gitignore')
+    lines = [
+    '# generated by snsxt/deploy.py; only files matching the patterns below are tracked',
+    '# use snsxt/snapshot.py to record checksums of the other files',
+    '/*',
+    '!/.gitignore',
+    '!/{0}'.format(snapshot.manifest_filename)
+    ]
+    for pattern in track_patterns:
+        lines.append('!/{0}'.format(pattern.strip().lstrip('/')))
+    with open(gitignore_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return(gitignore_file)
+
+def _deploy_analysis_worker(kwargs):
+    """
+    Runs ``deploy_analysis()`` in a worker thread
+
+    Returns
+    -------
+    tuple
+        the analysis ID, the shell commands to start the analysis or ``None``, and the error message or ``None``
+    """
+    analysis_id = kwargs['analysis_id']
+    try:
+        return((analysis_id, deploy_analysis(**kwargs), None))
+    except Exception as e:
+        logger.exception('Deployment failed for analysis: {0}'.format(analysis_id))
+        return((analysis_id, None, str(e)))
+
+def make_launch_script(commands):
+    """
+    Makes a shell script that starts each of the deployed analyses in its own detached ``screen`` session
+
+    Parameters
+    ----------
+    commands: list
+        a list of ``(analysis_id, snsxt_command)`` tuples
+
+    Returns
+    -------
+    str
+        the contents of the launch script
+    """
+    lines = ['#!/bin/bash', 'set -e', '']
+    for analysis_id, snsxt_command in commands:
+        snsxt_command = '; '.join([line.strip() for line in snsxt_command.strip().split('\n')])
+        lines.append('# {0}'.format(analysis_id))
+        lines.append("screen -dmS '{0}' bash -c '{1}; exec bash'".format(analysis_id, snsxt_command))
+        lines.append('')
+    return('\n'.join(lines))
 
 def main(**kwargs):
     """
@@ -292,6 +643,28 @@ def main(**kwargs):
 
     Keyword Arguments
     -----------------
+    analysis_ids: list
+        IDs of sequencer output directories to use as input for the new analyses
+    pairs_sheet: str
+        samplesheet to use for paired analysis; only allowed with a single analysis ID
+    sample_sheet: str
+        samplesheet associated with the analysis; only allowed with a single analysis ID
+    branch: str
+        git repo branch to checkout
+    clone_from: str
+        path to a local clone or worktree of the repo to clone from instead of the network URL
+    mirror_dir: str
+        path to a directory of local bare mirrors of the repo and its submodules to make checkouts from
+    refresh_mirrors: bool
+        whether to update the mirrors from the network before deploying
+    git_mode: str
+        ``'manifest'`` or ``'all'``; which files to track in the analysis directory's git repo
+    threads: int
+        number of analyses to prepare at the same time
+    launch_script: str
+        path to a file to write the combined launch script to
+    profile_startup: str
+        path to a JSON file to save the startup timings and the time spent in each phase of each analysis's deployment to, once the analyses are deployed
 
     """
     # get the args that were passed
@@ -299,12 +672,22 @@ def main(**kwargs):
     pairs_sheet = kwargs.pop('pairs_sheet', None)
     sample_sheet = kwargs.pop('sample_sheet', None)
     branch = kwargs.pop('branch', None)
+    clone_from = kwargs.pop('clone_from', None)
+    mirror_dir = kwargs.pop('mirror_dir', None)
+    refresh_mirrors = kwargs.pop('refresh_mirrors', False)
+    git_mode = kwargs.pop('git_mode', 'manifest')
+    threads = kwargs.pop('threads', 1)
+    launch_script = kwargs.pop('launch_script', None)
+    profile_startup_file = kwargs.pop('profile_startup', None)
+
+    # the sheets belong to a single sequencer run
+    if len(analysis_ids) > 1 and (pairs_sheet or sample_sheet):
+        raise _e.ArgumentError(message = 'pairs_sheet and sample_sheet can only be passed when deploying a single analysis, got {0} analysis IDs'.format(len(analysis_ids)), errors = '')
 
     if not pairs_sheet:
         logger.warning('No tumor-normal pairs_sheet was passed')
 
     other_files = []
-    output_pairs_sheet = None
 
     if pairs_sheet:
         if not tools.item_exists(item = pairs_sheet, item_type = 'file'):
@@ -316,75 +699,62 @@ def main(**kwargs):
         else:
             other_files.append(sample_sheet)
 
-    for analysis_id in analysis_ids:
-        # get the path to the sequencer directory matching the analysis ID
-        logger.debug('Getting sequencer_output_path')
-        sequencer_output_path = find_sequencer_dir(analysis_id = analysis_id)
-        logger.debug('sequencer_output_path is: {0}'.format(sequencer_output_path))
-
-        # validate the directory
-        logger.debug('Validating sequencer_output_path ...')
-        validate_sequencer_dir(sequencer_output_path = sequencer_output_path)
-
-        # get the path to the .fastq file directory to use
-        logger.debug('Finding fastq_dir')
-        fastq_dir = find_fastq_parent_dir(sequencer_output_path = sequencer_output_path)
-        logger.debug('fastq_dir is: {0}'.format(fastq_dir))
-
-        # make a results_id
-        results_id = make_results_ID()
-        logger.debug('results_id is: {0}'.format(results_id))
-
-        # make the path the the analysis_dir where the analysis will be prepared
-        analysis_dir = tools.mkdirs(path = os.path.join(settings.analysis_dir, analysis_id, results_id), return_path = True)
-        logger.debug('analysis_dir will be: {0}'.format(analysis_dir))
-
-        # copy over files found in the sequencer_dir to the analysis dir
-        logger.debug('Copying over files for the analysis from sequencer_dir')
-        copy_sequencer_files(analysis_dir = analysis_dir, sequencer_output_path = sequencer_output_path, other_files = other_files)
-
-        # make a symlink to the fastq dir from the analysis_dir
-        logger.debug('Setting up symlink to fastq_dir inside analysis_dir')
-        fastq_linkname = settings.fastq_linkname
-        link_path = os.path.join(analysis_dir, fastq_linkname)
-        os.symlink(fastq_dir, link_path)
-
-        # clone the repo
-        logger.debug('Cloning a new copy of the repo...')
-        clone_snsxt(target_dir = analysis_dir, branch = branch)
-        snsxt_dir = os.path.join(analysis_dir, 'snsxt')
-
-        # make sure the dir exists
-        if not tools.item_exists(item = snsxt_dir, item_type = 'dir'):
-            raise _e.AnalysisFileMissing(message = 'snsxt_dir did not get created correctly: {0}'.format(snsxt_dir), errors = '')
-
-        # make a command to use to start the snsxt analysis
-        # check if a pairs_sheet was passed and copied
-        if pairs_sheet:
-            output_pairs_sheet = copy_pairs_sheet(pairs_sheet = pairs_sheet, analysis_dir = analysis_dir)
-
-        # make a git repo in the dir
-        logger.debug('Setting up git repo in analysis_dir')
-        git.init(dir = analysis_dir, add_all = True)
-
-        if output_pairs_sheet:
-            snsxt_command_base = 'snsxt/run.py --pairs_sheet {0} -t task_lists/default_pairs.yml'.format(output_pairs_sheet)
+    if clone_from:
+        clone_from = os.path.realpath(clone_from)
+        if not tools.item_exists(item = clone_from, item_type = 'dir'):
+            raise _e.AnalysisFileMissing(message = 'clone_from directory does not exist: {0}'.format(clone_from), errors = '')
+
+    # the phases of each run are timed separately
+    runs = OrderedDict([(analysis_id, OrderedDict()) for analysis_id in analysis_ids])
+    try:
+        mirrors = None
+        if mirror_dir:
+            # set up the mirrors once, before any of the analyses are prepared
+            with startup_profile.phase('update_mirrors'):
+                mirrors = update_mirrors(repo_URL = settings.snsxt_repo_URL, mirror_dir = os.path.realpath(mirror_dir), refresh = refresh_mirrors)
+
+        jobs = [{'analysis_id': analysis_id,
+                'pairs_sheet': pairs_sheet,
+                'other_files': other_files,
+                'branch': branch,
+                'clone_from': clone_from,
+                'mirrors': mirrors,
+                'git_mode': git_mode,
+                'run_phases': runs[analysis_id]} for analysis_id in analysis_ids]
+
+        if len(jobs) == 1:
+            # a single analysis; let errors propagate as usual
+            results = [(analysis_ids[0], deploy_analysis(**jobs[0]), None)]
         else:
-            snsxt_command_base = 'snsxt/run.py -t task_lists/default.yml'
-
-        snsxt_command = """
-cd {0}
-{1} -a {2} -r {3} -f {4}/ -d {5}
-        """.format(
-        snsxt_dir, # 0
-        snsxt_command_base, # 1
-        analysis_id, # 2
-        results_id, # 3
-        link_path, # 4
-        analysis_dir # 5
-        )
-        logger.info('Run these commands in a new "screen" session to start the analysis:\n\n{0}\n\n'.format(snsxt_command))
+            logger.info('Deploying {0} analyses with {1} threads'.format(len(jobs), threads))
+            pool = ThreadPool(max(1, min(threads, len(jobs))))
+            try:
+                results = pool.map(_deploy_analysis_worker, jobs)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        # save the timings of the runs that were deployed, even if one of them failed
+        if profile_startup_file:
+            startup_profile.write_profile(output_file = profile_startup_file, analysis_ids = analysis_ids, runs = runs)
+            logger.info('Startup profile saved to file: {0}'.format(profile_startup_file))
+
+    commands = [(analysis_id, snsxt_command) for analysis_id, snsxt_command, error in results if snsxt_command]
+    failed = [(analysis_id, error) for analysis_id, snsxt_command, error in results if error]
+
+    if len(commands) > 1 or launch_script:
+        launch_script_text = make_launch_script(commands = commands)
+        if launch_script:
+            with open(launch_script, 'w') as f:
+                f.write(launch_script_text + '\n')
+            os.chmod(launch_script, 0o755)
+            logger.info('Launch script for the deployed analyses saved to file: {0}'.format(launch_script))
+        else:
+            logger.info('Run this script to start all of the deployed analyses:\n\n{0}\n\n'.format(launch_script_text))
 
+    if failed:
+        err_message = 'Deployment failed for analyses:\n{0}'.format('\n'.join(['{0}: {1}'.format(analysis_id, error) for analysis_id, error in failed]))
+        raise _e.AnalysisInvalid(message = err_message, errors = '')
 
 
 
@@ -406,18 +776,27 @@ def parse():
 
          snsxt/deploy.py 171116_NB501073_0027_AHT5M2BGX3 -p /ifs/data/molecpathlab/quicksilver/to_be_demultiplexed/processed/171116_NB501073_0027_AHT5M2BGX3-samples.pairs.csv_ -s /ifs/data/molecpathlab/quicksilver/to_be_demultiplexed/processed/171116_NB501073_0027_AHT5M2BGX3-SampleSheet.2017-11-20-11-59-33.csv
 
+        snsxt$ snsxt/deploy.py 171116_NB501073_0027_AHT5M2BGX3 171120_NB501073_0028_AHKNTFBGX3 -j 4 --clone-from . --launch-script launch.sh
+
     """
     # ~~~~ GET SCRIPT ARGS ~~~~~~ #
     # create the top-level parser
     parser = argparse.ArgumentParser(description='deploy a new snsxt NGS580 analysis directory')
 
     # required positional args
-    parser.add_argument('analysis_ids', nargs = 1, help="IDs of sequencer output directories to use as input for the new analysis")
+    parser.add_argument('analysis_ids', nargs = '+', help="IDs of sequencer output directories to use as input for the new analyses")
 
     # optional flags
-    parser.add_argument('-p', '--pairs_sheet', dest = 'pairs_sheet', help = '"samples.pairs.csv" samplesheet to use for paired analysis', default = None)
-    parser.add_argument('-s', '--sample_sheet', dest = 'sample_sheet', help = 'samplesheet associated with the analysis', default = None)
+    parser.add_argument('-p', '--pairs_sheet', dest = 'pairs_sheet', help = '"samples.pairs.csv" samplesheet to use for paired analysis; only with a single analysis ID', default = None)
+    parser.add_argument('-s', '--sample_sheet', dest = 'sample_sheet', help = 'samplesheet associated with the analysis; only with a single analysis ID', default = None)
     parser.add_argument('-b', '--branch', dest = 'branch', help = 'git repo branch to checkout before running', default = None)
+    parser.add_argument('-j', '--threads', dest = 'threads', type = int, help = 'number of analyses to prepare at the same time', default = settings.deploy_threads)
+    parser.add_argument('--clone-from', dest = 'clone_from', help = 'local clone or worktree of the snsxt repo to clone from, instead of the network URL', default = settings.snsxt_local_repo or None)
+    parser.add_argument('--mirror-dir', dest = 'mirror_dir', help = 'directory of local bare mirrors of the snsxt repo and its submodules to make checkouts from; the mirrors are created if missing', default = settings.snsxt_mirror_dir or None)
+    parser.add_argument('--refresh-mirrors', dest = 'refresh_mirrors', action = 'store_true', help = 'update the local mirrors from the network before deploying')
+    parser.add_argument('--git-mode', dest = 'git_mode', choices = ['manifest', 'all'], default = settings.git_mode, help = "files to track in the analysis directory's git repo; 'manifest' only tracks the files matching git_track_patterns in settings.py, 'all' tracks everything")
+    parser.add_argument('--launch-script', dest = 'launch_script', help = 'file to write a combined script to start all of the deployed analyses', default = None)
+    parser.add_argument('--profile-startup', dest = 'profile_startup', nargs = '?', const = startup_profile_file, default = None, metavar = 'JSON', help = 'Time the program startup phases, module imports, and the phases of each analysis deployment, and save them to a JSON file once the analyses are deployed')
 
     # parse the args
     args = parser.parse_args()
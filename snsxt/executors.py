@@ -0,0 +1,659 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Backends for running the compute jobs submitted by analysis tasks
+
+Tasks submit their jobs through ``job_management.submit_job()``, which passes them on to the current ``job_management.executor``. Every executor has the same ``submit()``, ``monitor_jobs()``, and ``kill_jobs()`` methods as the ``qsub`` module, and returns job objects with the same ``id``, ``name``, ``log_dir``, ``completions``, and ``validate_completion()`` attributes as ``qsub.Job``, so the rest of the program does not need to know where the jobs run. The jobs of every executor also have the paths to their logs as ``stdout_log`` and ``stderr_log``. Executors also have a ``wait_jobs()`` method, which returns as soon as some of the jobs have finished. The executors record a ``job_start`` metric when each job starts running, see ``metrics.record_job_start()``.
+
+- ``SGEExecutor``: submits the jobs to the SGE cluster with ``qsub``
+- ``LocalExecutor``: runs the jobs on the local machine, as many at a time as fit in the available CPU cores and memory
+- ``DryRunExecutor``: only records the jobs that would have been submitted
+
+Examples
+--------
+Example usage::
+
+    import executors
+    executor = executors.LocalExecutor(cores = 8, memory = 32)
+    job = executor.submit(command = 'echo foo', name = 'foo', stdout_log_dir = 'logs', stderr_log_dir = 'logs')
+    jobs = [job]
+    completed_jobs, err_jobs = executor.monitor_jobs(jobs = jobs)
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import re
+import json
+import getpass
+import time
+import signal
+import itertools
+import threading
+import subprocess
+import multiprocessing
+from util import qsub
+import metrics
+
+# ~~~~~ GLOBALS ~~~~~ #
+_cores_pattern = re.compile(r'-pe\s+\S+\s+([0-9]+)')
+_memory_pattern = re.compile(r'(?:mem_free|h_vmem)=([0-9.]+)([kKmMgG]?)')
+_java_memory_pattern = re.compile(r'-Xmx([0-9]+)([kKmMgG]?)')
+_memory_units = {'': 1.0 / 1024 ** 3, 'k': 1.0 / 1024 ** 2, 'm': 1.0 / 1024, 'g': 1.0}
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def _to_gigabytes(value, unit):
+    """
+    Converts a memory size with an optional ``k``, ``m``, or ``g`` unit suffix to gigabytes
+    """
+    return(float(value) * _memory_units[unit.lower()])
+
+def get_job_resources(command, params = None, default_memory = 4):
+    """
+    Gets the number of CPU cores and the memory a job needs, from its qsub params (``-pe threaded 8``, ``-l mem_free=16G``) or otherwise from the Java heap size (``-Xmx16G``) in its command
+
+    Parameters
+    ----------
+    command: str
+        the shell command to run in the job
+    params: str
+        the extra qsub params for the job
+    default_memory: float
+        gigabytes of memory to use if none is requested
+
+    Returns
+    -------
+    tuple
+        the number of cores and the gigabytes of memory
+    """
+    cores = 1
+    memory = None
+    if params:
+        match = _cores_pattern.search(params)
+        if match:
+            cores = int(match.group(1))
+        match = _memory_pattern.search(params)
+        if match:
+            # qsub memory requests are per slot
+            memory = _to_gigabytes(*match.groups()) * cores
+    if memory is None:
+        heap_sizes = [_to_gigabytes(*match) for match in _java_memory_pattern.findall(command)]
+        if heap_sizes:
+            memory = max(heap_sizes)
+    if memory is None:
+        memory = default_memory
+    return((cores, memory))
+
+def get_log_paths(name, id, stdout_log_dir = None, stderr_log_dir = None):
+    """
+    Gets the paths to a job's stdout and stderr logs, named ``<name>.o<id>`` and ``<name>.e<id>`` like the SGE logs; the stderr log goes in the stdout log dir if no ``stderr_log_dir`` is given
+
+    Returns
+    -------
+    tuple
+        the paths to the stdout and stderr logs, each ``None`` if there is no log dir for it
+    """
+    stdout_log = None
+    stderr_log = None
+    if stdout_log_dir:
+        stdout_log = os.path.join(stdout_log_dir, '{0}.o{1}'.format(name, id))
+    if stderr_log_dir or stdout_log_dir:
+        stderr_log = os.path.join(stderr_log_dir or stdout_log_dir, '{0}.e{1}'.format(name, id))
+    return((stdout_log, stderr_log))
+
+def get_total_memory():
+    """
+    Gets the total physical memory of the local machine in gigabytes
+    """
+    try:
+        return(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / float(1024 ** 3))
+    except (ValueError, OSError, AttributeError):
+        logger.warning('Could not get the total memory of the machine, assuming 8GB')
+        return(8.0)
+
+def get_job_states():
+    """
+    Gets the state of each of the user's SGE jobs, from ``qstat``; finished jobs are not listed
+
+    Returns
+    -------
+    dict
+        the state of each job, e.g. ``'qw'``, ``'r'``, or ``'Eqw'``, by job ID; ``None`` if ``qstat`` could not be run
+    """
+    try:
+        output = subprocess.check_output(['qstat', '-u', getpass.getuser()])
+    except (OSError, subprocess.CalledProcessError):
+        logger.debug('Could not get the job states from qstat')
+        return(None)
+    states = {}
+    # the first two lines are the table header; the columns are: job-ID, prior, name, user, state, ...
+    for line in output.decode('utf-8').splitlines()[2:]:
+        fields = line.split()
+        if len(fields) > 4:
+            states[fields[0]] = fields[4]
+    return(states)
+
+def is_job(item):
+    """
+    Checks whether an item returned by a task is a compute job, from any executor
+
+    Parameters
+    ----------
+    item: object
+        an item output by an analysis task
+
+    Returns
+    -------
+    bool
+        ``True`` if the item is a job
+    """
+    return(isinstance(item, (qsub.Job, LocalJob)))
+
+def get_executor(name, **kwargs):
+    """
+    Creates the executor with the given name
+
+    Parameters
+    ----------
+    name: str
+        ``'sge'``, ``'local'``, or ``'dry-run'``
+    kwargs: dict
+        args to pass to the executor's class
+
+    Returns
+    -------
+    object
+        the executor
+    """
+    if name not in executor_classes:
+        raise ValueError('Unknown executor: {0}; choose from: {1}'.format(name, sorted(executor_classes.keys())))
+    return(executor_classes[name](**kwargs))
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class LocalJob(object):
+    """
+    A job run by the ``LocalExecutor`` or recorded by the ``DryRunExecutor``, with the same attributes as ``qsub.Job`` that the program uses
+
+    Attributes
+    ----------
+    state: str
+        ``'queued'``, ``'running'``, ``'completed'``, ``'killed'``, or ``'error'``
+    returncode: int
+        the exit status of the job's command, once it has finished
+    stdout_log: str
+        path to the job's stdout log
+    stderr_log: str
+        path to the job's stderr log, which may be in a different dir than the stdout log
+    """
+    def __init__(self, id, name, command, log_dir = None, stderr_log_dir = None, cores = 1, memory = 0, params = None):
+        self.id = str(id)
+        self.name = name
+        self.command = command
+        self.params = params
+        self.log_dir = log_dir
+        self.cores = cores
+        self.memory = memory
+        self.stdout_log, self.stderr_log = get_log_paths(name = name, id = self.id, stdout_log_dir = log_dir, stderr_log_dir = stderr_log_dir)
+        self.state = 'queued'
+        self.returncode = None
+        self.process = None
+        self.completions = None
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.done = threading.Event()
+
+    def __repr__(self):
+        return('LocalJob(id = {0}, name = {1}, state = {2})'.format(self.id, self.name, self.state))
+
+    def validate_completion(self):
+        """
+        Checks whether the job's command finished successfully
+
+        Returns
+        -------
+        bool
+            ``True`` if the command exited with status 0
+        """
+        if self.state == 'completed' and self.returncode == 0:
+            return(True)
+        self.completions = 'Job {0} ({1}) finished in state {2} with exit status {3}; logs: {4}'.format(self.id, self.name, self.state, self.returncode, self.stderr_log)
+        return(False)
+
+
+class SGEExecutor(object):
+    """
+    Submits jobs to the SGE cluster with the ``qsub`` module
+
+    Attributes
+    ----------
+    started: set
+        the IDs of the jobs that have been seen running
+    """
+    name = 'sge'
+    dry_run = False
+
+    def __init__(self, qstat_interval = 30, **kwargs):
+        """
+        Parameters
+        ----------
+        qstat_interval: float
+            seconds between the ``qstat`` checks of the jobs' states, while jobs are monitored
+        """
+        self.qstat_interval = qstat_interval
+        self.started = set()
+
+    def submit(self, command, name, **kwargs):
+        """
+        Submits a qsub job; see ``qsub.submit()``. The paths to the job's logs are set on the job as ``stdout_log`` and ``stderr_log``, like on a ``LocalJob``.
+        """
+        job = qsub.submit(command = command, name = name, **kwargs)
+        job.stdout_log, job.stderr_log = get_log_paths(name = name, id = job.id, stdout_log_dir = kwargs.get('stdout_log_dir', None), stderr_log_dir = kwargs.get('stderr_log_dir', None))
+        return(job)
+
+    def monitor_jobs(self, jobs):
+        """
+        Waits for qsub jobs to finish; see ``qsub.monitor_jobs()``. While waiting, ``qstat`` is checked in a background thread to record when each job starts running.
+        """
+        stop = threading.Event()
+        thread = threading.Thread(target = self._watch_starts, args = (list(jobs), stop), name = 'SGEExecutor')
+        thread.daemon = True
+        thread.start()
+        try:
+            return(qsub.monitor_jobs(jobs = jobs))
+        finally:
+            stop.set()
+
+    def _watch_starts(self, jobs, stop):
+        """
+        Records a ``job_start`` metric for each of the jobs when ``qstat`` first lists it as running, until all have started or ``stop`` is set
+        """
+        while not stop.wait(self.qstat_interval):
+            states = get_job_states()
+            if states is None:
+                return
+            self._record_starts(jobs = jobs, states = states)
+            if all(str(job.id) in self.started for job in jobs):
+                return
+
+    def _record_starts(self, jobs, states):
+        """
+        Records a ``job_start`` metric for each of the jobs that ``qstat`` lists as running for the first time
+        """
+        for job in jobs:
+            job_id = str(job.id)
+            if job_id not in self.started and 'r' in states.get(job_id, ''):
+                self.started.add(job_id)
+                metrics.record_job_start(job)
+
+    def wait_jobs(self, jobs, timeout = None):
+        """
+        Waits until at least one of the qsub jobs has finished, checking ``qstat`` every ``qstat_interval`` seconds, and removes the finished jobs from the list passed. Jobs in an error state (``Eqw``) never run, so they are killed and returned as errors. If ``qstat`` can not be run, waits for all of the jobs with ``monitor_jobs()`` instead.
+
+        Parameters
+        ----------
+        jobs: list
+            a list of ``qsub.Job`` objects
+        timeout: float
+            maximum seconds to wait, or ``None`` to wait until a job finishes
+
+        Returns
+        -------
+        tuple
+            a list of the jobs that finished, and a list of the jobs that could not run; both empty if none finished before the ``timeout``
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            states = get_job_states()
+            if states is None:
+                return(self.monitor_jobs(jobs = jobs))
+            self._record_starts(jobs = jobs, states = states)
+            completed_jobs = [job for job in jobs if str(job.id) not in states]
+            err_jobs = [job for job in jobs if 'E' in states.get(str(job.id), '')]
+            if completed_jobs or err_jobs:
+                if err_jobs:
+                    self.kill_jobs(jobs = err_jobs)
+                for job in completed_jobs + err_jobs:
+                    jobs.remove(job)
+                return((completed_jobs, err_jobs))
+            wait = self.qstat_interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+                if wait <= 0:
+                    return(([], []))
+            time.sleep(wait)
+
+    def kill_jobs(self, jobs):
+        """
+        Kills qsub jobs; see ``qsub.kill_jobs()``
+        """
+        return(qsub.kill_jobs(jobs = jobs))
+
+    def attach_job(self, id, name, log_dir = None):
+        """
+        Gets a qsub job submitted by an earlier run of the program, to monitor it
+        """
+        job = qsub.Job(id = id, name = name, log_dir = log_dir)
+        job.stdout_log, job.stderr_log = get_log_paths(name = name, id = id, stdout_log_dir = log_dir)
+        return(job)
+
+
+class LocalExecutor(object):
+    """
+    Runs jobs as shell processes on the local machine. Jobs are started in the order they were submitted, whenever enough CPU cores and memory are free for them; a job that needs more than the machine has is run by itself.
+
+    Attributes
+    ----------
+    cores: int
+        the number of CPU cores that jobs can use
+    memory: float
+        the gigabytes of memory that jobs can use
+    queued: list
+        the jobs waiting to start
+    running: list
+        the jobs that are running
+    """
+    name = 'local'
+    dry_run = False
+
+    def __init__(self, cores = None, memory = None, job_memory = 4, poll_interval = 0.5, **kwargs):
+        """
+        Parameters
+        ----------
+        cores: int
+            the number of CPU cores that jobs can use; defaults to all cores of the machine
+        memory: float
+            the gigabytes of memory that jobs can use; defaults to all memory of the machine
+        job_memory: float
+            gigabytes of memory for jobs that do not request any
+        poll_interval: float
+            seconds between checks for finished jobs
+        """
+        self.cores = cores or multiprocessing.cpu_count()
+        self.memory = memory or get_total_memory()
+        self.job_memory = job_memory
+        self.poll_interval = poll_interval
+        self.queued = []
+        self.running = []
+        self.free_cores = self.cores
+        self.free_memory = self.memory
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, command, name, stdout_log_dir = None, stderr_log_dir = None, params = None, **kwargs):
+        """
+        Queues a job to run on the local machine
+
+        Parameters
+        ----------
+        command: str
+            the shell command to run in the job
+        name: str
+            the name of the job
+        stdout_log_dir: str
+            the directory to save the job's stdout log to, as ``<name>.o<id>``
+        stderr_log_dir: str
+            the directory to save the job's stderr log to, as ``<name>.e<id>``
+        params: str
+            qsub params for the job, used to get the cores and memory it needs
+        kwargs: dict
+            other ``qsub.submit()`` args, which are ignored
+
+        Returns
+        -------
+        LocalJob
+            the job
+        """
+        cores, memory = get_job_resources(command = command, params = params, default_memory = self.job_memory)
+        job = LocalJob(id = '{0}{1}'.format(os.getpid(), next(self._ids)), name = name, command = command,
+                        log_dir = stdout_log_dir, stderr_log_dir = stderr_log_dir,
+                        cores = min(cores, self.cores), memory = min(memory, self.memory))
+        logger.debug('Queued local job {0} ({1}) with {2} cores and {3:.1f}GB memory'.format(job.id, job.name, job.cores, job.memory))
+        with self._condition:
+            self.queued.append(job)
+            self._condition.notify()
+            if not self._thread:
+                self._thread = threading.Thread(target = self._schedule, name = 'LocalExecutor')
+                self._thread.daemon = True
+                self._thread.start()
+        return(job)
+
+    def _start(self, job):
+        """
+        Starts the process for a job; the job's slots must already be reserved
+        """
+        stdout = open(job.stdout_log, 'w') if job.stdout_log else open(os.devnull, 'w')
+        stderr = open(job.stderr_log, 'w') if job.stderr_log else open(os.devnull, 'w')
+        try:
+            # run the job in its own process group, so that kill_jobs() stops all of its child processes too;
+            # set the same job environment variables as SGE
+            env = dict(os.environ, JOB_ID = job.id, JOB_NAME = job.name)
+            job.process = subprocess.Popen(job.command, shell = True, executable = '/bin/bash', stdout = stdout, stderr = stderr, env = env, preexec_fn = os.setsid)
+        except OSError:
+            logger.exception('Could not start local job {0} ({1})'.format(job.id, job.name))
+            job.state = 'error'
+            return(False)
+        finally:
+            stdout.close()
+            stderr.close()
+        job.state = 'running'
+        job.start_time = time.time()
+        metrics.record_job_start(job)
+        return(True)
+
+    def _finish(self, job, state, returncode):
+        """
+        Marks a job as finished and frees its slots
+        """
+        job.state = state
+        job.returncode = returncode
+        job.end_time = time.time()
+        if job in self.running:
+            self.running.remove(job)
+            self.free_cores += job.cores
+            self.free_memory += job.memory
+        job.done.set()
+
+    def _schedule(self):
+        """
+        Starts queued jobs as slots become free, and collects finished jobs; stops when there are no jobs left, and is restarted by ``submit()``
+        """
+        while True:
+            with self._condition:
+                if not self.queued and not self.running:
+                    self._thread = None
+                    return
+                for job in list(self.running):
+                    returncode = job.process.poll()
+                    if returncode is not None:
+                        self._finish(job, state = 'completed', returncode = returncode)
+                # start jobs in order; stop at the first that does not fit, so large jobs are not starved by small ones
+                while self.queued:
+                    job = self.queued[0]
+                    if self.running and (job.cores > self.free_cores or job.memory > self.free_memory):
+                        break
+                    self.queued.pop(0)
+                    if self._start(job):
+                        self.running.append(job)
+                        self.free_cores -= job.cores
+                        self.free_memory -= job.memory
+                    else:
+                        job.end_time = time.time()
+                        job.done.set()
+                self._condition.wait(self.poll_interval)
+
+    def monitor_jobs(self, jobs):
+        """
+        Waits for jobs to finish, removing them from the list passed
+
+        Parameters
+        ----------
+        jobs: list
+            a list of ``LocalJob`` objects
+
+        Returns
+        -------
+        tuple
+            a list of the jobs that ran to completion, and a list of the jobs that could not run
+        """
+        completed_jobs = []
+        err_jobs = []
+        while jobs:
+            job = jobs[0]
+            job.done.wait()
+            jobs.pop(0)
+            if job.state == 'completed':
+                completed_jobs.append(job)
+            else:
+                err_jobs.append(job)
+        return((completed_jobs, err_jobs))
+
+    def wait_jobs(self, jobs, timeout = None):
+        """
+        Waits until at least one of the jobs has finished, and removes the finished jobs from the list passed
+
+        Parameters
+        ----------
+        jobs: list
+            a list of ``LocalJob`` objects
+        timeout: float
+            maximum seconds to wait, or ``None`` to wait until a job finishes
+
+        Returns
+        -------
+        tuple
+            a list of the jobs that ran to completion, and a list of the jobs that could not run; both empty if none finished before the ``timeout``
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            finished_jobs = [job for job in jobs if job.done.is_set()]
+            if finished_jobs or not jobs:
+                break
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+                if wait <= 0:
+                    break
+            jobs[0].done.wait(wait)
+        for job in finished_jobs:
+            jobs.remove(job)
+        return(([job for job in finished_jobs if job.state == 'completed'], [job for job in finished_jobs if job.state != 'completed']))
+
+    def kill_jobs(self, jobs):
+        """
+        Kills jobs, removing them from the queue if they have not started
+
+        Parameters
+        ----------
+        jobs: list
+            a list of ``LocalJob`` objects
+        """
+        with self._condition:
+            for job in jobs:
+                if job in self.queued:
+                    self.queued.remove(job)
+                    job.state = 'killed'
+                    job.done.set()
+                elif job in self.running:
+                    try:
+                        os.killpg(job.process.pid, signal.SIGTERM)
+                    except OSError:
+                        pass
+                    self._finish(job, state = 'killed', returncode = job.process.wait())
+
+    def attach_job(self, id, name, log_dir = None):
+        """
+        Local jobs stop when the program that started them exits, so they can not be monitored by a later run
+        """
+        raise ValueError('Jobs run by the local executor can not be reattached: {0} ({1})'.format(id, name))
+
+
+class DryRunExecutor(object):
+    """
+    Records the jobs that would be submitted, without running them. Every job is reported as completed successfully.
+
+    Attributes
+    ----------
+    jobs: list
+        all of the jobs submitted
+    """
+    name = 'dry-run'
+    dry_run = True
+
+    def __init__(self, **kwargs):
+        self.jobs = []
+        self._ids = itertools.count(1)
+
+    def submit(self, command, name, stdout_log_dir = None, stderr_log_dir = None, params = None, **kwargs):
+        """
+        Records a job; takes the same args as ``LocalExecutor.submit()``
+        """
+        cores, memory = get_job_resources(command = command, params = params)
+        job = LocalJob(id = 'dryrun{0}'.format(next(self._ids)), name = name, command = command,
+                        log_dir = stdout_log_dir, stderr_log_dir = stderr_log_dir, cores = cores, memory = memory, params = params)
+        job.state = 'completed'
+        job.returncode = 0
+        job.done.set()
+        self.jobs.append(job)
+        logger.info('[dry run] job {0} ({1}) with {2} cores and {3:.1f}GB memory:\n{4}'.format(job.id, job.name, cores, memory, command))
+        return(job)
+
+    def monitor_jobs(self, jobs):
+        """
+        Removes the jobs from the list passed, and returns them all as completed
+        """
+        completed_jobs = list(jobs)
+        del jobs[:]
+        return((completed_jobs, []))
+
+    def wait_jobs(self, jobs, timeout = None):
+        """
+        Removes the jobs from the list passed, and returns them all as completed
+        """
+        return(self.monitor_jobs(jobs = jobs))
+
+    def kill_jobs(self, jobs):
+        """
+        Does nothing, since no jobs were run
+        """
+        pass
+
+    def attach_job(self, id, name, log_dir = None):
+        """
+        Gets a job recorded by an earlier dry run, as completed
+        """
+        job = LocalJob(id = id, name = name, command = None, log_dir = log_dir)
+        job.state = 'completed'
+        job.returncode = 0
+        job.done.set()
+        return(job)
+
+    def write_plan(self, output_file):
+        """
+        Writes the recorded jobs to a JSON lines file
+
+        Parameters
+        ----------
+        output_file: str
+            path to the file to write
+        """
+        with open(output_file, 'w') as f:
+            for job in self.jobs:
+                f.write(json.dumps({'id': job.id, 'name': job.name, 'cores': job.cores, 'memory': job.memory, 'params': job.params, 'log_dir': job.log_dir, 'command': job.command}) + '\n')
+        return(output_file)
+
+
+executor_classes = {
+'sge': SGEExecutor,
+'local': LocalExecutor,
+'dry-run': DryRunExecutor
+}
+"""
+The available executors, by name
+"""
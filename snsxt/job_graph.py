@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Submits the downstream analysis tasks as a graph of qsub jobs linked with ``-hold_jid`` dependencies, so the program does not need to stay running while they run
+
+Normally the program waits in ``job_management.monitor_validate_jobs()`` for the jobs of every task run with ``qsub_wait: True`` before it starts the next task. In detached mode (``run.py --detach``), tasks that submit qsub jobs are run with ``qsub_wait: False`` instead, and the jobs of every task after a ``qsub_wait: True`` task are submitted with ``-hold_jid`` on that task's jobs, so the scheduler enforces the order. SGE releases held jobs even when the jobs they wait for fail, so each job marks its success in the ``status_dirname`` directory, and a held job fails without running if any of the jobs it waits for is not marked. Tasks that run in this program itself (not as qsub jobs) can not wait on the scheduler; if one comes after a task whose jobs are held, submission stops there.
+
+The submitted jobs, the output files to validate, and the tasks that are left are saved to a state file in the analysis directory, and the program exits. Running ``run.py --reattach`` later waits for and validates the jobs and output files, runs the rest of the tasks (detaching again if needed), sets up the report, and sends the results email.
+
+Examples
+--------
+Example usage::
+
+    snsxt$ snsxt/run.py -d /path/to/analysis_dir -t task_lists/NGS580-downstream.yml --detach
+    snsxt$ snsxt/run.py -d /path/to/analysis_dir --reattach
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import json
+import time
+import inspect
+import collections
+import job_management
+import validation
+import metrics
+import _exceptions as _e
+# inspect.getargspec was removed in Python 3.11
+_getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+
+# ~~~~~ GLOBALS ~~~~~ #
+state_filename = 'snsxt_job_graph.json'
+"""
+Name of the file in the analysis directory that the state of a detached run is saved to
+"""
+
+status_dirname = 'snsxt_job_status'
+"""
+Name of the directory in the analysis directory that the jobs of a detached run mark their success in; see ``job_management.status_dir``
+"""
+
+metrics_files = []
+"""
+The metrics files of the earlier runs of a detached analysis, restored by ``load_state()``; their records hold the submissions of the jobs the run reattached to
+"""
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def get_state_file(analysis_dir):
+    """
+    Gets the path to the state file for a detached run in the analysis directory
+    """
+    return(os.path.join(analysis_dir, state_filename))
+
+def set_status_dir(analysis_dir):
+    """
+    Makes the jobs submitted from here on mark their success in the analysis directory, so that the jobs held on them do not run if they fail; the marks of the jobs of an earlier detached run are removed
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+
+    Returns
+    -------
+    str
+        path to the directory
+    """
+    status_dir = os.path.join(analysis_dir, status_dirname)
+    if not os.path.isdir(status_dir):
+        os.makedirs(status_dir)
+    for name in os.listdir(status_dir):
+        if name.endswith('.ok'):
+            os.remove(os.path.join(status_dir, name))
+    job_management.status_dir = status_dir
+    return(status_dir)
+
+def submits_jobs(task_class):
+    """
+    Checks whether an analysis task runs as qsub jobs, i.e. whether its ``run()`` method takes a ``qsub_wait`` argument
+
+    Parameters
+    ----------
+    task_class: class
+        the class of the analysis task
+
+    Returns
+    -------
+    bool
+        ``True`` if the task submits qsub jobs
+    """
+    try:
+        return('qsub_wait' in _getargspec(task_class.run).args)
+    except TypeError:
+        return(False)
+
+def detached_task_params(task_params):
+    """
+    Gets the params to run a task with when detached, and whether later tasks need to wait for the task's jobs
+
+    Parameters
+    ----------
+    task_params: dict
+        the params for the task from the task list, or ``None``
+
+    Returns
+    -------
+    tuple
+        the params to run the task with, and ``True`` if the task was set to wait for its jobs
+    """
+    params = dict(task_params or {})
+    wait = params.get('qsub_wait', True)
+    params['qsub_wait'] = False
+    return((params, wait))
+
+def save_state(analysis_dir, remaining_tasks, analysis_id = None, results_id = None, debug_mode = False, setup_report = False):
+    """
+    Saves the state of a detached run: the submitted jobs, the output files to validate once they finish, and the tasks left to run
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+    remaining_tasks: dict
+        the tasks that were not run yet, in the format ``{task_name: task_params}``
+    analysis_id: str
+        an identifier for the analysis
+    results_id: str
+        a sub-identifier for the analysis
+    debug_mode: bool
+        the ``debug_mode`` the program was run with
+    setup_report: bool
+        whether the report should be set up when the tasks are done
+
+    Returns
+    -------
+    str
+        path to the state file
+    """
+    jobs = job_management.background_jobs + job_management.retried_jobs
+    state = collections.OrderedDict()
+    state['timestamp'] = time.time()
+    state['analysis_id'] = analysis_id
+    state['results_id'] = results_id
+    state['debug_mode'] = debug_mode
+    state['setup_report'] = setup_report
+    state['executor'] = job_management.executor.name
+    state['remaining_tasks'] = [[task_name, task_params] for task_name, task_params in remaining_tasks.items()]
+    state['jobs'] = [{'id': job.id, 'name': job.name, 'log_dir': getattr(job, 'log_dir', None)} for job in jobs]
+    state['job_specs'] = dict([(job.id, job_management.job_specs[job.id]) for job in jobs if job.id in job_management.job_specs])
+    state['job_info'] = dict([(job.id, metrics.job_info[job.id]) for job in jobs if job.id in metrics.job_info])
+    state['background_output_files'] = list(validation.background_output_files)
+    state['metrics_files'] = metrics_files + [metrics.metrics_file] if metrics.metrics_file else list(metrics_files)
+
+    state_file = get_state_file(analysis_dir)
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent = 4)
+    os.rename(tmp_file, state_file)
+    logger.info('Submitted {0} jobs; run state saved to file: {1}'.format(len(jobs), state_file))
+    return(state_file)
+
+def load_state(analysis_dir):
+    """
+    Loads the state of a detached run, and restores its jobs and output files to the ``job_management.background_jobs`` and ``validation.background_output_files`` to be monitored and validated
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+
+    Returns
+    -------
+    dict
+        the saved state; ``remaining_tasks`` is an ``OrderedDict``
+    """
+    state_file = get_state_file(analysis_dir)
+    if not os.path.exists(state_file):
+        raise _e.AnalysisFileMissing(message = 'No detached run found; state file does not exist: {0}'.format(state_file), errors = '')
+    with open(state_file) as f:
+        state = json.load(f, object_pairs_hook = collections.OrderedDict)
+
+    if state['executor'] != job_management.executor.name:
+        job_management.set_executor(state['executor'])
+    for item in state['jobs']:
+        job = job_management.executor.attach_job(id = item['id'], name = item['name'], log_dir = item['log_dir'])
+        job_management.background_jobs.append(job)
+    job_management.job_specs.update(state['job_specs'])
+    for job_id, info in state['job_info'].items():
+        metrics.job_info[job_id] = tuple(info)
+    validation.background_output_files.extend(state['background_output_files'])
+    metrics_files[:] = state.get('metrics_files', [])
+    state['remaining_tasks'] = collections.OrderedDict([(task_name, task_params) for task_name, task_params in state['remaining_tasks']])
+    logger.info('Reattached to {0} jobs from file: {1}'.format(len(state['jobs']), state_file))
+    return(state)
+
+def clear_state(analysis_dir):
+    """
+    Removes the state file once a detached run is finished
+    """
+    state_file = get_state_file(analysis_dir)
+    if os.path.exists(state_file):
+        os.remove(state_file)
@@ -5,9 +5,18 @@ Functions for custom management of compute cluster qsub jobs
 """
 # ~~~~~ LOGGING ~~~~~~ #
 import os
+import re
+import time
+import math
+import pipes
 from util import log
 from util import qsub
 import logging
+import metrics
+import config
+import log_scanner
+import executors
+import job_packing
 import _exceptions as _e
 
 logger = logging.getLogger(__name__)
@@ -25,13 +34,232 @@ background_jobs = []
 If an analysis task generated qsub jobs, but did not wait for them to finish, they will be captured in this list and will be monitored to completion when `run_tasks` finishes running all tasks. This way, the program will not exit until all jobs created have finished.
 """
 
+job_specs = {}
+"""
+The original submission of each qsub job made with ``submit_job()``, used to resubmit the job if it fails. In the format ``{job_id: {'command': command, 'name': name, 'task': task, 'retry_policy': retry_policy, 'attempt': attempt, 'kwargs': kwargs}}``
+"""
+
+default_retry_policy = config.config['qsub_retry']
+"""
+Default policy for retrying failed qsub jobs, which can be overridden per task with a ``retry`` item in the task's config file. Keys: ``max_retries``, the number of times a failed job is resubmitted; ``backoff``, seconds to wait after a job fails before its first resubmission, doubled for each later attempt; ``memory_factor``, factor by which the Java heap sizes (``-Xms`` and ``-Xmx``) in the job's command and the memory requests (``mem_free`` and ``h_vmem``) in its qsub params are multiplied at each resubmission
+"""
+
+executor = executors.get_executor(config.config['executor'], **config.config['local_executor'])
+"""
+The backend that jobs are submitted to, monitored, and killed with; SGE ``qsub`` by default, see ``executors``. Set with ``set_executor()``
+"""
+
+scanner = None
+"""
+``log_scanner.LogScanner`` that checks the logs of completed jobs for error signatures, if enabled in the configs; jobs that pass ``validate_completion()`` are still invalid if their logs match a signature
+"""
+if config.config['log_scanner_enabled']:
+    scanner = log_scanner.LogScanner(signatures = config.config['log_scanner_signatures'],
+                                    threads = config.config['log_scanner_threads'],
+                                    interval = config.config['log_scanner_interval'])
+
+hold_jobs = []
+"""
+Jobs that every job submitted with ``submit_job()`` must wait for, by submitting it with ``-hold_jid``; used to submit a whole task list at once, see ``job_graph``
+"""
+
+status_dir = None
+"""
+Directory that each job submitted with ``submit_job()`` writes a ``<job name>.ok`` file to when its command succeeds. SGE starts a job held with ``-hold_jid`` once the jobs it waits for have finished, whether or not they succeeded, so a job submitted while there are ``hold_jobs`` only runs its command if all of them wrote their file, and fails otherwise. Only used when set, in detached runs; see ``guard_command()`` and ``job_graph``
+"""
+
+default_qsub_params = '-j y'
+"""
+The params that ``qsub.submit()`` uses when none are passed; jobs submitted with ``-hold_jid`` keep them
+"""
+
+retried_jobs = []
+"""
+Resubmitted jobs that have not been monitored to completion yet; killed along with the ``background_jobs`` if the program stops with an error
+"""
+
+_java_memory_pattern = re.compile(r'(-Xm[sx])([0-9]+)([kKmMgG]?)')
+_qsub_memory_pattern = re.compile(r'((?:mem_free|h_vmem)=)([0-9.]+)([kKmMgG]?)')
+
 # ~~~~ CUSTOM FUNCTIONS ~~~~~~ #
+def set_executor(name):
+    """
+    Changes the backend that jobs are run with
+
+    Parameters
+    ----------
+    name: str
+        the name of the executor, one of ``executors.executor_classes``
+    """
+    global executor
+    executor = executors.get_executor(name, **config.config['local_executor'])
+    logger.debug('Jobs will be run with the {0} executor'.format(executor.name))
+    return(executor)
+
+def check_executor(task_list):
+    """
+    Makes sure that the tasks in the task list can be run with the current ``executor``. The ``sns`` tasks run the ``sns`` pipeline, which submits its own qsub jobs, so they can only be run with the SGE executor: the local executor can not monitor them, and a dry run would still run ``sns`` and submit them.
+
+    Parameters
+    ----------
+    task_list: dict
+        dictionary of tasks read in from the tasks list file
+    """
+    if task_list.get('sns', None) and executor.name != 'sge':
+        err_message = 'The sns tasks submit their jobs with qsub; they can not be run with the {0} executor: {1}'.format(executor.name, list(task_list['sns'].keys()))
+        logger.error(err_message)
+        raise _e.ArgumentError(message = err_message, errors = '')
+
+def guard_command(command, name, hold_jobs = None):
+    """
+    Wraps the shell command of a job so that it writes the job's file in the ``status_dir`` when it succeeds, and exits with an error without running if any of the jobs it waits for did not write theirs
+
+    Parameters
+    ----------
+    command: str
+        the shell command to run in the job
+    name: str
+        the name of the job
+    hold_jobs: list
+        the jobs that the job waits for
+
+    Returns
+    -------
+    str
+        the wrapped command
+    """
+    lines = []
+    for job in hold_jobs or []:
+        ok_file = pipes.quote(os.path.join(status_dir, '{0}.ok'.format(job.name)))
+        lines.append('[ -e {0} ] || {{ echo "Job {1} ({2}) did not succeed; not running" >&2; exit 1; }}'.format(ok_file, job.id, job.name))
+    lines.append('(\n{0}\n) && touch {1}'.format(command, pipes.quote(os.path.join(status_dir, '{0}.ok'.format(name)))))
+    return('\n'.join(lines))
+
+def submit_job(command, name, task = None, retry_policy = None, **kwargs):
+    """
+    Submits a job with the current ``executor``, and records how it was submitted so that it can be retried if it fails. If there are ``hold_jobs``, the job will not start until they have finished, and with a ``status_dir``, it will fail without running its command unless they all succeeded.
+
+    Parameters
+    ----------
+    command: str
+        the shell command to run in the job
+    name: str
+        the name of the job
+    task: str
+        the name of the analysis task submitting the job
+    retry_policy: dict
+        the task's retry policy; overrides items in the ``default_retry_policy``
+    kwargs: dict
+        extra args to pass to ``qsub.submit()``
+
+    Returns
+    -------
+    qsub.Job
+        the submitted job, or the executor's equivalent
+    """
+    policy = dict(default_retry_policy)
+    policy.update(retry_policy or {})
+    submit_kwargs = dict(kwargs)
+    if status_dir:
+        # retries run the same checks
+        command = guard_command(command = command, name = name, hold_jobs = hold_jobs)
+    if hold_jobs:
+        submit_kwargs['params'] = '{0} -hold_jid {1}'.format(kwargs.get('params', default_qsub_params), ','.join([str(job.id) for job in hold_jobs]))
+    job = executor.submit(command = command, name = name, **submit_kwargs)
+    # retries are submitted after the held jobs are done, so they do not need the hold
+    job_specs[job.id] = {'command': command, 'name': name, 'task': task, 'retry_policy': policy, 'attempt': 0, 'kwargs': kwargs}
+    return(job)
+
+def scale_memory(command, factor):
+    """
+    Multiplies the Java heap sizes (``-Xms`` and ``-Xmx``) in a shell command, and the memory requests (``mem_free`` and ``h_vmem``) in qsub params
+
+    Parameters
+    ----------
+    command: str
+        the shell command, or the qsub params
+    factor: float
+        the factor to multiply the memory sizes by
+
+    Returns
+    -------
+    str
+        the updated command
+
+    Examples
+    --------
+    Example usage::
+
+        >>> scale_memory('java -Xms16G -Xmx16G -jar GenomeAnalysisTK.jar', 1.5)
+        'java -Xms24G -Xmx24G -jar GenomeAnalysisTK.jar'
+        >>> scale_memory('-pe threaded 4 -l mem_free=4G,h_vmem=4.5G', 1.5)
+        '-pe threaded 4 -l mem_free=6G,h_vmem=7G'
+
+    """
+    if not factor or factor == 1 or not command:
+        return(command)
+    def scale(match):
+        return('{0}{1}{2}'.format(match.group(1), int(math.ceil(float(match.group(2)) * factor)), match.group(3)))
+    command = _java_memory_pattern.sub(scale, command)
+    return(_qsub_memory_pattern.sub(scale, command))
+
+def get_retry_time(job):
+    """
+    Gets the time at which a failed job can be resubmitted, from the backoff of its task's retry policy; the backoff is doubled for each earlier attempt
+
+    Parameters
+    ----------
+    job: qsub.Job
+        the failed job
+
+    Returns
+    -------
+    float or None
+        the time, in seconds since the epoch, or ``None`` if the job has no retries left
+    """
+    spec = job_specs.get(job.id, None)
+    if not spec or spec['attempt'] >= spec['retry_policy'].get('max_retries', 0):
+        return(None)
+    return(time.time() + spec['retry_policy'].get('backoff', 0) * 2 ** spec['attempt'])
+
+def resubmit_job(job):
+    """
+    Resubmits a failed job, with its memory scaled by the ``memory_factor`` of its task's retry policy for each attempt
+
+    Parameters
+    ----------
+    job: qsub.Job
+        the failed job, which must have been submitted with ``submit_job()``
+
+    Returns
+    -------
+    qsub.Job
+        the new job
+    """
+    spec = job_specs[job.id]
+    attempt = spec['attempt'] + 1
+    factor = spec['retry_policy'].get('memory_factor', 1) ** attempt
+    command = scale_memory(spec['command'], factor)
+    kwargs = dict(spec['kwargs'])
+    if kwargs.get('params', None):
+        kwargs['params'] = scale_memory(kwargs['params'], factor)
+    new_job = executor.submit(command = command, name = spec['name'], **kwargs)
+    new_spec = dict(spec)
+    new_spec['attempt'] = attempt
+    job_specs[new_job.id] = new_spec
+    task, sample, submit_time = metrics.job_info.get(job.id, (spec['task'], None, None))
+    metrics.record_submission(new_job, task = task, sample = sample)
+    metrics.record('retry', task = task, sample = sample, job_id = new_job.id, failed_job_id = job.id, attempt = attempt)
+    logger.info('Job {0} ({1}) resubmitted as job {2}, attempt {3}'.format(job.id, job.name, new_job.id, attempt))
+    retried_jobs.append(new_job)
+    return(new_job)
+
 def kill_background_jobs():
     """
     Kills all jobs in the ``background_jobs``
     """
-    logger.warning("Killing background jobs: {0}".format(background_jobs))
-    qsub.kill_jobs(jobs = background_jobs)
+    logger.warning("Killing background jobs: {0}".format(background_jobs + retried_jobs))
+    executor.kill_jobs(jobs = background_jobs + retried_jobs)
     
 def monitor_validate_background_jobs():
     """
@@ -50,12 +278,12 @@ def monitor_validate_background_jobs():
 
 def monitor_validate_jobs(jobs):
     """
-    Monitors a list of qsub jobs until completion, then validates their completion status.
+    Monitors a list of qsub jobs until completion, and validates the completion status of each job as soon as it finishes. Failed jobs with retries left in their task's retry policy are resubmitted once their backoff delay has passed, and monitored along with the other jobs; see ``get_retry_time()``.
 
     Parameters
     ----------
     jobs: list
-        a list of of ``qsub.Job`` objects
+        a list of of ``qsub.Job`` objects; the list is emptied as the jobs finish
 
     Todo
     ----
@@ -68,21 +296,107 @@ def monitor_validate_jobs(jobs):
         return()
 
     logger.debug('Waiting for qsub jobs to complete:\n{0}'.format([(job.id, job.name) for job in jobs]))
+    all_invalid_jobs = []
+    # failed jobs waiting for their backoff delay before they are resubmitted, as (not_before, job)
+    pending_retries = []
+    num_jobs = len(jobs)
+    wait_time = 0.0
+
+    # scan the job logs while the jobs run; resubmitted jobs are added to the list, so they are scanned too
+    if scanner:
+        scanner.watch(jobs)
+    try:
+        while jobs or pending_retries:
+            timeout = None
+            if pending_retries:
+                timeout = max(0, min([not_before for not_before, job in pending_retries]) - time.time())
+            start = time.time()
+            if jobs:
+                completed_jobs, err_jobs = executor.wait_jobs(jobs = jobs, timeout = timeout)
+            else:
+                time.sleep(timeout)
+                completed_jobs, err_jobs = [], []
+            wait_time += time.time() - start
 
-    completed_jobs, err_jobs = qsub.monitor_jobs(jobs = jobs)
+            for job in _validate_jobs(completed_jobs = completed_jobs, err_jobs = err_jobs):
+                not_before = get_retry_time(job)
+                if not_before is None:
+                    logger.error('Job {0} ({1}) failed and will not be retried'.format(job.id, job.name))
+                    all_invalid_jobs.append(job)
+                else:
+                    logger.warning('Job {0} ({1}) failed, resubmitting in {2:.0f}s'.format(job.id, job.name, not_before - time.time()))
+                    pending_retries.append((not_before, job))
 
+            now = time.time()
+            for item in [item for item in pending_retries if item[0] <= now]:
+                pending_retries.remove(item)
+                jobs.append(resubmit_job(item[1]))
+    finally:
+        if scanner:
+            scanner.stop()
+    metrics.record('job_wait', wall_time = wait_time, jobs = num_jobs)
     logger.debug('All jobs completed')
 
-    logger.debug('Validating completion status of completed jobs...')
+    if all_invalid_jobs:
+        err_message = 'Jobs did not complete successfully:\n\n'
+        jobs_message = '\n'.join([job.completions for job in all_invalid_jobs])
+        raise _e.ComputeJobInvalid(message = err_message + jobs_message, errors = '')
+
+def _validate_jobs(completed_jobs, err_jobs):
+    """
+    Validates the completion status of finished qsub jobs, and records their completion metrics
+
+    Parameters
+    ----------
+    completed_jobs: list
+        a list of the ``qsub.Job`` objects that finished
+    err_jobs: list
+        a list of the ``qsub.Job`` objects that could not run
+
+    Returns
+    -------
+    list
+        the jobs that failed, which are the invalid completed jobs and the ``err_jobs``
+    """
+    if not completed_jobs and not err_jobs:
+        return([])
+    logger.debug('Validating completion status of completed jobs: {0}'.format([(job.id, job.name) for job in completed_jobs]))
 
     valid_jobs = []
     invalid_jobs = []
 
+    log_errors = {}
+    if scanner:
+        # only the end of each log is left to scan
+        with metrics.timer('log_scan', jobs = len(completed_jobs)):
+            log_errors = scanner.scan_jobs(completed_jobs, complete = True)
+
+    # the exit status check always runs; the log scanner can only find more failures
     for job in completed_jobs:
-        if job.validate_completion():
-            valid_jobs.append(job)
-        else:
+        if not job.validate_completion():
             invalid_jobs.append(job)
+        elif job.id in log_errors:
+            job.completions = 'Job {0} ({1}) log errors:\n{2}'.format(job.id, job.name, '\n'.join(['{0}: {1}'.format(signature, line) for signature, line in log_errors[job.id]]))
+            invalid_jobs.append(job)
+        else:
+            valid_jobs.append(job)
+
+    # packed jobs are only valid if every command in them succeeded
+    for job in list(valid_jobs) + list(invalid_jobs):
+        spec = job_specs.get(job.id, {})
+        failed_commands = job_packing.check_pack(job, task = spec.get('task', None))
+        if failed_commands:
+            job.completions = 'Job {0} ({1}) packed commands failed:\n{2}'.format(job.id, job.name, '\n'.join(['{0}: exit status {1}'.format(name, exit_code) for name, exit_code in failed_commands]))
+            if job in valid_jobs:
+                valid_jobs.remove(job)
+                invalid_jobs.append(job)
+
+    for job in valid_jobs:
+        metrics.record_job_completion(job, status = 'completed')
+    for job in invalid_jobs:
+        metrics.record_job_completion(job, status = 'invalid')
+    for job in err_jobs:
+        metrics.record_job_completion(job, status = 'error')
 
     if invalid_jobs:
         logger.error('Some completed jobs appear invalid: {0}'.format([(job.id, job.name) for job in invalid_jobs]))
@@ -90,16 +404,9 @@ def monitor_validate_jobs(jobs):
     if err_jobs:
         logger.error('Some jobs did not complete due to errors: {0}'.format([(job.id, job.name) for job in err_jobs]))
 
-    if invalid_jobs or err_jobs:
-        all_invalid_jobs = []
-
-        if invalid_jobs:
-            for job in invalid_jobs:
-                all_invalid_jobs.append(job)
+    # these jobs are done, whether or not they will be retried
+    for job in completed_jobs + err_jobs:
+        if job in retried_jobs:
+            retried_jobs.remove(job)
 
-        if err_jobs:
-            for job in err_jobs:
-                all_invalid_jobs.append(job)
-        err_message = 'Jobs did not complete successfully:\n\n'
-        jobs_message = '\n'.join([job.completions for job in all_invalid_jobs])
-        raise _e.ComputeJobInvalid(message = err_message + jobs_message, errors = '')
+    return(invalid_jobs + err_jobs)
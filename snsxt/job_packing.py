@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Packs many short commands into fewer qsub jobs
+
+Tasks like ``MuTect2Split`` submit one job per chromosome per sample pair, and many of those jobs finish in less than a minute, so most of their time is spent on qsub dispatch and scheduling. Tasks with a ``packing`` item in their config file do not submit each command as its own job; the commands are collected by a ``JobPacker`` and grouped into job scripts that run them one after another, up to a target runtime per job. The runtime of each command is estimated from the durations recorded for the same task and shard key (e.g. the chromosome) in earlier runs. With a ``max_duration``, only the commands whose recorded median duration is under it are packed; the others, including every command on a first run without recorded durations, are submitted as jobs of their own, without the pack job script. The durations of those jobs are recorded from the SGE accounting data at the end of the run; see ``record_accounting_durations()``.
+
+Each packed job writes three files to its log dir:
+
+- ``<pack name>.sh``: the job script
+- ``<pack name>.commands.tsv``: the index and name of each command in the pack
+- ``<pack name>.status.tsv``: one line per command run, with its exit code, duration in seconds, and qsub job ID
+
+The output of each command is saved to its own log file, ``<command name>.o<job id>``. A failed command does not stop the rest of the pack, and commands that already succeeded are skipped when the pack is run again, so a retried pack only re-runs its failed commands. A packed job is valid only if every one of its commands succeeded; see ``check_pack()``.
+
+Examples
+--------
+Example usage::
+
+    import job_packing
+    packer = job_packing.JobPacker(task = 'MuTect2Split', target_runtime = 1800, default_duration = 120)
+    for chrom, command in commands.items():
+        packer.add(command = command, name = 'MuTect2Split.' + chrom, key = chrom, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir)
+    jobs = packer.submit(submit_func = job_management.submit_job)
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import json
+import threading
+import itertools
+import collections
+
+# ~~~~~ GLOBALS ~~~~~ #
+history_file = None
+"""
+Path to the JSON file that the durations of packed commands are saved to and estimated from, in the format ``{task: {key: [seconds, ...]}}``; if ``None``, the ``default_duration`` of each task is used
+"""
+
+history_size = 20
+"""
+Number of recent durations to keep per task and key
+"""
+
+unpacked_jobs = {}
+"""
+The task and shard key of the commands that were submitted as jobs of their own, by job ID, in the format ``{job_id: (task, key)}``
+"""
+
+_lock = threading.Lock()
+_pack_ids = itertools.count(1)
+
+_command_template = '''
+# {index}: {name}
+if ! awk -F '\\t' '$1 == "{index}" && $3 == "0" {{ found = 1 }} END {{ exit !found }}' "$status_file" 2>/dev/null; then
+    start=$(date +%s)
+    (
+{command}
+    ) > "{log_dir}/{name}.o${{job_id}}" 2>&1
+    code=$?
+    printf '%s\\t%s\\t%s\\t%s\\t%s\\n' "{index}" "{name}" "$code" "$(( $(date +%s) - start ))" "$job_id" >> "$status_file"
+    [ "$code" -eq 0 ] || failed=1
+fi
+'''
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def _median(values):
+    """
+    Gets the median of a list of numbers
+    """
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return(values[middle])
+    return((values[middle - 1] + values[middle]) / 2.0)
+
+def load_history(path = None):
+    """
+    Loads the durations of packed commands recorded in earlier runs
+
+    Parameters
+    ----------
+    path: str
+        path to the history file; defaults to ``history_file``
+
+    Returns
+    -------
+    dict
+        a dictionary in the format ``{task: {key: [seconds, ...]}}``
+    """
+    path = path or history_file
+    if not path or not os.path.exists(path):
+        return({})
+    try:
+        with open(path) as f:
+            return(json.load(f))
+    except (IOError, ValueError):
+        logger.exception('Could not read the job duration history file: {0}'.format(path))
+        return({})
+
+def record_durations(task, durations, path = None):
+    """
+    Adds the durations of packed commands to the history file
+
+    Parameters
+    ----------
+    task: str
+        the name of the analysis task
+    durations: list
+        a list of ``(key, seconds)`` tuples
+    path: str
+        path to the history file; defaults to ``history_file``
+    """
+    path = path or history_file
+    if not path or not durations:
+        return()
+    with _lock:
+        history = load_history(path)
+        task_history = history.setdefault(task, {})
+        for key, seconds in durations:
+            values = task_history.setdefault(key, [])
+            values.append(seconds)
+            del values[:-history_size]
+        tmp_file = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(history, f, indent = 4, sort_keys = True)
+        os.rename(tmp_file, path)
+
+def record_accounting_durations(rows, path = None):
+    """
+    Adds the durations of the commands that were submitted as jobs of their own to the history file, from their SGE accounting data
+
+    Parameters
+    ----------
+    rows: list
+        the rows made by ``accounting.collect()``
+    path: str
+        path to the history file; defaults to ``history_file``
+    """
+    task_durations = collections.OrderedDict()
+    for row in rows:
+        if row['job_id'] not in unpacked_jobs or row['wallclock'] is None:
+            continue
+        if row['failed'] != '0' or row['exit_status'] != '0':
+            continue
+        task, key = unpacked_jobs[row['job_id']]
+        task_durations.setdefault(task, []).append((key if key is not None else '', int(round(row['wallclock']))))
+    for task, durations in task_durations.items():
+        record_durations(task = task, durations = durations, path = path)
+
+def get_recorded_duration(task, key, history):
+    """
+    Gets the median duration recorded for a task and key
+
+    Parameters
+    ----------
+    task: str
+        the name of the analysis task
+    key: str
+        the shard key of the command, e.g. the chromosome
+    history: dict
+        the durations from ``load_history()``
+
+    Returns
+    -------
+    float or None
+        the median duration in seconds, or ``None`` if no durations were recorded
+    """
+    values = history.get(task, {}).get(key, None) if key is not None else None
+    if not values:
+        return(None)
+    return(_median(values))
+
+def estimate_duration(task, key, history, default_duration):
+    """
+    Estimates how long a command will run, from the median duration recorded for its task and key, or for any key of its task
+
+    Parameters
+    ----------
+    task: str
+        the name of the analysis task
+    key: str
+        the shard key of the command, e.g. the chromosome
+    history: dict
+        the durations from ``load_history()``
+    default_duration: float
+        the seconds to estimate if there is no history for the task
+
+    Returns
+    -------
+    float
+        the estimated duration in seconds
+    """
+    recorded = get_recorded_duration(task = task, key = key, history = history)
+    if recorded is not None:
+        return(recorded)
+    task_history = history.get(task, {})
+    all_durations = [seconds for values in task_history.values() for seconds in values]
+    if all_durations:
+        return(_median(all_durations))
+    return(default_duration)
+
+def pack_commands(commands, target_runtime):
+    """
+    Groups commands into packs whose estimated durations add up to at most the target runtime, longest commands first (first-fit decreasing); a command longer than the target runtime, or that is not ``packable``, gets a pack to itself
+
+    Parameters
+    ----------
+    commands: list
+        a list of ``PackedCommand`` objects
+    target_runtime: float
+        the target total duration per pack, in seconds
+
+    Returns
+    -------
+    list
+        a list of packs, each a list of ``PackedCommand`` objects in the order they were added
+    """
+    packs = []
+    totals = []
+    for command in sorted(commands, key = lambda command: command.estimate, reverse = True):
+        if not command.packable:
+            packs.append([command])
+            totals.append(float('inf'))
+            continue
+        for i, total in enumerate(totals):
+            if total + command.estimate <= target_runtime:
+                packs[i].append(command)
+                totals[i] += command.estimate
+                break
+        else:
+            packs.append([command])
+            totals.append(command.estimate)
+    return([sorted(pack, key = lambda command: command.order) for pack in packs])
+
+def get_pack_files(job):
+    """
+    Gets the paths to the files of a packed job
+
+    Parameters
+    ----------
+    job: qsub.Job
+        the job
+
+    Returns
+    -------
+    tuple
+        the paths to the job's commands file and status file
+    """
+    log_dir = getattr(job, 'log_dir', None) or ''
+    return((os.path.join(log_dir, job.name + '.commands.tsv'), os.path.join(log_dir, job.name + '.status.tsv')))
+
+def read_status(status_file):
+    """
+    Reads the status file of a packed job
+
+    Parameters
+    ----------
+    status_file: str
+        path to the status file
+
+    Returns
+    -------
+    dict
+        the last status recorded for each command, in the format ``{index: {'name': name, 'exit_code': int, 'seconds': int, 'job_id': str}}``
+    """
+    statuses = {}
+    if not os.path.exists(status_file):
+        return(statuses)
+    with open(status_file) as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != 5:
+                continue
+            index, name, exit_code, seconds, job_id = parts
+            try:
+                statuses[index] = {'name': name, 'exit_code': int(exit_code), 'seconds': int(seconds), 'job_id': job_id}
+            except ValueError:
+                continue
+    return(statuses)
+
+def check_pack(job, task = None):
+    """
+    Checks whether every command in a packed job succeeded, and records the durations of the commands that ran in the job to the history
+
+    Parameters
+    ----------
+    job: qsub.Job
+        the job
+    task: str
+        the name of the analysis task the job belongs to, for the history
+
+    Returns
+    -------
+    list or None
+        ``None`` if the job is not a packed job, otherwise a list of ``(name, exit_code)`` tuples for the commands that failed or did not run
+    """
+    commands_file, status_file = get_pack_files(job)
+    if not os.path.exists(commands_file):
+        return(None)
+    statuses = read_status(status_file)
+    failed = []
+    durations = []
+    with open(commands_file) as f:
+        for line in f:
+            index, name, key = line.rstrip('\n').split('\t')
+            status = statuses.get(index, None)
+            if not status:
+                failed.append((name, None))
+                continue
+            if status['exit_code'] != 0:
+                failed.append((name, status['exit_code']))
+            elif status['job_id'] == str(job.id) and task:
+                durations.append((key, status['seconds']))
+    if task:
+        record_durations(task = task, durations = durations)
+    return(failed)
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class PackedCommand(object):
+    """
+    A command added to a ``JobPacker``, to be run in a packed job; commands that are not ``packable`` run in a job of their own
+    """
+    def __init__(self, command, name, key, estimate, order, submit_kwargs, packable = True):
+        self.command = command
+        self.name = name
+        self.key = key
+        self.estimate = estimate
+        self.order = order
+        self.submit_kwargs = submit_kwargs
+        self.packable = packable
+        self.job = None
+        """
+        The packed job the command was submitted in
+        """
+
+    def __repr__(self):
+        return('PackedCommand(name = {0}, estimate = {1})'.format(self.name, self.estimate))
+
+
+class JobPacker(object):
+    """
+    Collects the commands of a task and submits them packed into qsub jobs
+
+    Attributes
+    ----------
+    commands: list
+        the ``PackedCommand`` objects waiting to be submitted
+    """
+    def __init__(self, task, target_runtime = 1800, default_duration = 60, max_duration = None):
+        """
+        Parameters
+        ----------
+        task: str
+            the name of the analysis task
+        target_runtime: float
+            the target total duration per packed job, in seconds
+        default_duration: float
+            the estimated duration of a command when there is no history for the task
+        max_duration: float
+            only pack commands whose median duration recorded for their task and key is less than this many seconds; commands without recorded durations are not packed either. If ``None``, every command is packed
+        """
+        self.task = task
+        self.target_runtime = target_runtime
+        self.default_duration = default_duration
+        self.max_duration = max_duration
+        self.history = load_history()
+        self.commands = []
+
+    def add(self, command, name, key = None, **kwargs):
+        """
+        Adds a command to be packed
+
+        Parameters
+        ----------
+        command: str
+            the shell command
+        name: str
+            the name of the command, used for its log file
+        key: str
+            the shard key used to estimate the command's duration, e.g. the chromosome
+        kwargs: dict
+            args for submitting the packed job; only commands with the same args are packed together
+
+        Returns
+        -------
+        PackedCommand
+            the command
+        """
+        estimate = estimate_duration(task = self.task, key = key, history = self.history, default_duration = self.default_duration)
+        packable = True
+        if self.max_duration is not None:
+            recorded = get_recorded_duration(task = self.task, key = key, history = self.history)
+            packable = recorded is not None and recorded < self.max_duration
+        item = PackedCommand(command = command, name = name, key = key, estimate = estimate, order = len(self.commands), submit_kwargs = kwargs, packable = packable)
+        self.commands.append(item)
+        return(item)
+
+    def write_script(self, pack_name, commands, log_dir):
+        """
+        Writes the job script and commands file for a pack
+
+        Parameters
+        ----------
+        pack_name: str
+            the name of the packed job
+        commands: list
+            the ``PackedCommand`` objects to run in the job
+        log_dir: str
+            the directory to write the files and command logs to
+
+        Returns
+        -------
+        str
+            path to the job script
+        """
+        script_file = os.path.join(log_dir, pack_name + '.sh')
+        commands_file = os.path.join(log_dir, pack_name + '.commands.tsv')
+        status_file = os.path.join(log_dir, pack_name + '.status.tsv')
+        lines = ['#!/bin/bash',
+                '# {0} commands packed by snsxt for task {1}'.format(len(commands), self.task),
+                'status_file="{0}"'.format(status_file),
+                'job_id="${JOB_ID:-$$}"',
+                'failed=0']
+        for index, item in enumerate(commands):
+            lines.append(_command_template.format(index = index, name = item.name, command = item.command, log_dir = log_dir))
+        lines.append('exit $failed')
+        with open(script_file, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        with open(commands_file, 'w') as f:
+            for index, item in enumerate(commands):
+                f.write('{0}\t{1}\t{2}\n'.format(index, item.name, item.key if item.key is not None else ''))
+        return(script_file)
+
+    def submit(self, submit_func, **kwargs):
+        """
+        Packs the collected commands and submits the packs as jobs
+
+        Parameters
+        ----------
+        submit_func: function
+            the function to submit each job with, e.g. ``job_management.submit_job``; called with ``command``, ``name``, the commands' submit args, and ``kwargs``
+        kwargs: dict
+            extra args to pass to ``submit_func``
+
+        Returns
+        -------
+        list
+            the submitted jobs
+        """
+        # only commands submitted with the same args can share a job
+        groups = collections.OrderedDict()
+        for item in self.commands:
+            group_key = tuple(sorted(item.submit_kwargs.items()))
+            groups.setdefault(group_key, []).append(item)
+
+        jobs = []
+        for group_key, commands in groups.items():
+            submit_kwargs = dict(group_key)
+            log_dir = submit_kwargs.get('stdout_log_dir', None) or os.getcwd()
+            for pack in pack_commands(commands = commands, target_runtime = self.target_runtime):
+                job_kwargs = dict(submit_kwargs)
+                job_kwargs.update(kwargs)
+                if len(pack) == 1:
+                    # a command on its own does not need the pack job script
+                    item = pack[0]
+                    job = submit_func(command = item.command, name = item.name, **job_kwargs)
+                    unpacked_jobs[str(job.id)] = (self.task, item.key)
+                    item.job = job
+                    jobs.append(job)
+                    continue
+                pack_name = '{0}.pack{1}.{2}'.format(self.task, next(_pack_ids), os.getpid())
+                script_file = self.write_script(pack_name = pack_name, commands = pack, log_dir = log_dir)
+                job = submit_func(command = 'bash "{0}"'.format(script_file), name = pack_name, **job_kwargs)
+                for item in pack:
+                    item.job = job
+                jobs.append(job)
+                logger.debug('Packed {0} commands (estimated {1:.0f}s) into job {2} ({3})'.format(len(pack), sum([item.estimate for item in pack]), job.id, pack_name))
+        logger.info('Submitted {0} commands for task {1} in {2} jobs'.format(len(self.commands), self.task, len(jobs)))
+        self.commands = []
+        return(jobs)
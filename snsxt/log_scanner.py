@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Scans qsub job log files for known error signatures
+
+All the error signatures are combined into a single compiled regular expression, so each log line is only matched once. Logs are read incrementally: the scanner remembers how far it has read into each file, so logs can be scanned in the background while their jobs are still running, and the final scan when the jobs complete only reads the lines written since. The results are cached per log file, so validating thousands of jobs at the end of a run does not need to open thousands of files again.
+
+Examples
+--------
+Example usage::
+
+    import log_scanner
+    scanner = log_scanner.LogScanner(signatures = {'java_oom': 'java.lang.OutOfMemoryError', 'segfault': 'Segmentation fault'})
+    scanner.watch(jobs)
+    completed_jobs, err_jobs = qsub.monitor_jobs(jobs = jobs)
+    scanner.stop()
+    errors = scanner.scan_jobs(completed_jobs, complete = True)
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import re
+import threading
+from multiprocessing.pool import ThreadPool
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class LogScanner(object):
+    """
+    Finds error signatures in qsub job log files, caching the results per file
+
+    Attributes
+    ----------
+    pattern: re.RegexObject
+        a single compiled regex with one named group per signature
+    cache: dict
+        the scan state of each log file, in the format ``{path: {'offset': bytes_read, 'matches': [(signature, line), ...], 'lock': threading.Lock}}``
+    """
+    def __init__(self, signatures, threads = 8, interval = 60, max_matches = 10):
+        """
+        Parameters
+        ----------
+        signatures: dict
+            the error signatures to search for, in the format ``{name: regex}``
+        threads: int
+            number of log files to scan at the same time
+        interval: int
+            seconds between background scans started with ``watch()``
+        max_matches: int
+            maximum number of matching lines to keep per log file
+        """
+        self.signatures = signatures
+        self.names = sorted(signatures.keys())
+        # one named group per signature; group names must be identifiers
+        self.pattern = re.compile('|'.join(['(?P<sig{0}>{1})'.format(i, signatures[name]) for i, name in enumerate(self.names)]), re.MULTILINE)
+        self.threads = threads
+        self.interval = interval
+        self.max_matches = max_matches
+        self.cache = {}
+        self.lock = threading.Lock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+
+    def log_files(self, job):
+        """
+        Gets the paths to the log files of a qsub job, from the job's ``stdout_log`` and ``stderr_log``, which may be in different dirs; for jobs without them, the logs named ``<job name>.o<job id>`` and ``<job name>.e<job id>`` in the job's log dir are used
+
+        Parameters
+        ----------
+        job: qsub.Job
+            the job
+
+        Returns
+        -------
+        list
+            the paths to the job's log files which exist
+        """
+        candidates = [getattr(job, 'stdout_log', None), getattr(job, 'stderr_log', None)]
+        if not any(candidates):
+            log_dir = getattr(job, 'log_dir', None)
+            if not log_dir:
+                return([])
+            candidates = [os.path.join(log_dir, '{0}.{1}{2}'.format(job.name, stream, job.id)) for stream in ['o', 'e']]
+        paths = []
+        for path in candidates:
+            if path and path not in paths and os.path.exists(path):
+                paths.append(path)
+        return(paths)
+
+    def scan_file(self, path, complete = False):
+        """
+        Scans the part of a log file not scanned yet for the error signatures
+
+        Parameters
+        ----------
+        path: str
+            path to the log file
+        complete: bool
+            whether the file is finished; if ``False``, a last line without a newline is left to be scanned later, since the job may still be writing it
+
+        Returns
+        -------
+        list
+            all the ``(signature, line)`` matches found in the file so far
+        """
+        with self.lock:
+            state = self.cache.setdefault(path, {'offset': 0, 'matches': [], 'lock': threading.Lock()})
+        # the background scan and the final scan can reach the same file at once; only one of them reads and updates it at a time
+        with state['lock']:
+            return(self._scan_file(path = path, state = state, complete = complete))
+
+    def _scan_file(self, path, state, complete):
+        """
+        Scans the part of a log file after the ``offset`` in its ``state``, and updates the state; see ``scan_file()``
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return(list(state['matches']))
+        if size < state['offset']:
+            # the file was replaced; start over
+            state['offset'] = 0
+            state['matches'] = []
+        if size == state['offset']:
+            return(list(state['matches']))
+
+        with open(path, 'rb') as f:
+            f.seek(state['offset'])
+            data = f.read(size - state['offset'])
+        # only scan complete lines; the rest is scanned once the job has written the end of the line
+        end = len(data) if complete else data.rfind(b'\n') + 1
+        if end == 0:
+            return(list(state['matches']))
+        text = data[:end].decode('utf-8', 'replace')
+        for match in self.pattern.finditer(text):
+            if len(state['matches']) >= self.max_matches:
+                break
+            signature = self.names[int(match.lastgroup[3:])]
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            line_end = text.find('\n', match.end())
+            state['matches'].append((signature, text[line_start:line_end].strip()))
+        state['offset'] += end
+        return(list(state['matches']))
+
+    def scan_job(self, job, complete = False):
+        """
+        Scans all the log files of a qsub job
+
+        Parameters
+        ----------
+        job: qsub.Job
+            the job
+        complete: bool
+            whether the job has finished writing its logs
+
+        Returns
+        -------
+        list
+            the ``(signature, line)`` matches found in the job's logs
+        """
+        matches = []
+        for path in self.log_files(job):
+            matches.extend(self.scan_file(path, complete = complete))
+        return(matches)
+
+    def scan_jobs(self, jobs, complete = False):
+        """
+        Scans the log files of several qsub jobs in parallel
+
+        Parameters
+        ----------
+        jobs: list
+            a list of ``qsub.Job`` objects
+        complete: bool
+            whether the jobs have finished writing their logs
+
+        Returns
+        -------
+        dict
+            a dictionary in the format ``{job_id: [(signature, line), ...]}`` for the jobs whose logs contain errors
+        """
+        if not jobs:
+            return({})
+        pool = ThreadPool(max(1, min(self.threads, len(jobs))))
+        try:
+            results = pool.map(lambda job: self.scan_job(job, complete = complete), jobs)
+        finally:
+            pool.close()
+            pool.join()
+        return(dict([(job.id, matches) for job, matches in zip(jobs, results) if matches]))
+
+    def _watch(self, jobs):
+        """
+        Scans the logs of the jobs every ``interval`` seconds until ``stop()`` is called
+        """
+        while not self._watch_stop.wait(self.interval):
+            try:
+                self.scan_jobs(list(jobs))
+            except Exception:
+                logger.exception('Background log scan failed')
+
+    def watch(self, jobs):
+        """
+        Starts scanning the logs of the jobs in a background thread while they run, so that only the last part of each log is left to scan once the jobs complete
+
+        Parameters
+        ----------
+        jobs: list
+            a list of ``qsub.Job`` objects; the list is read again at each scan, so jobs added to it while they are monitored are scanned too, and jobs removed from it are not
+        """
+        self.stop()
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target = self._watch, args = (jobs,), name = 'LogScanner')
+        self._watch_thread.daemon = True
+        self._watch_thread.start()
+
+    def stop(self):
+        """
+        Stops the background scanning started with ``watch()``
+        """
+        if self._watch_thread:
+            self._watch_stop.set()
+            self._watch_thread.join()
+            self._watch_thread = None
@@ -6,11 +6,14 @@ Sends email output of the pipeline results
 # ~~~~~ LOGGING ~~~~~~ #
 import os
 import shutil
+import zipfile
+from multiprocessing.pool import ThreadPool
 from util import log
 import logging
 import config
 from util import tools
 from util import mutt
+import notifications
 import _exceptions as _e
 
 logger = logging.getLogger(__name__)
@@ -19,6 +22,8 @@ logger = logging.getLogger(__name__)
 scriptdir = os.path.dirname(os.path.realpath(__file__))
 scriptname = os.path.basename(__file__)
 script_timestamp = log.timestamp()
+# dir for logs, the same as the one used by run.py
+log_dir = os.path.join(os.path.dirname(scriptdir), 'logs')
 
 # ~~~~~ SETUP FUNCTIONS ~~~~~ #
 def check_default_address(address, server, default_key = '__self__'):
@@ -63,6 +68,24 @@ success_subject_line_base = configs['success_subject_line_base']
 error_subject_line_base = configs['error_subject_line_base']
 notification_subject_line_base = configs['notification_subject_line_base']
 
+email_archive_threshold = configs['email_archive_threshold']
+email_max_attachment_size = configs['email_max_attachment_size']
+email_file_threads = configs['email_file_threads']
+
+if configs['notification_sink'] == 'file':
+    # a relative path is in the log dir, wherever the program is run from
+    notification_sink = notifications.FileSink(output_file = os.path.join(log_dir, configs['notification_file']))
+else:
+    notification_sink = notifications.MuttSink()
+
+notification_dispatcher = notifications.NotificationDispatcher(sink = notification_sink,
+                                coalesce_time = configs['notification_coalesce_time'],
+                                max_retries = configs['notification_max_retries'],
+                                retry_delay = configs['notification_retry_delay'])
+"""
+Sends notification emails in the background, so that they do not hold up the pipeline. Must be drained with ``drain_notifications()`` before the program exits.
+"""
+
 # list to hold files to send as attachments
 # other modults should append to this
 # TODO: is there a better way to handle this ??
@@ -75,55 +98,266 @@ Examples
 Example usage::
 
     task_output_file = 'foo.txt'
-    mail.email_files.append(task_output_file)
+    mail.add_email_file(task_output_file)
 
 """
 
 # ~~~~ CUSTOM FUNCTIONS ~~~~~~ #
-def sns_start_email(analysis_dir, **kwargs):
+def notify(message, subject_line = None, **kwargs):
     """
-    Emails the user when the sns pipeline starts
+    Queues a notification email to be sent in the background by the ``notification_dispatcher``
 
     Parameters
     ----------
-    analysis_dir: str
-        path to a directory to hold the analysis output
+    message: str
+        the body of the email
+    subject_line: str
+        text to append to the base subject line for notifications
     kwargs: dict
-        dictionary containing extra args to pass to `run_tasks`
+        dictionary containing extra args
 
+    Keyword Arguments
+    -----------------
+    recipient_list: str
+        the recipients for the email, in the format ``recipient_list = "user1@server.com,user2@server.com" ``
+    reply_to: str
+        email address to use in the 'Reply To' field of the email
+    subject_line_base: str
+        the base subject line to use for the email
     """
     recipient_list = kwargs.pop('recipient_list', notification_recipients)
     reply_to = kwargs.pop('reply_to', default_reply_to)
-    subject_line = kwargs.pop('subject_line', notification_subject_line_base)
+    subject_line_base = kwargs.pop('subject_line_base', notification_subject_line_base)
+
+    if subject_line:
+        subject_line = subject_line_base + ' ' + subject_line
+    else:
+        subject_line = subject_line_base
+
+    notification_dispatcher.notify(subject_line = subject_line, message = message, recipient_list = recipient_list, reply_to = reply_to)
 
-    subject_line = subject_line + ' sns analysis started'
+def drain_notifications(timeout = None):
+    """
+    Sends all queued notifications; should be called before the program exits
+
+    Parameters
+    ----------
+    timeout: int
+        maximum number of seconds to wait; defaults to ``notification_drain_timeout`` from the configs
+    """
+    if timeout is None:
+        timeout = configs['notification_drain_timeout']
+    notification_dispatcher.drain(timeout = timeout)
 
+def sns_start_email(analysis_dir, **kwargs):
+    """
+    Emails the user when the sns pipeline starts. The email is sent in the background; see ``notify()``
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to a directory to hold the analysis output
+    kwargs: dict
+        dictionary containing extra args to pass to `notify()`
+
+    """
     message = "sns analysis started in directory:\n{0}".format(analysis_dir)
+    notify(message = message, subject_line = 'sns analysis started', **kwargs)
 
-    mail_command = mutt.mutt_mail(recipient_list = recipient_list,
-                    reply_to = reply_to,
-                    subject_line = subject_line,
-                    message = message,
-                    return_only_mode = True)
-    run_cmd = tools.SubprocessCmd(command = mail_command).run()
-    # print run command output messages
-    logger.debug(run_cmd.proc_stdout)
-    logger.debug(run_cmd.proc_stderr)
+def task_progress_email(task_name, message, **kwargs):
+    """
+    Emails the user an update on the progress of an analysis task, if ``task_progress_notifications`` is enabled in the configs. Updates are sent in the background, and bursts of updates are combined into a single digest email; see ``notify()``
+
+    Parameters
+    ----------
+    task_name: str
+        the name of the analysis task
+    message: str
+        the progress update
+    kwargs: dict
+        dictionary containing extra args to pass to `notify()`
+    """
+    if not configs['task_progress_notifications']:
+        return()
+    notify(message = message, subject_line = 'task {0}'.format(task_name), **kwargs)
+
+
+def add_email_file(path):
+    """
+    Adds a file to the ``email_files`` list, unless it is already present
+
+    Parameters
+    ----------
+    path: str
+        path to a file to include as an email attachment
+    """
+    path = os.path.realpath(path)
+    if path not in email_files:
+        email_files.append(path)
 
+def _get_file_size(path):
+    """
+    Gets the size of a file, or ``None`` if it does not exist
+    """
+    if not tools.item_exists(path):
+        return(None)
+    return(os.path.getsize(path))
+
+def get_email_file_sizes(items):
+    """
+    Gets the sizes of the email files in parallel, to avoid waiting on many serial ``stat`` calls on slow network filesystems
+
+    Parameters
+    ----------
+    items: list
+        a list of file paths
+
+    Returns
+    -------
+    list
+        a list of ``(path, size)`` tuples, where size is ``None`` for files that do not exist
+    """
+    if not items:
+        return([])
+    pool = ThreadPool(processes = max(1, min(email_file_threads, len(items))))
+    try:
+        sizes = pool.map(_get_file_size, items)
+    finally:
+        pool.close()
+        pool.join()
+    return(list(zip(items, sizes)))
 
 def validate_email_files():
     """
-    Makes sure all the items in the ``email_files`` list exist and are considered valid for inclusion in email output
+    Makes sure all the items in the ``email_files`` list exist and are considered valid for inclusion in email output. Duplicate and missing files are removed from the list.
+
+    Returns
+    -------
+    list
+        a list of ``(path, size)`` tuples for the valid email files
 
     Notes
     -----
     Since the email output is sent by an external program such as ``mutt``, it is important that file attachments be valid before attempting to include them, since it will be more difficult to ensure that the email is sent successfully.
 
     """
-    for i, item in enumerate(email_files):
-        if not tools.item_exists(item):
-            logger.error('email file does not exist: {0}'.format(item))
-            email_files.pop(i)
+    unique_files = []
+    for item in email_files:
+        path = os.path.realpath(item)
+        if path not in unique_files:
+            unique_files.append(path)
+
+    valid_files = []
+    for path, size in get_email_file_sizes(unique_files):
+        if size is None:
+            logger.error('email file does not exist: {0}'.format(path))
+        else:
+            valid_files.append((path, size))
+
+    email_files[:] = [path for path, size in valid_files]
+    return(valid_files)
+
+def _archive_names(items):
+    """
+    Makes a unique name inside the archive for each file; files are stored by their basename, unless another file has the same basename
+
+    Returns
+    -------
+    dict
+        a dictionary in the format ``{path: name}``
+    """
+    basenames = [os.path.basename(item) for item in items]
+    names = {}
+    for item in items:
+        name = os.path.basename(item)
+        if basenames.count(name) > 1:
+            name = os.path.join(os.path.basename(os.path.dirname(item)), name)
+        names[item] = name
+    return(names)
+
+def write_archive(archive_file, items):
+    """
+    Writes files to a compressed .zip archive
+
+    Parameters
+    ----------
+    archive_file: str
+        path to the .zip file to create
+    items: list
+        a list of file paths to add to the archive
+
+    Returns
+    -------
+    dict
+        a dictionary of the compressed size of each file in the archive, in the format ``{path: size}``
+    """
+    names = _archive_names(items)
+    compressed_sizes = {}
+    archive = zipfile.ZipFile(archive_file, 'w', zipfile.ZIP_DEFLATED, allowZip64 = True)
+    try:
+        for item in items:
+            archive.write(item, names[item])
+            compressed_sizes[item] = archive.getinfo(names[item]).compress_size
+    finally:
+        archive.close()
+    return(compressed_sizes)
+
+def package_email_files(archive_file, file_sizes = None, archive_threshold = None, max_size = None):
+    """
+    Gets the attachments to send for the ``email_files``. If the total size of the files is above the ``archive_threshold``, they are bundled into a single compressed .zip archive. Files are left out if they do not fit in the ``max_size`` budget, so that the mail relay does not reject the message.
+
+    Parameters
+    ----------
+    archive_file: str
+        path to the .zip file to create if the files need to be archived
+    file_sizes: list
+        a list of ``(path, size)`` tuples; if ``None``, the ``email_files`` are validated and used
+    archive_threshold: int
+        total size in bytes above which files are archived; defaults to ``email_archive_threshold`` from the configs
+    max_size: int
+        maximum total size in bytes of the attachments; defaults to ``email_max_attachment_size`` from the configs
+
+    Returns
+    -------
+    list
+        a list of paths to the files to attach to the email
+    """
+    if file_sizes is None:
+        file_sizes = validate_email_files()
+    if archive_threshold is None:
+        archive_threshold = email_archive_threshold
+    if max_size is None:
+        max_size = email_max_attachment_size
+    items = [path for path, size in file_sizes]
+    total_size = sum([size for path, size in file_sizes])
+
+    if total_size <= min(archive_threshold, max_size):
+        return(items)
+
+    logger.debug('Email files total {0} bytes, bundling them into archive: {1}'.format(total_size, archive_file))
+    compressed_sizes = write_archive(archive_file = archive_file, items = items)
+    if os.path.getsize(archive_file) <= max_size:
+        return([archive_file])
+
+    # keep as many files as possible in the budget, smallest first
+    included = []
+    included_size = 0
+    for path in sorted(items, key = lambda item: compressed_sizes[item]):
+        if included_size + compressed_sizes[path] <= max_size:
+            included.append(path)
+            included_size += compressed_sizes[path]
+    # the archive's headers add to the compressed sizes; leave out the largest of the files until the finished archive fits
+    while included:
+        write_archive(archive_file = archive_file, items = [path for path in items if path in included])
+        if os.path.getsize(archive_file) <= max_size:
+            break
+        included.pop()
+    excluded = [path for path in items if path not in included]
+    logger.warning('Email attachments exceed the size limit of {0} bytes; these files were left out of the email:\n{1}'.format(max_size, '\n'.join(excluded)))
+    if not included:
+        os.remove(archive_file)
+        return([])
+    return([archive_file])
 
 def email_error_output(message_file, *args, **kwargs):
     """
@@ -146,7 +380,7 @@ def email_error_output(message_file, *args, **kwargs):
 
 def email_output(message_file, *args, **kwargs):
     """
-    Sends an email upon the successful completion of the analysis pipeline. If any ``email_files`` were set by the program while running, they will be validated and included as email attachments.
+    Sends an email upon the successful completion of the analysis pipeline. If any ``email_files`` were set by the program while running, they will be validated and included as email attachments; see ``package_email_files()``.
 
     Parameters
     ----------
@@ -170,15 +404,17 @@ def email_output(message_file, *args, **kwargs):
     reply_to = kwargs.pop('reply_to', default_reply_to)
     subject_line = kwargs.pop('subject_line', success_subject_line_base)
 
-    validate_email_files()
+    file_sizes = validate_email_files()
 
     logger.debug('email_files: {0}'.format(email_files))
 
+    attachment_files = package_email_files(archive_file = message_file + '.attachments.zip', file_sizes = file_sizes)
+
     mail_command = mutt.mutt_mail(recipient_list = recipient_list,
                     reply_to = reply_to,
                     subject_line = subject_line,
                     message_file = message_file,
-                    attachment_files = email_files,
+                    attachment_files = attachment_files,
                     return_only_mode = True)
     run_cmd = tools.SubprocessCmd(command = mail_command).run()
     # print run command output messages
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Structured timing metrics for the pipeline
+
+Each phase of each analysis task (initialization, report setup, job submission, waiting for jobs, running, validation) is timed and recorded as one JSON object per line in the ``metrics_file``. The lines are written in batches by the ``async_logging`` background thread, so recording a metric does not wait on the network file system; ``flush()`` waits until they are all in the file. At the end of the program, ``write_summary()`` aggregates the records into a table showing where the time was spent.
+
+Examples
+--------
+Example usage::
+
+    import metrics
+    metrics.metrics_file = 'metrics.jsonl'
+
+    with metrics.timer('run', task = 'Delly2') as m:
+        jobs = task.run()
+        m['jobs'] = len(jobs)
+
+    metrics.record('submit', task = 'Delly2', sample = 'HapMap-B17-1267', job_id = '4134723')
+    metrics.write_summary(output_file = 'snsxt_metrics_summary.tsv')
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import json
+import time
+import threading
+import collections
+import async_logging
+
+# ~~~~~ GLOBALS ~~~~~ #
+metrics_file = None
+"""
+Path to the JSON lines file that metrics are written to as they are recorded; if ``None``, metrics are only kept in memory
+"""
+
+records = []
+"""
+All the metrics recorded by the program, as dictionaries
+"""
+
+listeners = []
+"""
+Functions called with each metrics record as it is recorded, e.g. to update live monitoring
+"""
+
+job_info = {}
+"""
+The task and sample that each submitted qsub job belongs to, in the format ``{job_id: (task, sample, submit_time)}``
+"""
+
+summary_fields = ['task', 'event', 'count', 'wall_time', 'max_wall_time', 'bytes_written', 'files_validated']
+
+_lock = threading.Lock()
+_file_handler = None
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class timer(object):
+    """
+    Context manager that records a metric with the wall time spent inside it. Extra fields can be added to the record by setting items on the object returned by the ``with`` statement.
+
+    Examples
+    --------
+    Example usage::
+
+        with metrics.timer('validation', task = self.taskname) as m:
+            self.validate_items(expected_output)
+            m['files_validated'] = len(expected_output)
+
+    """
+    def __init__(self, event, **fields):
+        self.event = event
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.time()
+        return(self.fields)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        record(self.event, wall_time = time.time() - self.start, **self.fields)
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def _get_file_handler():
+    """
+    Gets the handler that appends records to the ``metrics_file``, making a new one if the ``metrics_file`` was changed; the file is kept open, and written to by the ``async_logging`` listener thread
+    """
+    global _file_handler
+    path = os.path.abspath(metrics_file)
+    if _file_handler is None or _file_handler.baseFilename != path:
+        if _file_handler is not None:
+            _file_handler.close()
+        _file_handler = async_logging.AsyncHandler(logging.FileHandler(path, mode = 'a', delay = True))
+    return(_file_handler)
+
+def flush():
+    """
+    Waits until all of the records have been written to the ``metrics_file``
+    """
+    if _file_handler is not None:
+        _file_handler.flush()
+
+def record(event, task = None, sample = None, job_id = None, wall_time = None, bytes_written = None, files_validated = None, **fields):
+    """
+    Records a metric, writes it to the ``metrics_file`` and passes it to the ``listeners``
+
+    Parameters
+    ----------
+    event: str
+        the name of the event or phase, e.g. ``'init'``, ``'run'``, ``'submit'``, ``'validation'``
+    task: str
+        the name of the analysis task
+    sample: str
+        the ID of the sample
+    job_id: str
+        the ID of the qsub job
+    wall_time: float
+        the wall time in seconds spent on the event
+    bytes_written: int
+        the number of bytes output by the event
+    files_validated: int
+        the number of files validated by the event
+    fields: dict
+        extra items to include in the record
+
+    Returns
+    -------
+    dict
+        the record
+    """
+    item = collections.OrderedDict()
+    item['timestamp'] = time.time()
+    item['event'] = event
+    item['task'] = task
+    item['sample'] = sample
+    item['job_id'] = job_id
+    item['wall_time'] = wall_time
+    item['bytes_written'] = bytes_written
+    item['files_validated'] = files_validated
+    item.update(fields)
+    with _lock:
+        records.append(item)
+        if metrics_file:
+            _get_file_handler().handle(logging.makeLogRecord({'msg': json.dumps(item), 'levelno': logging.INFO, 'levelname': 'INFO'}))
+    for listener in listeners:
+        try:
+            listener(item)
+        except Exception:
+            logger.exception('Metrics listener failed: {0}'.format(listener))
+    return(item)
+
+def record_submission(job, task = None, sample = None, wall_time = None):
+    """
+    Records the submission of a qsub job, and remembers the task and sample it belongs to for later metrics about the job
+
+    Parameters
+    ----------
+    job: qsub.Job
+        the job that was submitted
+    task: str
+        the name of the analysis task
+    sample: str
+        the ID of the sample
+    wall_time: float
+        the wall time in seconds spent on submitting the job
+    """
+    job_info[job.id] = (task, sample, time.time())
+    return(record('submit', task = task, sample = sample, job_id = job.id, wall_time = wall_time, job_name = job.name))
+
+def record_job_start(job):
+    """
+    Records that a qsub job started running, with the time it waited in the queue since it was submitted
+
+    Parameters
+    ----------
+    job: qsub.Job
+        the job that started
+    """
+    task, sample, submit_time = job_info.get(job.id, (None, None, None))
+    wall_time = None
+    if submit_time:
+        wall_time = time.time() - submit_time
+    return(record('job_start', task = task, sample = sample, job_id = job.id, wall_time = wall_time, job_name = job.name))
+
+def record_job_completion(job, status = 'completed'):
+    """
+    Records the completion of a qsub job, with the time since it was submitted
+
+    Parameters
+    ----------
+    job: qsub.Job
+        the job that completed
+    status: str
+        the completion status of the job, e.g. ``'completed'``, ``'invalid'``, ``'error'``
+    """
+    task, sample, submit_time = job_info.get(job.id, (None, None, None))
+    wall_time = None
+    if submit_time:
+        wall_time = time.time() - submit_time
+    return(record('job', task = task, sample = sample, job_id = job.id, wall_time = wall_time, job_name = job.name, status = status))
+
+def get_bytes(items):
+    """
+    Gets the total size of a list of files
+
+    Parameters
+    ----------
+    items: list
+        a list of file paths; paths that do not exist are skipped
+
+    Returns
+    -------
+    int
+        the total size of the files in bytes
+    """
+    total = 0
+    for item in items:
+        try:
+            total += os.path.getsize(item)
+        except OSError:
+            pass
+    return(total)
+
+def summarize(items = None):
+    """
+    Aggregates the metrics records by task and event
+
+    Parameters
+    ----------
+    items: list
+        the records to summarize; defaults to all ``records``
+
+    Returns
+    -------
+    list
+        a list of dictionaries with the keys in ``summary_fields``, sorted by total wall time, longest first
+    """
+    if items is None:
+        items = records
+    groups = collections.OrderedDict()
+    for item in items:
+        key = (item.get('task', None) or '', item['event'])
+        if key not in groups:
+            groups[key] = {'task': key[0], 'event': key[1], 'count': 0, 'wall_time': 0.0, 'max_wall_time': 0.0, 'bytes_written': 0, 'files_validated': 0}
+        group = groups[key]
+        group['count'] += 1
+        wall_time = item.get('wall_time', None) or 0.0
+        group['wall_time'] += wall_time
+        group['max_wall_time'] = max(group['max_wall_time'], wall_time)
+        group['bytes_written'] += item.get('bytes_written', None) or 0
+        group['files_validated'] += item.get('files_validated', None) or 0
+    return(sorted(groups.values(), key = lambda group: group['wall_time'], reverse = True))
+
+def write_summary(output_file, items = None):
+    """
+    Writes a tab-separated summary table of the metrics
+
+    Parameters
+    ----------
+    output_file: str
+        path to the file to write
+    items: list
+        the records to summarize; defaults to all ``records``
+
+    Returns
+    -------
+    str
+        the path to the summary file
+    """
+    rows = summarize(items = items)
+    with open(output_file, 'w') as f:
+        f.write('\t'.join(summary_fields) + '\n')
+        for row in rows:
+            values = []
+            for field in summary_fields:
+                value = row[field]
+                if isinstance(value, float):
+                    value = '{0:.3f}'.format(value)
+                values.append(str(value))
+            f.write('\t'.join(values) + '\n')
+    logger.debug('Metrics summary saved to file: {0}'.format(output_file))
+    return(output_file)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Exports the live state of the pipeline in the Prometheus text format
+
+The exporter is registered as a listener on the ``metrics`` module, so its counters are updated incrementally from the events recorded as tasks submit qsub jobs, jobs start running and finish, and output files are queued for and pass validation; the job and file lists are never re-scanned. The metrics can be served from a local HTTP endpoint, and/or written to a file for the node_exporter textfile collector.
+
+Examples
+--------
+Example usage::
+
+    import metrics_exporter
+    exporter = metrics_exporter.MetricsExporter(textfile = '/var/lib/node_exporter/snsxt.prom')
+    exporter.start(port = 9580)
+    # ... run the pipeline ...
+    exporter.stop()
+
+    $ curl http://localhost:9580/metrics
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import time
+import threading
+import collections
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+import metrics
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def _format_labels(labels):
+    """
+    Formats a tuple of ``(name, value)`` label pairs, e.g. ``{task="Delly2",status="completed"}``
+    """
+    if not labels:
+        return('')
+    items = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        items.append('{0}="{1}"'.format(name, value))
+    return('{' + ','.join(items) + '}')
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class MetricsExporter(object):
+    """
+    Keeps counters and gauges of the pipeline state, updated from ``metrics`` records
+
+    Attributes
+    ----------
+    jobs_submitted: dict
+        number of qsub jobs submitted per task
+    jobs_finished: dict
+        number of qsub jobs finished per ``(task, status)``
+    running_jobs: set
+        the IDs of the qsub jobs that are running
+    job_tasks: dict
+        the task of each submitted qsub job, by job ID
+    phase_seconds: dict
+        wall time spent per ``(task, event)``
+    validation_backlog: int
+        number of output files waiting to be validated after their jobs finish
+    """
+    metric_help = collections.OrderedDict([
+    ('snsxt_jobs_submitted_total', ('counter', 'Number of qsub jobs submitted')),
+    ('snsxt_jobs_finished_total', ('counter', 'Number of qsub jobs finished, by completion status')),
+    ('snsxt_jobs_queued', ('gauge', 'Number of submitted qsub jobs that have not started running')),
+    ('snsxt_jobs_running', ('gauge', 'Number of qsub jobs that are running')),
+    ('snsxt_job_submission_rate', ('gauge', 'qsub jobs submitted per minute over the rate window')),
+    ('snsxt_validation_backlog_files', ('gauge', 'Number of output files waiting to be validated')),
+    ('snsxt_files_validated_total', ('counter', 'Number of output files validated')),
+    ('snsxt_phase_seconds_total', ('counter', 'Wall time spent in each task phase')),
+    ('snsxt_last_event_timestamp_seconds', ('gauge', 'Time of the last recorded pipeline event')),
+    ])
+
+    def __init__(self, textfile = None, textfile_interval = 15, rate_window = 300):
+        """
+        Parameters
+        ----------
+        textfile: str
+            path to a file to write the metrics to for the node_exporter textfile collector, or ``None``
+        textfile_interval: int
+            minimum number of seconds between writes of the ``textfile``
+        rate_window: int
+            number of seconds over which the job submission rate is calculated
+        """
+        self.textfile = textfile
+        self.textfile_interval = textfile_interval
+        self.rate_window = rate_window
+        self.jobs_submitted = collections.defaultdict(int)
+        self.jobs_finished = collections.defaultdict(int)
+        self.running_jobs = set()
+        self.job_tasks = {}
+        self.phase_seconds = collections.defaultdict(float)
+        self.submit_times = collections.deque()
+        self.validation_backlog = 0
+        self.files_validated = 0
+        self.last_event_time = None
+        self.last_write_time = 0
+        self.server = None
+        self.lock = threading.Lock()
+
+    def update(self, record):
+        """
+        Updates the counters from a ``metrics`` record; registered with ``metrics.listeners``
+
+        Parameters
+        ----------
+        record: dict
+            a record made by ``metrics.record()``
+        """
+        event = record['event']
+        task = record.get('task', None) or ''
+        with self.lock:
+            self.last_event_time = record['timestamp']
+            if event == 'submit':
+                self.jobs_submitted[task] += 1
+                self.job_tasks[record['job_id']] = task
+                self.submit_times.append(record['timestamp'])
+            elif event == 'job_start':
+                # local jobs can start before their submission is recorded, so their task is looked up later
+                self.running_jobs.add(record['job_id'])
+            elif event == 'job':
+                self.jobs_finished[(task, record.get('status', None) or 'completed')] += 1
+                self.running_jobs.discard(record['job_id'])
+                self.job_tasks.pop(record['job_id'], None)
+            elif event == 'validation_queued':
+                self.validation_backlog += record.get('files', None) or 0
+            elif event == 'validation_dequeued':
+                self.validation_backlog = max(0, self.validation_backlog - (record.get('files', None) or 0))
+            elif event == 'validation':
+                # failed validations did not validate their files
+                if not record.get('error', None):
+                    self.files_validated += record.get('files_validated', None) or 0
+            # the wall times of the jobs are their time in the queue and on the cluster, not time spent by the program
+            if record.get('wall_time', None) is not None and event not in ['job', 'job_start']:
+                self.phase_seconds[(task, event)] += record['wall_time']
+        if self.textfile and time.time() - self.last_write_time >= self.textfile_interval:
+            self.write_textfile()
+
+    def _submission_rate(self, now):
+        """
+        Gets the number of jobs submitted per minute over the ``rate_window``
+        """
+        while self.submit_times and self.submit_times[0] < now - self.rate_window:
+            self.submit_times.popleft()
+        return(len(self.submit_times) * 60.0 / self.rate_window)
+
+    def get_samples(self):
+        """
+        Gets the current value of every metric
+
+        Returns
+        -------
+        list
+            a list of ``(metric_name, labels, value)`` tuples, where ``labels`` is a tuple of ``(name, value)`` pairs
+        """
+        samples = []
+        now = time.time()
+        with self.lock:
+            finished_per_task = collections.defaultdict(int)
+            running_per_task = collections.defaultdict(int)
+            for job_id in self.running_jobs:
+                running_per_task[self.job_tasks.get(job_id, '')] += 1
+            for (task, status), count in sorted(self.jobs_finished.items()):
+                finished_per_task[task] += count
+                samples.append(('snsxt_jobs_finished_total', (('task', task), ('status', status)), count))
+            for task, count in sorted(self.jobs_submitted.items()):
+                running = running_per_task[task]
+                samples.append(('snsxt_jobs_submitted_total', (('task', task),), count))
+                # jobs that finished before their start was seen are not counted as queued or running
+                samples.append(('snsxt_jobs_queued', (('task', task),), max(0, count - finished_per_task[task] - running)))
+                samples.append(('snsxt_jobs_running', (('task', task),), running))
+            samples.append(('snsxt_job_submission_rate', (), self._submission_rate(now)))
+            samples.append(('snsxt_validation_backlog_files', (), self.validation_backlog))
+            samples.append(('snsxt_files_validated_total', (), self.files_validated))
+            for (task, event), seconds in sorted(self.phase_seconds.items()):
+                samples.append(('snsxt_phase_seconds_total', (('task', task), ('phase', event)), seconds))
+            if self.last_event_time:
+                samples.append(('snsxt_last_event_timestamp_seconds', (), self.last_event_time))
+        return(samples)
+
+    def render(self):
+        """
+        Formats the metrics in the Prometheus text exposition format
+
+        Returns
+        -------
+        str
+            the metrics text
+        """
+        samples_by_name = collections.defaultdict(list)
+        for name, labels, value in self.get_samples():
+            samples_by_name[name].append((labels, value))
+        lines = []
+        for name, (metric_type, help_text) in self.metric_help.items():
+            if name not in samples_by_name:
+                continue
+            lines.append('# HELP {0} {1}'.format(name, help_text))
+            lines.append('# TYPE {0} {1}'.format(name, metric_type))
+            for labels, value in samples_by_name[name]:
+                lines.append('{0}{1} {2}'.format(name, _format_labels(labels), repr(float(value))))
+        return('\n'.join(lines) + '\n')
+
+    def write_textfile(self, output_file = None):
+        """
+        Writes the metrics to a file for the node_exporter textfile collector. The file is replaced atomically, so the collector never reads a partial file.
+
+        Parameters
+        ----------
+        output_file: str
+            path to the file to write; defaults to ``self.textfile``
+        """
+        output_file = output_file or self.textfile
+        self.last_write_time = time.time()
+        tmp_file = '{0}.{1}.tmp'.format(output_file, os.getpid())
+        try:
+            with open(tmp_file, 'w') as f:
+                f.write(self.render())
+            os.rename(tmp_file, output_file)
+        except (IOError, OSError):
+            logger.exception('Could not write metrics to file: {0}'.format(output_file))
+
+    def serve(self, port, host = '127.0.0.1'):
+        """
+        Serves the metrics over HTTP from a background thread
+
+        Parameters
+        ----------
+        port: int
+            the port to listen on
+        host: str
+            the address to listen on; only the local host by default
+        """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.server = HTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target = self.server.serve_forever, name = 'MetricsExporter')
+        thread.daemon = True
+        thread.start()
+        logger.info('Serving pipeline metrics at: http://{0}:{1}/metrics'.format(host, self.server.server_port))
+
+    def start(self, port = None):
+        """
+        Starts receiving ``metrics`` records, and serves them over HTTP if a ``port`` is given
+        """
+        if self.update not in metrics.listeners:
+            metrics.listeners.append(self.update)
+        if port:
+            self.serve(port = port)
+
+    def stop(self):
+        """
+        Stops receiving ``metrics`` records and serving HTTP requests, and writes the final state to the ``textfile``
+        """
+        if self.update in metrics.listeners:
+            metrics.listeners.remove(self.update)
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.textfile:
+            self.write_textfile()
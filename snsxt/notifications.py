@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Background dispatcher for pipeline notification emails
+
+Notifications are put on a queue and sent from a background thread, so that a slow mail server does not hold up the pipeline. Bursts of notifications are combined into a single digest message, and failed sends are retried.
+
+Examples
+--------
+Example usage::
+
+    import notifications
+    sink = notifications.FileSink(output_file = 'notifications.txt')
+    dispatcher = notifications.NotificationDispatcher(sink = sink, coalesce_time = 5)
+    dispatcher.notify(subject_line = '[NGS580] [Update] sns analysis started', message = 'foo')
+    dispatcher.drain()
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import time
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+from util import tools
+from util import mutt
+import _exceptions as _e
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class MuttSink(object):
+    """
+    Sends notifications as emails with ``mutt``
+    """
+    def send(self, subject_line, message, recipient_list, reply_to):
+        """
+        Sends a notification email
+
+        Parameters
+        ----------
+        subject_line: str
+            the subject line for the email
+        message: str
+            the body of the email
+        recipient_list: str
+            the recipients for the email, in the format ``"user1@server.com,user2@server.com"``
+        reply_to: str
+            email address to use in the 'Reply To' field of the email
+        """
+        mail_command = mutt.mutt_mail(recipient_list = recipient_list,
+                        reply_to = reply_to,
+                        subject_line = subject_line,
+                        message = message,
+                        return_only_mode = True)
+        run_cmd = tools.SubprocessCmd(command = mail_command).run()
+        logger.debug(run_cmd.proc_stdout)
+        logger.debug(run_cmd.proc_stderr)
+        if run_cmd.process.returncode != 0:
+            err_message = 'The mutt notification email command did not complete successfully'
+            raise _e.SubprocessCmdError(message = err_message, errors = '')
+
+class FileSink(object):
+    """
+    Writes notifications to a text file instead of sending them, for testing without a mail server
+    """
+    def __init__(self, output_file):
+        """
+        Parameters
+        ----------
+        output_file: str
+            path to the file to append notifications to
+        """
+        self.output_file = output_file
+
+    def send(self, subject_line, message, recipient_list, reply_to):
+        """
+        Appends a notification to the ``output_file``; takes the same arguments as ``MuttSink.send()``
+        """
+        with open(self.output_file, 'a') as f:
+            f.write('Date: {0}\n'.format(time.strftime('%Y-%m-%d %H:%M:%S')))
+            f.write('To: {0}\n'.format(recipient_list))
+            f.write('Reply-To: {0}\n'.format(reply_to))
+            f.write('Subject: {0}\n\n'.format(subject_line))
+            f.write('{0}\n\n'.format(message))
+
+class NotificationDispatcher(object):
+    """
+    Sends notifications from a background thread
+
+    Notifications received within ``coalesce_time`` seconds of the first one in a burst are sent together in a single digest message, per set of recipients.
+    """
+    _stop = object()
+
+    def __init__(self, sink, coalesce_time = 60, max_retries = 3, retry_delay = 30):
+        """
+        Parameters
+        ----------
+        sink: MuttSink or FileSink
+            object with a ``send()`` method used to deliver notifications
+        coalesce_time: int
+            seconds to wait for more notifications before sending a digest
+        max_retries: int
+            number of times to retry a failed send
+        retry_delay: int
+            seconds to wait before the first retry; the delay doubles after each failure
+        """
+        self.sink = sink
+        self.coalesce_time = coalesce_time
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the background thread if it is not already running
+        """
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return()
+            self.thread = threading.Thread(target = self._run, name = 'NotificationDispatcher')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def notify(self, subject_line, message, recipient_list = None, reply_to = None):
+        """
+        Queues a notification to be sent in the background
+
+        Parameters
+        ----------
+        subject_line: str
+            the subject line for the notification
+        message: str
+            the body of the notification
+        recipient_list: str
+            the recipients for the notification
+        reply_to: str
+            email address to use in the 'Reply To' field of the notification
+        """
+        self.start()
+        self.queue.put((time.time(), subject_line, message, recipient_list, reply_to))
+
+    def drain(self, timeout = 120):
+        """
+        Sends all queued notifications and stops the background thread
+
+        Parameters
+        ----------
+        timeout: int
+            maximum number of seconds to wait for the queued notifications to be sent
+        """
+        if not self.thread or not self.thread.is_alive():
+            return()
+        logger.debug('Sending queued notifications')
+        self.queue.put(self._stop)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            logger.error('Notifications were still being sent after {0}s; giving up'.format(timeout))
+
+    def _run(self):
+        """
+        Main loop of the background thread; collects bursts of notifications and sends them
+        """
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is self._stop:
+                break
+            events = [item]
+            # wait for more notifications to coalesce into the same message
+            deadline = time.time() + self.coalesce_time
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout = remaining)
+                except queue.Empty:
+                    break
+                if item is self._stop:
+                    stop = True
+                    break
+                events.append(item)
+            self._send_events(events)
+
+    def _send_events(self, events):
+        """
+        Sends a burst of notifications, as one message per set of recipients
+        """
+        groups = []
+        grouped_events = {}
+        for event in events:
+            key = (event[3], event[4])
+            if key not in grouped_events:
+                groups.append(key)
+                grouped_events[key] = []
+            grouped_events[key].append(event)
+
+        for key in groups:
+            recipient_list, reply_to = key
+            subject_line, message = self.make_digest(grouped_events[key])
+            self._send_with_retries(subject_line = subject_line, message = message, recipient_list = recipient_list, reply_to = reply_to)
+
+    def make_digest(self, events):
+        """
+        Combines several notifications into a single message
+
+        Parameters
+        ----------
+        events: list
+            a list of ``(timestamp, subject_line, message, recipient_list, reply_to)`` tuples
+
+        Returns
+        -------
+        tuple
+            the subject line and message to send
+        """
+        if len(events) == 1:
+            return(events[0][1], events[0][2])
+        subject_line = '{0} (+{1} more updates)'.format(events[0][1], len(events) - 1)
+        entries = []
+        for timestamp, event_subject_line, event_message, recipient_list, reply_to in events:
+            entries.append('[{0}] {1}\n{2}'.format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)), event_subject_line, event_message))
+        message = '\n\n'.join(entries)
+        return(subject_line, message)
+
+    def _send_with_retries(self, **kwargs):
+        """
+        Sends a message with the sink, retrying with an increasing delay if it fails
+        """
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.send(**kwargs)
+                return()
+            except Exception:
+                if attempt >= self.max_retries:
+                    logger.exception('Notification could not be sent: {0}'.format(kwargs['subject_line']))
+                    return()
+                logger.warning('Notification could not be sent, retrying in {0}s: {1}'.format(delay, kwargs['subject_line']))
+                time.sleep(delay)
+                delay = delay * 2
@@ -7,7 +7,12 @@ Originally designed as an extension to the sns pipeline output, with the flexibi
 """
 # ~~~~~ LOGGING ~~~~~~ #
 import os
+# record startup timings before anything else is imported, if requested
+import startup_profile
+if startup_profile.is_requested():
+    startup_profile.install_import_hook()
 from util import log
+import async_logging
 
 import logging
 
@@ -27,6 +32,10 @@ log_dir = os.path.join(snsxt_parent_dir, 'logs')
 # set a timestamped log file for debug log
 log_file = os.path.join(log_dir, '{0}.{1}.log'.format(scriptname, script_timestamp))
 email_log_file = os.path.join(log_dir, '{0}.{1}.email.log'.format(scriptname, script_timestamp))
+startup_profile_file = os.path.join(log_dir, '{0}.{1}.startup.json'.format(scriptname, script_timestamp))
+metrics_file = os.path.join(log_dir, '{0}.{1}.metrics.jsonl'.format(scriptname, script_timestamp))
+dry_run_file = os.path.join(log_dir, '{0}.{1}.dryrun.jsonl'.format(scriptname, script_timestamp))
+job_durations_file = os.path.join(log_dir, 'job_durations.json')
 
 def logpath():
     """
@@ -36,11 +45,11 @@ def logpath():
 
     Returns
     -------
-    logging.FileHandler
-        a Python logging FileHandler object configured with a log file path set dynamically at program run time
+    async_logging.AsyncHandler
+        a Python logging FileHandler object configured with a log file path set dynamically at program run time, which writes in a background thread
     """
     global log_file
-    return(log.logpath(logfile = log_file))
+    return(async_logging.AsyncHandler(log.logpath(logfile = log_file)))
 
 def email_logpath():
     """
@@ -50,18 +59,19 @@ def email_logpath():
 
     Returns
     -------
-    logging.FileHandler
-        a Python logging FileHandler object configured with a log file path set dynamically at program run time
+    async_logging.AsyncHandler
+        a Python logging FileHandler object configured with a log file path set dynamically at program run time, which writes in a background thread
     """
-    return(log.logpath(logfile = email_log_file))
+    return(async_logging.AsyncHandler(log.logpath(logfile = email_log_file)))
 
 # load the logging config
 config_yaml = os.path.join(scriptdir, 'logging.yml')
 basic_yaml = os.path.join(scriptdir, "basic_logging.yml")
-if __name__ == "__main__":
-    logger = log.log_setup(config_yaml = config_yaml, logger_name = "run")
-else:
-    logger = log.log_setup(config_yaml = basic_yaml, logger_name = "run")
+with startup_profile.phase('logging_setup'):
+    if __name__ == "__main__":
+        logger = log.log_setup(config_yaml = config_yaml, logger_name = "run")
+    else:
+        logger = log.log_setup(config_yaml = basic_yaml, logger_name = "run")
 
 extra_handlers = [h for h in log.get_all_handlers(logger)]
 """
@@ -73,7 +83,8 @@ logger.debug("snsxt program is starting at location: {0}".format(os.path.realpat
 log.print_filehandler_filepaths_to_log(logger)
 
 # ~~~~~ LOAD CONFIGS ~~~~~ #
-import config
+with startup_profile.phase('config_load'):
+    import config
 # update program-wide config with extra items from this script
 config.config['snsxt_parent_dir'] = snsxt_parent_dir # snsxt/
 config.config['snsxt_dir'] = scriptdir # snsxt/snsxt/
@@ -101,34 +112,45 @@ The YAML formatted task list containing analysis tasks to be run by default
 """
 
 # ~~~~ LOAD MORE PACKAGES ~~~~~~ #
-# system modules
-import sys
-import argparse
-import yaml
-import collections
-import json
-
-# this program's modules
-from util import tools
-from util import find
-from util import qsub
-from util import mutt
-from sns_classes.classes import SnsWESAnalysisOutput
-import run_tasks
-import job_management
-import validation
-import cleanup
-import setup_report
-import sns_tasks
-import mail
-import _exceptions as _e
+with startup_profile.phase('module_imports'):
+    # system modules
+    import sys
+    import argparse
+    import json
+
+    # this program's modules
+    from util import tools
+    from util import find
+    from util import qsub
+    from util import mutt
+    from sns_classes.classes import SnsWESAnalysisOutput
+    import run_tasks
+    import job_management
+    import validation
+    import cleanup
+    import setup_report
+    import mail
+    import metrics
+    import job_packing
+    import job_graph
+    import _exceptions as _e
+    # metrics_exporter, staging, and accounting are only imported if they are used
+
+# record task timing metrics to a JSON lines file next to the log file
+metrics.metrics_file = metrics_file
+
+# keep the durations of packed commands across runs, to estimate how to pack them
+job_packing.history_file = job_durations_file
 
 # add log file to email output
-mail.email_files.append(log_file)
+mail.add_email_file(log_file)
 
 # add handlers to run_tasks
 run_tasks.extra_handlers = [h for h in extra_handlers]
 
+# done timing module imports
+startup_profile.remove_import_hook()
+
 # ~~~~~ FUNCTIONS ~~~~~~ #
 def startup():
     """
@@ -139,7 +161,7 @@ def startup():
     Integrate this with the rest of the program
     """
     # add log file to email output
-    mail.email_files.append(log_file)
+    mail.add_email_file(log_file)
 
     # add handlers to run_tasks
     run_tasks.extra_handlers = [h for h in extra_handlers]
@@ -162,24 +184,50 @@ def get_task_list(task_list_file):
     """
     logger.debug('Loading tasks from task list file: {0}'.format(os.path.abspath(task_list_file)))
 
-    # read the YAML as an OrderedDict
-    _mapping_tag = yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG
-    def dict_representer(dumper, data):
-        return(dumper.represent_dict(data.items()))
-    def dict_constructor(loader, node):
-        return(collections.OrderedDict(loader.construct_pairs(node)))
-    yaml.add_representer(collections.OrderedDict, dict_representer)
-    yaml.add_constructor(_mapping_tag, dict_constructor)
-
-    # get the list of tasks to run
+    # get the list of tasks to run; read the YAML as an OrderedDict to keep the task order
     if task_list_file:
-        with open(task_list_file, "r") as f:
-            task_list = yaml.load(f)
+        task_list = config.load_yaml(task_list_file, ordered = True)
     else:
         task_list = {}
     logger.debug('task_list config loaded: {0}'.format(task_list))
     return(task_list)
 
+def profile_startup(output_file, task_list_file, analysis_dir, analysis_id = None, results_id = None):
+    """
+    Runs the startup steps of the program without running any tasks, and saves the time spent in each startup phase and module import to a JSON file
+
+    Parameters
+    ----------
+    output_file: str
+        path to the JSON file to write
+    task_list_file: str
+        the path to a YAML formatted file containing analysis tasks; all of its task classes will be loaded
+    analysis_dir: str
+        the path to a directory containing `sns` analysis output; used to create a `SnsWESAnalysisOutput` object if the task list has downstream `tasks`
+    analysis_id: str
+        an identifier for the analysis
+    results_id: str
+        a sub-identifier for the analysis
+
+    Returns
+    -------
+    str
+        the path to the JSON file
+    """
+    with startup_profile.phase('task_discovery'):
+        task_list = get_task_list(task_list_file)
+        for task_type in ['sns', 'tasks']:
+            for task_name in (task_list.get(task_type, None) or {}):
+                run_tasks.get_task_class(task_name)
+
+    if task_list.get('tasks', None):
+        with startup_profile.phase('analysis_construction'):
+            SnsWESAnalysisOutput(dir = analysis_dir, id = analysis_id, results_id = results_id, sns_config = configs, extra_handlers = extra_handlers)
+
+    startup_profile.write_profile(output_file = output_file, task_list_file = task_list_file, analysis_dir = analysis_dir)
+    logger.info('Startup profile saved to file: {0}'.format(output_file))
+    return(output_file)
+
 
 def main(**kwargs):
     """
@@ -208,6 +256,14 @@ def main(**kwargs):
         path to a .bed formatted file to use as the probes for CNV analysis
     pairs_sheet: str
         path to a .csv samplesheet to use for matching tumor and normal samples in the paired variant calling analysis steps. See GitHub for example.
+    profile_startup: str
+        path to a JSON file to save startup timings to. If set, the program exits after startup without running any tasks. See `profile_startup()`
+    executor: str
+        where to run the compute jobs submitted by tasks; 'sge', 'local', or 'dry-run'. Defaults to the `executor` in the configs. See `executors`
+    detach: bool
+        submit the qsub jobs of the downstream tasks linked with ``-hold_jid`` dependencies and exit, instead of waiting for them. See `job_graph`
+    reattach: bool
+        wait for the jobs of a detached run in the `analysis_dir`, validate them, run the tasks that are left, set up the report, and send the results email. The task list is not used
 
     """
     # get the args that were passed
@@ -220,6 +276,10 @@ def main(**kwargs):
     probes_bed = kwargs.pop('probes_bed', default_probes)
     pairs_sheet = kwargs.pop('pairs_sheet', None)
     analysis_dir = kwargs.pop('analysis_dir', None)
+    profile_startup_file = kwargs.pop('profile_startup', None)
+    executor_name = kwargs.pop('executor', None)
+    detach = kwargs.pop('detach', False)
+    reattach = kwargs.pop('reattach', False)
 
     # make sure that analysis_dir was passed
     logger.debug('analysis_dir passed to script: {0}'.format(analysis_dir))
@@ -234,6 +294,11 @@ def main(**kwargs):
     analysis_dir = os.path.realpath(os.path.expanduser(analysis_dir))
     logger.info('Analysis directory will be: {0}'.format(analysis_dir))
 
+    # only time the program startup
+    if profile_startup_file:
+        profile_startup(output_file = profile_startup_file, task_list_file = task_list_file, analysis_dir = analysis_dir, analysis_id = analysis_id, results_id = results_id)
+        return()
+
     # rebuild the kwargs with only the items chosen to pass on
     kwargs = {
     'analysis_id': analysis_id,
@@ -243,45 +308,109 @@ def main(**kwargs):
     'fastq_dirs': fastq_dirs,
     'targets_bed': targets_bed,
     'probes_bed': probes_bed,
-    'pairs_sheet': pairs_sheet
+    'pairs_sheet': pairs_sheet,
+    'detach': detach
     }
 
     # get the task list contents
     task_list = get_task_list(task_list_file)
 
+    # choose where to run the jobs
+    if executor_name:
+        job_management.set_executor(executor_name)
+    logger.info('Jobs will be run with the {0} executor'.format(job_management.executor.name))
+    if (detach or reattach) and job_management.executor.name == 'local':
+        raise _e.ArgumentError(message = 'Jobs run by the local executor stop when the program exits; they can not be detached', errors = '')
+    if not reattach:
+        job_management.check_executor(task_list = task_list)
+
+    # export the live pipeline state, if enabled
+    exporter = None
+    if configs['metrics_exporter_port'] or configs['metrics_exporter_textfile']:
+        import metrics_exporter
+        exporter = metrics_exporter.MetricsExporter(textfile = configs['metrics_exporter_textfile'])
+        exporter.start(port = configs['metrics_exporter_port'])
+
+    # whether the jobs were left running when the program exits
+    detached = False
+
     # try to run all the tasks for the analysis
     try:
+        if reattach:
+            detached = run_tasks.resume_snsxt_tasks(analysis_dir = analysis_dir)
+
         # check if 'sns' is in the task list
-        if task_list.get('sns', None):
+        if task_list.get('sns', None) and not reattach:
             # check if there are items there
             if task_list['sns']:
                 logger.debug('sns tasks:\n{0}'.format(task_list['sns'].items()))
                 run_tasks.run_sns_tasks(task_list, analysis_dir, **kwargs)
 
         # check if there are downstream snsxt tasks
-        if task_list.get('tasks', None):
+        if task_list.get('tasks', None) and not reattach:
             # check if there are items there
             if task_list['tasks']:
                 logger.debug('downstream snsxt tasks:\n{0}'.format(task_list['tasks'].items()))
-                run_tasks.run_snsxt_tasks(task_list, analysis_dir, **kwargs)
+                detached = run_tasks.run_snsxt_tasks(task_list, analysis_dir, **kwargs)
 
-        # check if the report should be setup
-        if task_list.get('setup_report', None):
+        # check if the report should be setup; a detached run sets it up on reattach
+        if task_list.get('setup_report', None) and not reattach and not detached:
             # TODO: move report out of this function and into main as part of cleanup
             logger.debug('Starting report setup')
-            setup_report.setup_report(output_dir = analysis_dir, analysis_id = analysis_id, results_id = results_id)
+            with metrics.timer('report_setup', task = 'setup_report'):
+                setup_report.setup_report(output_dir = analysis_dir, analysis_id = analysis_id, results_id = results_id)
     except:
         # run this if an exception is caught
         logger.exception('Encountered an exception while running tasks')
         job_management.kill_background_jobs()
+        # the log files are written in the background; make sure they are complete before they are emailed
+        async_logging.flush()
         mail.email_error_output(message_file = email_log_file)
     else:
         # run this if no exception is caught
-        mail.email_output(message_file = email_log_file)
+        if detached:
+            message = 'snsxt jobs submitted for analysis in directory:\n{0}\n\nReattach to validate them and finish the analysis with:\n{1} -d {0} --reattach'.format(analysis_dir, os.path.join(scriptdir, scriptname))
+            logger.info(message)
+            mail.notify(message = message, subject_line = 'Jobs submitted')
+        else:
+            async_logging.flush()
+            mail.email_output(message_file = email_log_file)
     finally:
         # run this no matter what
+        # send any notifications still queued
+        mail.drain_notifications()
+        if exporter:
+            exporter.stop()
         # run cleanup
         cleanup.save_configs(analysis_dir = analysis_dir)
+        # summarize the node-local staging done by the jobs; the stats file is only written when a task has staging enabled
+        staging_stats_file = os.path.join(analysis_dir, configs['staging_stats_file'])
+        if os.path.exists(staging_stats_file):
+            import staging
+            for row in staging.summarize(staging_stats_file):
+                metrics.record('staging', task = row['task'], bytes_written = row['bytes_written'], jobs = row['jobs'], bytes_staged = row['bytes_staged'],
+                                cache_hits = row['cache_hits'], cache_misses = row['cache_misses'], hit_rate = row['hit_rate'])
+                logger.info('Task {0} staged {1} bytes to node-local disk for {2} jobs; cache hit rate {3:.0%}'.format(row['task'], row['bytes_staged'], row['jobs'], row['hit_rate']))
+        # save the summary of where the time was spent
+        metrics_summary_file = os.path.join(analysis_dir, configs['metrics_summary_file'])
+        metrics.write_summary(output_file = metrics_summary_file)
+        metrics.flush()
+        logger.info('Task timing metrics saved to files:\n{0}\n{1}'.format(metrics_file, metrics_summary_file))
+        if job_management.executor.dry_run:
+            job_management.executor.write_plan(output_file = dry_run_file)
+            logger.info('Dry run jobs saved to file: {0}'.format(dry_run_file))
+        # accounting data only exists for jobs run on the cluster
+        if configs['accounting_report'] and job_management.executor.name == 'sge' and not detached:
+            try:
+                import accounting
+                # the jobs submitted by the earlier runs of a detached analysis are only in their metrics files
+                metrics_records = []
+                for path in job_graph.metrics_files + [metrics_file]:
+                    if os.path.exists(path):
+                        metrics_records.extend(accounting.load_metrics_file(path))
+                accounting.accounting_report(analysis_dir = analysis_dir, metrics_records = metrics_records)
+            except Exception:
+                logger.exception('Could not collect the qsub job accounting data')
 
 
 
@@ -316,6 +445,10 @@ def parse():
     parser.add_argument('--targets', dest = 'targets_bed', help = 'Targets .bed file with regions for analysis', default = default_targets)
     parser.add_argument('--probes', dest = 'probes_bed', help = 'Probes .bed file with regions for CNV analysis', default = default_probes)
     parser.add_argument('--pairs_sheet', dest = 'pairs_sheet', help = '"samples.pairs.csv" samplesheet to use for paired analysis', default = None)
+    parser.add_argument('--executor', dest = 'executor', default = None, choices = ['sge', 'local', 'dry-run'], help = "Where to run the compute jobs: 'sge' submits them to the cluster with qsub, 'local' runs them on this machine, 'dry-run' only records them. Defaults to 'executor' in snsxt/config/snsxt.yml")
+    parser.add_argument('--detach', dest = 'detach', action = 'store_true', help = 'Submit the qsub jobs of all downstream tasks at once, linked with -hold_jid dependencies, and exit without waiting for them. Use --reattach later to validate them and finish the analysis')
+    parser.add_argument('--reattach', dest = 'reattach', action = 'store_true', help = 'Wait for and validate the jobs of a detached run in the analysis dir, run the tasks that are left, set up the report, and send the results email')
+    parser.add_argument('--profile-startup', dest = 'profile_startup', nargs = '?', const = startup_profile_file, default = None, metavar = 'JSON', help = 'Time the program startup phases and module imports, save them to a JSON file, and exit without running any tasks')
 
     # required flags
     parser.add_argument('-d', '--analysis_dir', dest = "analysis_dir", help = "Path to the to use for the analysis. For a new sns analysis, this will become the output directory. For an existing sns analysis output, this will become the input directory", required = True)
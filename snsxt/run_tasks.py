@@ -10,14 +10,17 @@ logger = logging.getLogger(__name__)
 # ~~~~~ LOAD MORE PACKAGES ~~~~~ #
 import os
 import json
+import collections
 from sns_classes.classes import SnsWESAnalysisOutput
 import mail
 import sns_tasks
 import job_management
 import setup_report
 import validation
+import metrics
+import executors
+import job_graph
 import _exceptions as _e
-from util import qsub
 
 # ~~~~~ LOAD CONFIGS ~~~~~ #
 import config
@@ -41,26 +44,25 @@ def get_task_class(task_name):
     Parameters
     ----------
     task_name: str
-        the name of an analysis task, assumed to correspond to a Class loaded in the `sns_tasks` module
+        the name of an analysis task, assumed to correspond to a Class registered in the `sns_tasks.task_modules` manifest
 
     Returns
     -------
     Class
         the Class object matching the `task_name`
     """
+    # load the task class from the module; task modules are only imported when requested
+    logger.debug('Loading task {0} '.format(task_name))
+    task_class = sns_tasks.get_task_class(task_name)
     # make sure the task is present in sns_tasks
-    if not task_name in dir(sns_tasks):
+    if not task_class:
         logger.error('Task {0} was not found in the sns_tasks module'.format(task_name))
         raise _e.SnsTaskMissing(message = 'Task {0} was not found in the sns_tasks module'.format(task_name), errors = '')
-    else:
-        logger.debug('Loading task {0} '.format(task_name))
-    # load the task class from the module
-    task_class = getattr(sns_tasks, task_name)
     return(task_class)
 
 
 
-def run_tasks(tasks, analysis_dir = None, analysis = None, debug_mode = False, **kwargs):
+def run_tasks(tasks, analysis_dir = None, analysis = None, debug_mode = False, detach = False, **kwargs):
     """
     Runs a series of analysis tasks
 
@@ -74,13 +76,15 @@ def run_tasks(tasks, analysis_dir = None, analysis = None, debug_mode = False, *
         object representing output from an `sns wes` analysis pipeline output on which to run downstream analysis tasks
     debug_mode: bool
         prevent the program from halting if errors are found in qsub log output files; defaults to `False`. `True` = do not stop for qsub log errors, `False` = stop if errors are found
+    detach: bool
+        submit the tasks' qsub jobs linked with ``-hold_jid`` instead of waiting for them, and return without monitoring the jobs or validating their output; see ``job_graph``
     kwargs: dict
         a dictionary containing extra args to pass to the `task_class` upon initialization
 
     Returns
     -------
     tasks_output: dict
-        a dictionary containing items output by the analysis task(s) which were run
+        a dictionary containing items output by the analysis task(s) which were run. If ``detach`` is ``True``, ``remaining_tasks`` holds the tasks which could not be submitted yet
 
     Todo
     ----
@@ -99,12 +103,22 @@ def run_tasks(tasks, analysis_dir = None, analysis = None, debug_mode = False, *
         raise _e.ArgumentError(message = 'Neither analysis_dir nor analysis were passed; there must be one.', errors = '')
 
 
+    remaining_tasks = collections.OrderedDict(tasks.items())
     for task_name, task_params in tasks.items():
         task_class = get_task_class(task_name)
 
+        if detach:
+            if not job_graph.submits_jobs(task_class):
+                # tasks run by this program can not wait for held jobs
+                if job_management.hold_jobs:
+                    logger.info('Task {0} needs the output of the submitted jobs; it will be run on reattach'.format(task_name))
+                    break
+                task_wait = False
+            else:
+                task_params, task_wait = job_graph.detached_task_params(task_params)
+        remaining_tasks.pop(task_name)
+
         # create the task object
-        if analysis_dir:
-            task = task_class(analysis_dir = analysis_dir, extra_handlers = extra_handlers, **kwargs)
         if analysis:
             # make sure the ana analysis ouput object is valid before continuing
             if not debug_mode:
@@ -113,50 +127,75 @@ def run_tasks(tasks, analysis_dir = None, analysis = None, debug_mode = False, *
                     validations_message = json.dumps(analysis.validations, indent = 4)
                     logger.error(err_message)
                     raise _e.AnalysisInvalid(message = err_message + validations_message, errors = '')
-            task = task_class(analysis = analysis, extra_handlers = extra_handlers)
+        with metrics.timer('init', task = task_name):
+            if analysis_dir:
+                task = task_class(analysis_dir = analysis_dir, extra_handlers = extra_handlers, **kwargs)
+            if analysis:
+                task = task_class(analysis = analysis, extra_handlers = extra_handlers)
 
         # run the task
-        if task_params:
-            # with the params
-            task_output = task.run(**task_params)
-        else:
-            # without the params
-            task_output = task.run()
+        mail.task_progress_email(task_name = task_name, message = 'Task {0} started in directory:\n{1}'.format(task_name, analysis_dir or analysis.dir))
+        with metrics.timer('run', task = task_name) as task_metrics:
+            if task_params:
+                # with the params
+                task_output = task.run(**task_params)
+            else:
+                # without the params
+                task_output = task.run()
+            task_metrics['jobs'] = len([item for item in (task_output or []) if executors.is_job(item)])
 
         # check for files from the task which should be included in email output
         expected_email_files = task.get_expected_email_files()
         logger.debug('task email files: {0}'.format(expected_email_files))
         if expected_email_files:
             for item in expected_email_files:
-                mail.email_files.append(item)
+                mail.add_email_file(item)
 
         # check the output of the task
         if task_output:
             # check for background qsub jobs output by the task
             task_jobs = []
             for item in task_output:
-                if isinstance(item, qsub.Job):
+                if executors.is_job(item):
                     task_jobs.append(item)
             # if no task_jobs were produced, validate the task output immediately
             if not task_jobs:
                 logger.debug('Validating task output files')
-                task.validate_output()
+                with metrics.timer('validation', task = task_name) as validation_metrics:
+                    task.validate_output()
+                    task_output_files = task.get_expected_output_files()
+                    validation_metrics['files_validated'] = len(task_output_files)
+                    validation_metrics['bytes_written'] = metrics.get_bytes(task_output_files)
+                mail.task_progress_email(task_name = task_name, message = 'Task {0} finished'.format(task_name))
             else:
                 # add task jobs to background jobs
                 logger.debug('Background qsub jobs were generated by the task and will be monitored at program completion')
                 for job in task_jobs:
                     job_management.background_jobs.append(job)
+                # jobs of the tasks after this one wait for this task's jobs
+                if detach and task_wait:
+                    job_management.hold_jobs[:] = task_jobs
+                mail.task_progress_email(task_name = task_name, message = 'Task {0} submitted {1} qsub jobs'.format(task_name, len(task_jobs)))
                 # add task expected output to background output to be validated later
                 logger.debug('Expected output files for the task will be validated at program completion')
                 task_output_files = task.get_expected_output_files()
                 for item in task_output_files:
                     validation.background_output_files.append(item)
+                metrics.record('validation_queued', task = task_name, files = len(task_output_files))
+
+    # the jobs are monitored and validated on reattach
+    if detach:
+        tasks_output['remaining_tasks'] = remaining_tasks
+        return(tasks_output)
 
     # monitor and validate all background jobs
     job_management.monitor_validate_background_jobs()
 
-    # validate all background output files
-    validation.validate_background_output_files()
+    # validate all background output files; jobs were not run in a dry run
+    if job_management.executor.dry_run:
+        logger.info('Dry run; skipping validation of {0} background output files'.format(len(validation.background_output_files)))
+    else:
+        validation.validate_background_output_files()
 
     return(tasks_output)
 
@@ -185,6 +224,8 @@ def run_sns_tasks(task_list, analysis_dir, **kwargs):
     targets_bed = kwargs.pop('targets_bed')
     probes_bed = kwargs.pop('probes_bed')
     pairs_sheet = kwargs.pop('pairs_sheet')
+    # the sns pipeline submits its own jobs, which can not be detached from
+    kwargs.pop('detach', None)
 
     logger.info('Creating new sns analysis in dir {0}'.format(os.path.abspath(analysis_dir)))
 
@@ -211,18 +252,71 @@ def run_snsxt_tasks(task_list, analysis_dir, **kwargs):
     kwargs: dict
         dictionary containing extra args to pass to `run_tasks`
 
+    Returns
+    -------
+    bool
+        ``True`` if the tasks were detached; their jobs and the tasks left to run are saved with ``job_graph.save_state()``, and the report is set up on reattach
+
     """
     # get the args that were passed
     analysis_id = kwargs.pop('analysis_id')
     results_id = kwargs.pop('results_id')
     debug_mode = kwargs.pop('debug_mode')
+    detach = kwargs.pop('detach', False)
 
     tasks = task_list['tasks']
     logger.info('Loading analysis {0} : {1} from dir {2}'.format(analysis_id, results_id, os.path.abspath(analysis_dir)))
     analysis = SnsWESAnalysisOutput(dir = analysis_dir, id = analysis_id, results_id = results_id, sns_config = configs, extra_handlers = extra_handlers)
-    run_tasks(tasks, analysis = analysis, debug_mode = debug_mode, **kwargs)
+    if detach:
+        # held jobs only run if the jobs they wait for succeeded
+        job_graph.set_status_dir(analysis_dir)
+    tasks_output = run_tasks(tasks, analysis = analysis, debug_mode = debug_mode, detach = detach, **kwargs)
+
+    if detach:
+        job_graph.save_state(analysis_dir = analysis_dir, remaining_tasks = tasks_output['remaining_tasks'],
+                            analysis_id = analysis_id, results_id = results_id, debug_mode = debug_mode,
+                            setup_report = bool(task_list.get('setup_report', None)))
+        return(True)
 
     if task_list.get('setup_report', None):
         # TODO: move report out of this function and into main as part of cleanup
         logger.debug('Starting report setup')
-        setup_report.setup_report(output_dir = analysis_dir, analysis_id = analysis_id, results_id = results_id)
+        with metrics.timer('report_setup', task = 'setup_report'):
+            setup_report.setup_report(output_dir = analysis_dir, analysis_id = analysis_id, results_id = results_id)
+    return(False)
+
+def resume_snsxt_tasks(analysis_dir):
+    """
+    Reattaches to the downstream `snsxt` analysis tasks detached by ``run_snsxt_tasks()``: waits for their jobs and validates them and their output files, then runs the tasks that are left, detaching again if they submit more held jobs
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to a directory containing `sns` analysis output
+
+    Returns
+    -------
+    bool
+        ``True`` if the tasks were detached again
+    """
+    state = job_graph.load_state(analysis_dir)
+
+    job_management.monitor_validate_background_jobs()
+    if job_management.executor.dry_run:
+        logger.info('Dry run; skipping validation of {0} background output files'.format(len(validation.background_output_files)))
+    else:
+        validation.validate_background_output_files()
+    del validation.background_output_files[:]
+
+    task_list = {'tasks': state['remaining_tasks'], 'setup_report': state['setup_report']}
+    if state['remaining_tasks']:
+        detached = run_snsxt_tasks(task_list, analysis_dir, analysis_id = state['analysis_id'], results_id = state['results_id'], debug_mode = state['debug_mode'], detach = True)
+    else:
+        detached = False
+        if state['setup_report']:
+            logger.debug('Starting report setup')
+            with metrics.timer('report_setup', task = 'setup_report'):
+                setup_report.setup_report(output_dir = analysis_dir, analysis_id = state['analysis_id'], results_id = state['results_id'])
+    if not detached:
+        job_graph.clear_state(analysis_dir)
+    return(detached)
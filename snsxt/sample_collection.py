@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lazy collection of the samples in an ``sns`` analysis
+
+``analysis.get_samples()`` builds a full sample object for every sample each time it is called, each with its own copies of the analysis's ``static_files`` and ``analysis_config``, and tasks call it many times: to run, to get their expected output files, and per sample to find the sample's pairs. For analyses with hundreds of samples this multiplies both memory and construction time.
+
+A ``SampleCollection`` is shared by all of the tasks run on the analysis. It gets the samples from ``analysis.get_samples()`` only once for the whole analysis, and keeps their IDs in the same order. Iterating over it yields light ``Sample`` objects, made the first time they are needed. They use ``__slots__`` and share a single copy of the analysis config and static files, and their output files are looked up in the analysis ``catalogue``; the sample's full object is only used if a sample needs something the light object can not provide.
+
+Examples
+--------
+Example usage::
+
+    import sample_collection
+    samples = sample_collection.get_collection(analysis = analysis)
+    for sample in samples:
+        print(sample.id)
+    samples.ids
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import collections
+
+# ~~~~~ GLOBALS ~~~~~ #
+_collections = {}
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def get_collection(analysis, analysis_catalogue = None):
+    """
+    Gets the sample collection of an analysis; the collection is made once and shared by all of the tasks run on the analysis
+
+    Parameters
+    ----------
+    analysis: SnsWESAnalysisOutput
+        the `sns` pipeline output object
+    analysis_catalogue: catalogue.AnalysisCatalogue
+        the catalogue of the analysis directory, to look up the samples' files in
+
+    Returns
+    -------
+    SampleCollection
+        the samples of the analysis
+    """
+    key = os.path.realpath(analysis.dir)
+    if key not in _collections:
+        _collections[key] = SampleCollection(analysis = analysis, analysis_catalogue = analysis_catalogue)
+    elif analysis_catalogue:
+        _collections[key].catalogue = analysis_catalogue
+    return(_collections[key])
+
+def list_none(items):
+    """
+    Gets the only item in a list, ``None`` if the list is empty, or the list itself if it has more than one item
+    """
+    if not items:
+        return(None)
+    if len(items) == 1:
+        return(items[0])
+    return(items)
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class Sample(object):
+    """
+    A light sample object, with the attributes of a sample from ``analysis.get_samples()`` that tasks use. The config and static files are shared with the other samples of the analysis, and files are looked up in the analysis catalogue; other attributes come from the sample's full object.
+    """
+    __slots__ = ('id', '_collection')
+
+    def __init__(self, id, collection):
+        """
+        Parameters
+        ----------
+        id: str
+            the sample ID
+        collection: SampleCollection
+            the collection the sample belongs to
+        """
+        self.id = id
+        self._collection = collection
+
+    def __repr__(self):
+        return(self.id)
+
+    @property
+    def analysis_config(self):
+        return(self._collection.analysis_config)
+
+    @property
+    def static_files(self):
+        return(self._collection.static_files)
+
+    def list_none(self, items):
+        return(list_none(items))
+
+    def get_output_files(self, analysis_step, pattern):
+        """
+        Gets the sample's files in an analysis step that match a pattern
+        """
+        files = []
+        if self._collection.catalogue:
+            files = self._collection.catalogue.find(analysis_step = analysis_step, sampleID = self.id, pattern = pattern)
+        if not files:
+            files = self._collection.get_full_sample(self.id).get_output_files(analysis_step = analysis_step, pattern = pattern)
+        return(files)
+
+    def get_files(self, name):
+        """
+        Gets a file shared by the samples of the analysis, e.g. ``'targets_bed'``
+        """
+        files = []
+        if self._collection.catalogue:
+            files = self._collection.catalogue.get_static_file(name)
+        if not files:
+            files = self._collection.get_full_sample(self.id).get_files(name)
+        return(files)
+
+    def __getattr__(self, name):
+        # anything else comes from the full sample object; private names are not looked up, so an unset ``_collection`` does not recurse
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return(getattr(self._collection.get_full_sample(self.id), name))
+
+
+class SampleCollection(object):
+    """
+    The samples of an analysis, made when they are first needed
+
+    Attributes
+    ----------
+    analysis: SnsWESAnalysisOutput
+        the `sns` pipeline output object
+    catalogue: catalogue.AnalysisCatalogue
+        the catalogue of the analysis directory, or ``None``
+    """
+    def __init__(self, analysis, analysis_catalogue = None):
+        self.analysis = analysis
+        self.catalogue = analysis_catalogue
+        self._ids = None
+        self._id_set = None
+        self._samples = collections.OrderedDict()
+        self._full_samples = None
+        self._shared = {}
+
+    def _get_full_samples(self):
+        """
+        Gets the full sample objects from the analysis; only built once
+        """
+        if self._full_samples is None:
+            logger.debug('Building the full sample objects for analysis: {0}'.format(self.analysis.dir))
+            self._full_samples = collections.OrderedDict([(sample.id, sample) for sample in self.analysis.get_samples()])
+        return(self._full_samples)
+
+    def get_full_sample(self, id):
+        """
+        Gets the full sample object from ``analysis.get_samples()`` for a sample
+        """
+        return(self._get_full_samples()[id])
+
+    def _get_shared(self, name):
+        """
+        Gets an attribute shared by all samples; taken from the analysis if it has it, otherwise from the first sample's full object
+        """
+        if name not in self._shared:
+            value = getattr(self.analysis, name, None)
+            if value is None:
+                value = getattr(self.get_full_sample(self.ids[0]), name)
+            self._shared[name] = value
+        return(self._shared[name])
+
+    @property
+    def analysis_config(self):
+        return(self._get_shared('analysis_config'))
+
+    @property
+    def static_files(self):
+        return(self._get_shared('static_files'))
+
+    @property
+    def ids(self):
+        """
+        The sample IDs, in order
+        """
+        if self._ids is None:
+            # the same samples, in the same order, as the analysis gives the tasks
+            self._ids = list(self._get_full_samples().keys())
+            # for membership checks
+            self._id_set = set(self._ids)
+        return(self._ids)
+
+    def get(self, id):
+        """
+        Gets the sample with the given ID
+        """
+        if id not in self._samples:
+            if id not in self:
+                raise KeyError(id)
+            self._samples[id] = Sample(id = id, collection = self)
+        return(self._samples[id])
+
+    def __iter__(self):
+        for id in self.ids:
+            yield self.get(id)
+
+    def __len__(self):
+        return(len(self.ids))
+
+    def __contains__(self, id):
+        if self._id_set is None:
+            # reading the IDs also makes the set of them
+            self.ids
+        return(id in self._id_set)
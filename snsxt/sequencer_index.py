@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+In-memory index of the files in a sequencer output directory
+
+Sequencer run folders can contain tens of thousands of files, often stored on slow network file systems. Walking the run folder once and answering every lookup from the index avoids the repeated directory walks previously needed to find the .fastq.gz files and each of the ``settings.sequencer_files``.
+
+Uses ``os.scandir`` (or the ``scandir`` package on Python 2) when available, since it avoids an extra ``stat`` call per directory entry, and falls back to ``os.listdir`` otherwise.
+
+Examples
+--------
+Example usage::
+
+    import sequencer_index
+    index = sequencer_index.SequencerDirIndex(search_dir = '/ifs/data/molecpathlab/quicksilver/171116_NB501073_0027_AHT5M2BGX3')
+    index.find(inclusion_patterns = ('*.fastq.gz',), exclusion_patterns = ('*Undetermined*',), num_limit = 1)
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import re
+import stat
+import fnmatch
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# characters that make a pattern match more than one exact file name
+_wildcard_pattern = re.compile(r'[*?\[]')
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def list_dir(path):
+    """
+    Lists the contents of a directory
+
+    Parameters
+    ----------
+    path: str
+        path to the directory
+
+    Returns
+    -------
+    tuple
+        a list of the names of the files and a list of the names of the subdirectories in the directory; symlinks to directories are not included in the subdirectories
+    """
+    files = []
+    dirs = []
+    if scandir:
+        for entry in scandir(path):
+            if entry.is_dir(follow_symlinks = False):
+                dirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    else:
+        for name in os.listdir(path):
+            try:
+                mode = os.lstat(os.path.join(path, name)).st_mode
+                if stat.S_ISLNK(mode):
+                    mode = os.stat(os.path.join(path, name)).st_mode
+                    if stat.S_ISREG(mode):
+                        files.append(name)
+                elif stat.S_ISDIR(mode):
+                    dirs.append(name)
+                elif stat.S_ISREG(mode):
+                    files.append(name)
+            except OSError:
+                # broken symlink, or the item was removed during the walk
+                continue
+    return(files, dirs)
+
+def matches_patterns(name, inclusion_patterns = None, exclusion_patterns = None):
+    """
+    Checks if a file name matches any of the inclusion patterns and none of the exclusion patterns
+
+    Parameters
+    ----------
+    name: str
+        the basename of a file
+    inclusion_patterns: list
+        ``fnmatch`` patterns, any of which the name must match; ``None`` matches all names
+    exclusion_patterns: list
+        ``fnmatch`` patterns, none of which the name may match
+
+    Returns
+    -------
+    bool
+        whether the name matched
+    """
+    if inclusion_patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in inclusion_patterns):
+        return(False)
+    if exclusion_patterns and any(fnmatch.fnmatch(name, pattern) for pattern in exclusion_patterns):
+        return(False)
+    return(True)
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class SequencerDirIndex(object):
+    """
+    Index of all the files in a directory tree, built from a single walk of the directory
+
+    Attributes
+    ----------
+    search_dir: str
+        path to the directory that was indexed
+    files: list
+        a list of ``(depth, path)`` tuples for every file found, in the order in which they were found; ``depth`` is the number of subdirectories between the ``search_dir`` and the file
+    """
+    def __init__(self, search_dir, exclusion_dirs = None):
+        """
+        Parameters
+        ----------
+        search_dir: str
+            path to the directory to index
+        exclusion_dirs: list
+            ``fnmatch`` patterns for the names of subdirectories that should not be walked
+        """
+        self.search_dir = search_dir
+        self.exclusion_dirs = exclusion_dirs
+        self.files = []
+        self.by_name = {}
+        self.index()
+
+    def index(self):
+        """
+        Walks the ``search_dir`` top-down and records every file found
+        """
+        logger.debug('Indexing files in directory: {0}'.format(self.search_dir))
+        self.files = []
+        self.by_name = {}
+        # walk depth-first, visiting subdirectories in the order they were listed, like `os.walk`
+        stack = [(self.search_dir, 0)]
+        while stack:
+            path, depth = stack.pop()
+            try:
+                files, dirs = list_dir(path)
+            except OSError:
+                logger.warning('Could not list directory: {0}'.format(path))
+                continue
+            for name in files:
+                file_path = os.path.join(path, name)
+                self.files.append((depth, file_path))
+                self.by_name.setdefault(name, []).append(file_path)
+            if self.exclusion_dirs:
+                dirs = [name for name in dirs if matches_patterns(name, exclusion_patterns = self.exclusion_dirs)]
+            for name in reversed(dirs):
+                stack.append((os.path.join(path, name), depth + 1))
+        logger.debug('Indexed {0} files'.format(len(self.files)))
+
+    def find(self, inclusion_patterns = None, exclusion_patterns = None, num_limit = None, level_limit = None):
+        """
+        Searches the index for files whose basename matches the patterns
+
+        Parameters
+        ----------
+        inclusion_patterns: list
+            ``fnmatch`` patterns, any of which the file name must match
+        exclusion_patterns: list
+            ``fnmatch`` patterns, none of which the file name may match
+        num_limit: int
+            maximum number of matches to return
+        level_limit: int
+            only return files at most this many subdirectories below the ``search_dir``
+
+        Returns
+        -------
+        list
+            a list of paths to the matching files
+        """
+        # exact file names can be looked up directly
+        if inclusion_patterns and level_limit is None and not any(_wildcard_pattern.search(pattern) for pattern in inclusion_patterns):
+            matches = []
+            for pattern in inclusion_patterns:
+                for file_path in self.by_name.get(pattern, []):
+                    if matches_patterns(os.path.basename(file_path), exclusion_patterns = exclusion_patterns):
+                        matches.append(file_path)
+            return(matches[:num_limit])
+
+        matches = []
+        for depth, file_path in self.files:
+            if level_limit is not None and depth > level_limit:
+                continue
+            if not matches_patterns(os.path.basename(file_path), inclusion_patterns = inclusion_patterns, exclusion_patterns = exclusion_patterns):
+                continue
+            matches.append(file_path)
+            if num_limit and len(matches) >= num_limit:
+                break
+        return(matches)
@@ -0,0 +1,631 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Simulates running the qsub jobs of the downstream tasks on an SGE cluster, to compare job scheduling policies offline
+
+The jobs that the tasks would submit for an analysis are modelled from its samples, tumor-normal pairs, and targets, with durations taken from the qsub records of earlier runs. The jobs are then replayed in a discrete-event simulation of a cluster with a number of slots and gigabytes of memory, where each job waits ``queue_latency`` seconds after submission before it can be scheduled, and pays ``job_overhead`` seconds of start up when it runs. Queued jobs are started in the order they were submitted, skipping over the jobs that do not fit in the free slots and memory, like the SGE scheduler without reservations.
+
+The policies compared are:
+
+- order: ``sequential`` waits for the jobs of each task before submitting the next task's; ``task-list`` only waits after the tasks with ``qsub_wait: True`` in the task list, as ``run.py`` does; ``dag`` submits all of the jobs at once, since the tasks do not use each other's output, as ``run.py --detach`` does
+- sharding, for tasks that submit one job per chromosome (``MuTect2Split``): ``chromosome`` makes a shard per chromosome in the targets; ``balanced`` splits the pair's total work into ``shards`` equal shards
+- packing: ``unpacked`` submits every command as its own job; ``packed`` packs the commands of the sharded tasks, and of tasks with a ``packing`` item in their config, into jobs of up to ``target_runtime`` seconds (``default_target_runtime`` if the config has none), the same way ``job_packing`` does
+
+Job durations are sampled from the recorded durations with a seeded random number generator, once for all of the policies, so every policy runs the same commands, and the same args always give the same report.
+
+Durations are read with the ``durations`` subcommand from the SGE accounting tables (``snsxt_accounting.tsv``, see ``accounting``), the status files of packed jobs in the qsub log dirs (``*.status.tsv``), and the job duration history of ``job_packing`` (``job_durations.json``), and saved to a JSON file in the format ``{'durations': {task: {key: [seconds, ...]}}, 'memory': {task: [gigabytes, ...]}}``, where the key is the chromosome of sharded jobs, and ``''`` otherwise.
+
+Examples
+--------
+Example usage::
+
+    snsxt$ snsxt/simulate.py durations -o durations.json /path/to/analysis_dir1 /path/to/analysis_dir2 snsxt/logs/job_durations.json
+    snsxt$ snsxt/simulate.py run -d /path/to/analysis_dir --durations durations.json --slots 256 --memory 2048 -o simulation.json
+    snsxt$ snsxt/simulate.py run --samples 100 --durations durations.json --order sequential dag --packing unpacked packed
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import re
+import csv
+import sys
+import json
+import heapq
+import random
+import argparse
+import itertools
+import collections
+import config
+import job_packing
+import synthetic_analysis
+
+# ~~~~~ GLOBALS ~~~~~ #
+scriptdir = os.path.dirname(os.path.realpath(__file__))
+
+tasks_config_dir = os.path.join(scriptdir, 'sns_tasks', 'config')
+
+task_models = {
+'Delly2': {'config_file': 'Delly2.yml', 'unit': 'sample', 'sharded': False},
+'GATKDepthOfCoverageCustom': {'config_file': 'GATK_DepthOfCoverage_custom.yml', 'unit': 'sample', 'sharded': False},
+'BamCoverage': {'config_file': 'BamCoverage.yml', 'unit': 'sample', 'sharded': False},
+'MuTect2Split': {'config_file': 'MuTect2Split.yml', 'unit': 'pair', 'sharded': True}
+}
+"""
+How the jobs of each task are made: one per sample, or one per tumor-normal pair, and whether each of those is split into shards by chromosome. Tasks that are not listed here do not submit qsub jobs, and are not simulated.
+"""
+
+default_tasks = ['Delly2', 'GATKDepthOfCoverageCustom', 'MuTect2Split']
+
+order_policies = ['sequential', 'task-list', 'dag']
+sharding_policies = ['chromosome', 'balanced']
+packing_policies = ['unpacked', 'packed']
+
+default_duration = 1800
+"""
+Seconds that the commands of a task run for when there are no recorded durations for the task, and its config has no packing ``default_duration``
+"""
+
+default_target_runtime = 1800
+"""
+Target seconds per packed job for the ``packed`` policy, when the task's config has no ``packing`` item
+"""
+
+default_memory = 4
+"""
+Gigabytes of memory used by the jobs of a task when there is no recorded memory use for the task
+"""
+
+_shard_key_pattern = re.compile(r'_(chr[0-9XYMT]+)$')
+_pack_name_pattern = re.compile(r'\.pack[0-9]+\.[0-9]+$')
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class SimCommand(object):
+    """
+    A command that a task would run, as a job of its own or in a packed job
+    """
+    __slots__ = ('name', 'task', 'unit', 'key', 'duration', 'cores', 'memory')
+
+    def __init__(self, name, task, unit, key, duration, cores, memory):
+        self.name = name
+        self.task = task
+        self.unit = unit
+        self.key = key
+        self.duration = duration
+        self.cores = cores
+        self.memory = memory
+
+
+class SimJob(object):
+    """
+    A simulated qsub job, running one or more commands one after another
+    """
+    __slots__ = ('name', 'task', 'duration', 'cores', 'memory', 'commands', 'submit_time', 'start_time', 'end_time')
+
+    def __init__(self, name, task, commands):
+        self.name = name
+        self.task = task
+        self.commands = len(commands)
+        self.duration = sum([command.duration for command in commands])
+        self.cores = max([command.cores for command in commands])
+        self.memory = max([command.memory for command in commands])
+        self.submit_time = None
+        self.start_time = None
+        self.end_time = None
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def load_task_config(task):
+    """
+    Gets the configs of a task from its YAML file in the ``tasks_config_dir``; an empty dict for tasks that are not in the ``task_models``
+    """
+    if task not in task_models:
+        return({})
+    return(config.load_task_configs(os.path.join(tasks_config_dir, task_models[task]['config_file'])))
+
+def get_shard_key(job_name):
+    """
+    Gets the chromosome from the name of a sharded job, e.g. ``'chr5'`` from ``'MuTect2Split.Tumor1_Normal1_chr5'``; ``''`` for jobs that are not sharded
+    """
+    match = _shard_key_pattern.search(job_name or '')
+    if match:
+        return(match.group(1))
+    return('')
+
+def _add(durations, task, key, seconds):
+    durations['durations'].setdefault(task, {}).setdefault(key, []).append(float(seconds))
+
+def _read_accounting_table(path, durations):
+    """
+    Reads the durations and memory use of the successful jobs in an ``accounting`` jobs table
+    """
+    with open(path) as f:
+        for row in csv.DictReader(f, delimiter = '\t'):
+            task = row.get('task', 'NA')
+            if task == 'NA' or row.get('exit_status', None) not in ('0', 'NA') or row.get('wallclock', 'NA') == 'NA':
+                continue
+            # packed jobs run many commands; their commands are read from the status files
+            if _pack_name_pattern.search(row.get('job_name', '')):
+                continue
+            _add(durations, task, get_shard_key(row.get('job_name', '')), row['wallclock'])
+            if row.get('maxvmem', 'NA') != 'NA':
+                durations['memory'].setdefault(task, []).append(float(row['maxvmem']) / 1024 ** 3)
+
+def _read_status_file(path, durations):
+    """
+    Reads the durations of the successful commands in the status file of a packed job
+    """
+    for status in job_packing.read_status(path).values():
+        if status['exit_code'] != 0:
+            continue
+        task = status['name'].split('.', 1)[0]
+        _add(durations, task, get_shard_key(status['name']), status['seconds'])
+
+def _read_history(path, durations):
+    """
+    Reads a ``job_packing`` duration history file, or a durations file saved by this script
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if 'durations' in data:
+        for task, values in data.get('memory', {}).items():
+            durations['memory'].setdefault(task, []).extend(values)
+        data = data['durations']
+    for task, keys in data.items():
+        for key, values in keys.items():
+            for seconds in values:
+                _add(durations, task, key, seconds)
+
+def read_durations(paths):
+    """
+    Reads the durations and memory use of the jobs of earlier runs
+
+    Parameters
+    ----------
+    paths: list
+        paths to accounting tables (``.tsv``), packed job status files (``.status.tsv``), duration history files (``.json``), or directories to search for them, e.g. analysis directories
+
+    Returns
+    -------
+    dict
+        the durations and memory, in the format ``{'durations': {task: {key: [seconds, ...]}}, 'memory': {task: [gigabytes, ...]}}``
+    """
+    durations = {'durations': {}, 'memory': {}}
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith('.status.tsv') or name in ('snsxt_accounting.tsv', 'job_durations.json'):
+                        files.append(os.path.join(root, name))
+        else:
+            files.append(path)
+    for path in files:
+        logger.debug('Reading job durations from file: {0}'.format(path))
+        if path.endswith('.status.tsv'):
+            _read_status_file(path, durations)
+        elif path.endswith('.json'):
+            _read_history(path, durations)
+        else:
+            _read_accounting_table(path, durations)
+    for task, keys in sorted(durations['durations'].items()):
+        logger.info('{0}: {1} durations'.format(task, sum([len(values) for values in keys.values()])))
+    return(durations)
+
+def get_duration(durations, task, key, rand, default):
+    """
+    Draws a duration for a command from the recorded durations of its task and key, or of any key of its task
+
+    Parameters
+    ----------
+    durations: dict
+        the recorded durations, from ``read_durations()``
+    task: str
+        the name of the task
+    key: str
+        the chromosome of a sharded command, or ``''``
+    rand: random.Random
+        the random number generator to draw with
+    default: float
+        the duration if there are none recorded for the task
+
+    Returns
+    -------
+    float
+        the duration in seconds
+    """
+    task_durations = durations['durations'].get(task, {})
+    values = task_durations.get(key, None)
+    if not values:
+        values = [seconds for name in sorted(task_durations.keys()) for seconds in task_durations[name]]
+    if not values:
+        return(float(default))
+    # not rand.choice(), which draws differently on Python 2 and 3
+    return(values[int(rand.random() * len(values))])
+
+def read_analysis(analysis_dir):
+    """
+    Reads the samples, tumor-normal pairs, and size of the targets on each chromosome of an analysis
+
+    Returns
+    -------
+    dict
+        the workload, in the format ``{'samples': [sampleID, ...], 'pairs': [(tumorID, normalID), ...], 'chromosomes': {chrom: bases}}``
+    """
+    analysis = synthetic_analysis.SyntheticAnalysis(analysis_dir = analysis_dir)
+    sampleIDs = [sample.id for sample in analysis.get_samples()]
+    pairs = []
+    with open(analysis.static_files['paired_samples']) as f:
+        for row in csv.DictReader(f):
+            tumor, normal = row.get('#SAMPLE-T', None), row.get('#SAMPLE-N', None)
+            if tumor in sampleIDs and normal in sampleIDs:
+                pairs.append((tumor, normal))
+    chromosomes = collections.OrderedDict()
+    with open(analysis.static_files['targets_bed']) as f:
+        for line in f:
+            parts = line.split('\t')
+            if len(parts) < 3 or line.startswith(('#', 'track', 'browser')):
+                continue
+            chromosomes[parts[0]] = chromosomes.get(parts[0], 0) + int(parts[2]) - int(parts[1])
+    return({'samples': sampleIDs, 'pairs': pairs, 'chromosomes': chromosomes})
+
+def make_workload(num_samples, pair_fraction = 0.5):
+    """
+    Makes the workload of an analysis with the given number of samples, paired the same way as ``synthetic_analysis``, and the targets of an exome on each chromosome, from ``synthetic_analysis.chromosome_target_bases``
+    """
+    sampleIDs = synthetic_analysis.get_sampleIDs(num_samples)
+    num_paired = int(num_samples * pair_fraction) // 2 * 2
+    pairs = [(sampleIDs[i], sampleIDs[i + 1]) for i in range(0, num_paired, 2)]
+    chromosomes = collections.OrderedDict(synthetic_analysis.chromosome_target_bases)
+    return({'samples': sampleIDs, 'pairs': pairs, 'chromosomes': chromosomes})
+
+def make_commands(tasks, workload, durations, seed = 0):
+    """
+    Makes the commands that each task would run on the workload, with their durations drawn from the recorded durations. Sharded tasks get a command per chromosome in the targets.
+
+    Returns
+    -------
+    collections.OrderedDict
+        the commands of each task, in the format ``{task: [SimCommand, ...]}``
+    """
+    rand = random.Random(seed)
+    task_commands = collections.OrderedDict()
+    for task in tasks:
+        if task not in task_models:
+            logger.info('Task {0} does not submit qsub jobs; it is not simulated'.format(task))
+            continue
+        model = task_models[task]
+        task_configs = load_task_config(task)
+        task_default = (task_configs.get('packing', None) or {}).get('default_duration', default_duration)
+        cores = task_configs.get('threads', 1)
+        memory_values = sorted(durations['memory'].get(task, []))
+        memory = memory_values[len(memory_values) // 2] if memory_values else default_memory
+        if model['unit'] == 'pair':
+            units = ['{0}_{1}'.format(tumor, normal) for tumor, normal in workload['pairs']]
+        else:
+            units = list(workload['samples'])
+        keys = list(workload['chromosomes'].keys()) if model['sharded'] else ['']
+        task_has_keys = any([key in durations['durations'].get(task, {}) for key in keys if key])
+        total_bases = float(sum(workload['chromosomes'].values()))
+        commands = []
+        for unit in units:
+            for key in keys:
+                duration = get_duration(durations = durations, task = task, key = key, rand = rand, default = task_default)
+                if key and not task_has_keys:
+                    # no durations per chromosome; split the unit's duration by the size of the targets
+                    duration = duration * len(keys) * workload['chromosomes'][key] / total_bases
+                name = '{0}.{1}'.format(task, unit) + ('_' + key if key else '')
+                commands.append(SimCommand(name = name, task = task, unit = unit, key = key, duration = duration, cores = cores, memory = memory))
+        task_commands[task] = commands
+    return(task_commands)
+
+def make_jobs(task_commands, sharding = 'chromosome', packing = 'unpacked', shards = None):
+    """
+    Makes the jobs that each task would submit for its commands
+
+    Parameters
+    ----------
+    task_commands: dict
+        the commands of each task, from ``make_commands()``
+    sharding: str
+        ``'chromosome'`` or ``'balanced'``; see ``sharding_policies``
+    packing: str
+        ``'unpacked'`` or ``'packed'``; see ``packing_policies``
+    shards: int
+        number of shards per unit for ``'balanced'`` sharding; defaults to the number of chromosomes
+
+    Returns
+    -------
+    collections.OrderedDict
+        the jobs of each task, in the format ``{task: [SimJob, ...]}``
+    """
+    task_jobs = collections.OrderedDict()
+    for task, commands in task_commands.items():
+        if sharding == 'balanced' and task_models[task]['sharded']:
+            units = collections.OrderedDict()
+            for command in commands:
+                units.setdefault(command.unit, []).append(command)
+            commands = []
+            for unit, unit_commands in units.items():
+                num_shards = shards or len(unit_commands)
+                shard_duration = sum([command.duration for command in unit_commands]) / num_shards
+                first = unit_commands[0]
+                for i in range(num_shards):
+                    commands.append(SimCommand(name = '{0}.{1}_shard{2}'.format(task, unit, i + 1), task = task, unit = unit, key = 'shard{0}'.format(i + 1),
+                                                duration = shard_duration, cores = first.cores, memory = first.memory))
+
+        packing_configs = load_task_config(task).get('packing', None)
+        if packing == 'packed' and (packing_configs or task_models[task]['sharded']):
+            # pack by the durations estimated per key, as the task would; the packs run for the actual durations
+            history = {task: {}}
+            for command in commands:
+                history[task].setdefault(command.key, []).append(command.duration)
+            items = []
+            for i, command in enumerate(commands):
+                estimate = job_packing.estimate_duration(task = task, key = command.key, history = history, default_duration = command.duration)
+                items.append(job_packing.PackedCommand(command = command, name = command.name, key = command.key, estimate = estimate, order = i, submit_kwargs = {}))
+            packs = job_packing.pack_commands(commands = items, target_runtime = (packing_configs or {}).get('target_runtime', default_target_runtime))
+            task_jobs[task] = [SimJob(name = '{0}.pack{1}'.format(task, i + 1), task = task, commands = [item.command for item in pack]) for i, pack in enumerate(packs)]
+        else:
+            task_jobs[task] = [SimJob(name = command.name, task = task, commands = [command]) for command in commands]
+    return(task_jobs)
+
+def simulate(task_jobs, barriers, slots, memory, queue_latency = 15, job_overhead = 10, submit_interval = 1):
+    """
+    Runs the jobs on a simulated cluster
+
+    Parameters
+    ----------
+    task_jobs: dict
+        the jobs of each task, in the order the tasks are run, from ``make_jobs()``
+    barriers: list
+        the tasks whose jobs must finish before the next task's jobs are submitted
+    slots: int
+        number of slots (CPU cores) in the cluster
+    memory: float
+        gigabytes of memory in the cluster
+    queue_latency: float
+        seconds after its submission before a job can be scheduled
+    job_overhead: float
+        seconds each job spends starting up before its commands run
+    submit_interval: float
+        seconds the program spends submitting each job
+
+    Returns
+    -------
+    dict
+        the makespan, slot utilization, and queue waits of the run, overall and per task
+    """
+    for jobs in task_jobs.values():
+        for job in jobs:
+            if job.cores > slots or job.memory > memory:
+                raise ValueError('Job {0} needs {1} slots and {2:.1f}GB memory, more than the cluster has'.format(job.name, job.cores, job.memory))
+    tasks = list(task_jobs.keys())
+    events = []
+    sequence = itertools.count()
+    queue = []
+    free = {'slots': slots, 'memory': memory}
+    remaining = dict([(task, len(jobs)) for task, jobs in task_jobs.items()])
+    state = {'next_task': 0}
+
+    def submit_tasks(now):
+        # submit the jobs of the next tasks, up to and including the next one that must be waited for
+        while state['next_task'] < len(tasks):
+            task = tasks[state['next_task']]
+            state['next_task'] += 1
+            for job in task_jobs[task]:
+                now += submit_interval
+                job.submit_time = now
+                heapq.heappush(events, (now + queue_latency, next(sequence), 'queued', job))
+            if task in barriers and task_jobs[task]:
+                break
+
+    def schedule(now):
+        waiting = []
+        for i, job in enumerate(queue):
+            if free['slots'] == 0:
+                # nothing else can start
+                waiting.extend(queue[i:])
+                break
+            if job.cores <= free['slots'] and job.memory <= free['memory']:
+                free['slots'] -= job.cores
+                free['memory'] -= job.memory
+                job.start_time = now
+                heapq.heappush(events, (now + job_overhead + job.duration, next(sequence), 'finished', job))
+            else:
+                waiting.append(job)
+        queue[:] = waiting
+
+    submit_tasks(0.0)
+    now = 0.0
+    while events:
+        now, _, event, job = heapq.heappop(events)
+        if event == 'queued':
+            queue.append(job)
+        else:
+            job.end_time = now
+            free['slots'] += job.cores
+            free['memory'] += job.memory
+            remaining[job.task] -= 1
+            if remaining[job.task] == 0 and job.task in barriers:
+                submit_tasks(now)
+        schedule(now)
+
+    all_jobs = [job for jobs in task_jobs.values() for job in jobs]
+    makespan = max([job.end_time for job in all_jobs] or [0.0])
+    busy = sum([job.cores * (job.end_time - job.start_time) for job in all_jobs])
+    waits = [job.start_time - job.submit_time for job in all_jobs]
+    result = collections.OrderedDict()
+    result['makespan'] = round(makespan, 3)
+    result['jobs'] = len(all_jobs)
+    result['commands'] = sum([job.commands for job in all_jobs])
+    result['utilization'] = round(busy / (slots * makespan), 4) if makespan else 0.0
+    result['mean_queue_wait'] = round(sum(waits) / len(waits), 3) if waits else 0.0
+    result['max_queue_wait'] = round(max(waits), 3) if waits else 0.0
+    result['tasks'] = collections.OrderedDict()
+    for task, jobs in task_jobs.items():
+        if not jobs:
+            continue
+        result['tasks'][task] = collections.OrderedDict([
+            ('jobs', len(jobs)),
+            ('first_start', round(min([job.start_time for job in jobs]), 3)),
+            ('last_end', round(max([job.end_time for job in jobs]), 3)),
+            ('mean_queue_wait', round(sum([job.start_time - job.submit_time for job in jobs]) / len(jobs), 3))
+            ])
+    return(result)
+
+def get_barriers(order, task_list):
+    """
+    Gets the tasks whose jobs must finish before the next task's jobs are submitted, under an order policy
+
+    Parameters
+    ----------
+    order: str
+        one of the ``order_policies``
+    task_list: dict
+        the tasks and their params, in the order they are run
+    """
+    if order == 'sequential':
+        return(list(task_list.keys()))
+    if order == 'task-list':
+        return([task for task, params in task_list.items() if (params or {}).get('qsub_wait', True)])
+    return([])
+
+def run_simulations(task_list, workload, durations, cluster, orders = None, shardings = None, packings = None, shards = None, seed = 0):
+    """
+    Simulates every combination of the policies on the same commands
+
+    Parameters
+    ----------
+    task_list: dict
+        the tasks and their params, in the order they are run
+    workload: dict
+        the samples, pairs, and chromosomes, from ``read_analysis()`` or ``make_workload()``
+    durations: dict
+        the recorded durations, from ``read_durations()``
+    cluster: dict
+        the args of ``simulate()`` for the cluster: ``slots``, ``memory``, ``queue_latency``, ``job_overhead``, ``submit_interval``
+    orders, shardings, packings: list
+        the policies to compare; default to all of them
+    shards: int
+        number of shards per pair for ``balanced`` sharding
+    seed: int
+        seed for drawing the command durations
+
+    Returns
+    -------
+    collections.OrderedDict
+        the report, with the inputs and a result for each combination of policies, sorted by makespan
+    """
+    task_commands = make_commands(tasks = list(task_list.keys()), workload = workload, durations = durations, seed = seed)
+    results = []
+    for order, sharding, packing in itertools.product(orders or order_policies, shardings or sharding_policies, packings or packing_policies):
+        task_jobs = make_jobs(task_commands = task_commands, sharding = sharding, packing = packing, shards = shards)
+        result = collections.OrderedDict([('order', order), ('sharding', sharding), ('packing', packing)])
+        result.update(simulate(task_jobs = task_jobs, barriers = get_barriers(order, task_list), **cluster))
+        results.append(result)
+    results.sort(key = lambda result: (result['makespan'], result['order'], result['sharding'], result['packing']))
+
+    report = collections.OrderedDict()
+    report['cluster'] = collections.OrderedDict(sorted(cluster.items()))
+    report['seed'] = seed
+    report['tasks'] = list(task_commands.keys())
+    report['samples'] = len(workload['samples'])
+    report['pairs'] = len(workload['pairs'])
+    report['chromosomes'] = len(workload['chromosomes'])
+    report['tasks_without_durations'] = [task for task in task_commands if not durations['durations'].get(task, None)]
+    report['results'] = results
+    return(report)
+
+def format_report(report):
+    """
+    Formats the results of a simulation report as a text table, fastest first
+    """
+    fields = ['order', 'sharding', 'packing', 'makespan', 'jobs', 'utilization', 'mean_queue_wait']
+    lines = ['\t'.join(fields)]
+    for result in report['results']:
+        lines.append('\t'.join([str(result[field]) for field in fields]))
+    if report['tasks_without_durations']:
+        lines.append('No recorded durations for tasks, used defaults: {0}'.format(', '.join(report['tasks_without_durations'])))
+    return('\n'.join(lines))
+
+def main_durations(**kwargs):
+    """
+    Saves the durations of the jobs of earlier runs to a JSON file
+    """
+    durations = read_durations(paths = kwargs['paths'])
+    with open(kwargs['output_file'], 'w') as f:
+        json.dump(durations, f, indent = 4, sort_keys = True, separators = (',', ': '))
+    logger.info('Job durations saved to file: {0}'.format(kwargs['output_file']))
+
+def main_run(**kwargs):
+    """
+    Simulates the policies and saves the report to a JSON file
+    """
+    if kwargs['task_list_file']:
+        task_list = config.load_yaml(kwargs['task_list_file'], ordered = True).get('tasks', None) or {}
+    else:
+        task_list = collections.OrderedDict([(task, None) for task in kwargs['tasks'] or default_tasks])
+    if kwargs['analysis_dir']:
+        workload = read_analysis(analysis_dir = kwargs['analysis_dir'])
+    else:
+        workload = make_workload(num_samples = kwargs['num_samples'], pair_fraction = kwargs['pair_fraction'])
+    if kwargs['durations_file']:
+        durations = read_durations(paths = [kwargs['durations_file']])
+    else:
+        durations = {'durations': {}, 'memory': {}}
+    cluster = {'slots': kwargs['slots'], 'memory': kwargs['memory'], 'queue_latency': kwargs['queue_latency'],
+                'job_overhead': kwargs['job_overhead'], 'submit_interval': kwargs['submit_interval']}
+    report = run_simulations(task_list = task_list, workload = workload, durations = durations, cluster = cluster,
+                            orders = kwargs['orders'], shardings = kwargs['shardings'], packings = kwargs['packings'],
+                            shards = kwargs['shards'], seed = kwargs['seed'])
+    print(format_report(report))
+    with open(kwargs['output_file'], 'w') as f:
+        json.dump(report, f, indent = 4, separators = (',', ': '))
+    logger.info('Simulation report saved to file: {0}'.format(kwargs['output_file']))
+
+def parse():
+    """
+    Parses the script args
+    """
+    parser = argparse.ArgumentParser(description = 'Simulate the qsub jobs of the downstream tasks on an SGE cluster, to compare job scheduling policies')
+    subparsers = parser.add_subparsers(dest = 'command')
+
+    durations_parser = subparsers.add_parser('durations', help = 'Save the job durations of earlier runs to a JSON file')
+    durations_parser.add_argument('paths', nargs = '+', help = 'Accounting tables, packed job status files, job duration history files, or directories to search for them')
+    durations_parser.add_argument('-o', '--output', dest = 'output_file', default = 'snsxt_durations.json', help = 'JSON file to save the durations to')
+    durations_parser.set_defaults(func = main_durations)
+
+    run_parser = subparsers.add_parser('run', help = 'Simulate the scheduling policies')
+    run_parser.add_argument('-d', '--analysis_dir', dest = 'analysis_dir', default = None, help = 'Analysis dir to read the samples, pairs, and targets from')
+    run_parser.add_argument('-n', '--samples', dest = 'num_samples', type = int, default = 10, help = 'Number of samples, if no analysis dir is given')
+    run_parser.add_argument('--pair-fraction', dest = 'pair_fraction', type = float, default = 0.5, help = 'Fraction of the samples in tumor-normal pairs, if no analysis dir is given')
+    run_parser.add_argument('-t', '--task-list', dest = 'task_list_file', default = None, help = 'YAML formatted task list file; the tasks are read from its "tasks" item')
+    run_parser.add_argument('--task', dest = 'tasks', action = 'append', default = None, help = 'Task to simulate, if no task list is given; can be given many times. Defaults to: {0}'.format(', '.join(default_tasks)))
+    run_parser.add_argument('--durations', dest = 'durations_file', default = None, help = 'JSON file of job durations from the "durations" subcommand, or a job_packing history file')
+    run_parser.add_argument('--slots', dest = 'slots', type = int, default = 64, help = 'Number of slots in the cluster')
+    run_parser.add_argument('--memory', dest = 'memory', type = float, default = 512, help = 'Gigabytes of memory in the cluster')
+    run_parser.add_argument('--queue-latency', dest = 'queue_latency', type = float, default = 15, help = 'Seconds after submission before a job can be scheduled')
+    run_parser.add_argument('--job-overhead', dest = 'job_overhead', type = float, default = 10, help = 'Seconds each job spends starting up')
+    run_parser.add_argument('--submit-interval', dest = 'submit_interval', type = float, default = 1, help = 'Seconds the program spends submitting each job')
+    run_parser.add_argument('--order', dest = 'orders', nargs = '+', choices = order_policies, default = None, help = 'Order policies to compare; defaults to all')
+    run_parser.add_argument('--sharding', dest = 'shardings', nargs = '+', choices = sharding_policies, default = None, help = 'Sharding policies to compare; defaults to all')
+    run_parser.add_argument('--packing', dest = 'packings', nargs = '+', choices = packing_policies, default = None, help = 'Packing policies to compare; defaults to all')
+    run_parser.add_argument('--shards', dest = 'shards', type = int, default = None, help = 'Number of shards per pair for balanced sharding; defaults to the number of chromosomes')
+    run_parser.add_argument('--seed', dest = 'seed', type = int, default = 0, help = 'Seed for drawing the job durations')
+    run_parser.add_argument('-o', '--output', dest = 'output_file', default = 'snsxt_simulation.json', help = 'JSON file to save the report to')
+    run_parser.set_defaults(func = main_run)
+
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, stream = sys.stderr, format = '%(message)s')
+    kwargs = vars(args)
+    func = kwargs.pop('func')
+    kwargs.pop('command')
+    func(**kwargs)
+
+if __name__ == "__main__":
+    parse()
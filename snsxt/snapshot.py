@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Records a compact checksum manifest of the files in an analysis directory
+
+Analysis directories deployed in 'manifest' git mode (see ``deploy.py``) only track their configs, sample sheets, and task lists in git. The pipeline output is recorded instead by this script as one line per file in a tab-separated manifest with the file's size, modification time, and MD5 checksum. Files whose size and modification time match the previous manifest are not hashed again, so repeated snapshots of a large directory are fast.
+
+Examples
+--------
+Example usage::
+
+    snsxt$ snsxt/snapshot.py -d /ifs/data/molecpathlab/NGS580_WES/171116_NB501073_0027_AHT5M2BGX3/results_2017-11-20_12-00-00
+    snsxt$ snsxt/snapshot.py -d /path/to/analysis_dir --commit
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import sys
+import fnmatch
+import hashlib
+import argparse
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+# ~~~~~ GLOBALS ~~~~~ #
+manifest_filename = 'snsxt_checksums.tsv'
+"""
+Name of the checksum manifest file saved in the analysis directory
+"""
+
+default_exclusion_patterns = ('.git', 'snsxt', manifest_filename)
+"""
+Names of files and directories in the analysis directory that are not included in the manifest; the ``snsxt`` directory is a separate git checkout
+"""
+
+_manifest_header = ['path', 'size', 'mtime', 'md5']
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def md5sum(path, block_size = 1048576):
+    """
+    Calculates the MD5 checksum of a file
+
+    Parameters
+    ----------
+    path: str
+        path to the file
+    block_size: int
+        number of bytes to read at a time
+
+    Returns
+    -------
+    str
+        the hex digest of the file's checksum
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            md5.update(block)
+    return(md5.hexdigest())
+
+def find_files(analysis_dir, exclusion_patterns = default_exclusion_patterns):
+    """
+    Finds all the files in the analysis directory. Symlinks are not followed, so that the linked fastq directory is not included.
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+    exclusion_patterns: list
+        ``fnmatch`` patterns for the paths of items to skip, relative to the ``analysis_dir``
+
+    Returns
+    -------
+    list
+        a list of the paths to the files, relative to the ``analysis_dir``
+    """
+    def excluded(relpath):
+        return(any(fnmatch.fnmatch(relpath, pattern) for pattern in exclusion_patterns))
+
+    files = []
+    for root, dirs, filenames in os.walk(analysis_dir):
+        relroot = os.path.relpath(root, analysis_dir)
+        if relroot == '.':
+            relroot = ''
+        dirs[:] = [name for name in dirs if not excluded(os.path.join(relroot, name))]
+        for name in filenames:
+            relpath = os.path.join(relroot, name)
+            if excluded(relpath) or os.path.islink(os.path.join(root, name)):
+                continue
+            files.append(relpath)
+    return(sorted(files))
+
+def load_manifest(manifest_file):
+    """
+    Loads a checksum manifest
+
+    Parameters
+    ----------
+    manifest_file: str
+        path to the manifest file
+
+    Returns
+    -------
+    dict
+        a dictionary in the format ``{path: (size, mtime, md5)}``; empty if the file does not exist
+    """
+    entries = {}
+    if not os.path.exists(manifest_file):
+        return(entries)
+    with open(manifest_file) as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != len(_manifest_header) or parts == _manifest_header:
+                continue
+            path, size, mtime, md5 = parts
+            entries[path] = (size, mtime, md5)
+    return(entries)
+
+def _file_entry(args):
+    """
+    Gets the manifest entry for a file, reusing the checksum from the previous manifest if the file has not changed
+    """
+    analysis_dir, relpath, previous = args
+    stats = os.stat(os.path.join(analysis_dir, relpath))
+    size = str(stats.st_size)
+    mtime = '{0:.0f}'.format(stats.st_mtime)
+    if previous and previous[0] == size and previous[1] == mtime:
+        return((relpath, size, mtime, previous[2]))
+    return((relpath, size, mtime, md5sum(os.path.join(analysis_dir, relpath))))
+
+def snapshot(analysis_dir, manifest_file = None, threads = 4, exclusion_patterns = default_exclusion_patterns):
+    """
+    Writes the checksum manifest for the files in the analysis directory
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+    manifest_file: str
+        path to the manifest file to write; defaults to ``snsxt_checksums.tsv`` in the ``analysis_dir``
+    threads: int
+        number of files to checksum at the same time
+    exclusion_patterns: list
+        ``fnmatch`` patterns for the paths of items to skip, relative to the ``analysis_dir``
+
+    Returns
+    -------
+    str
+        path to the manifest file
+    """
+    if not manifest_file:
+        manifest_file = os.path.join(analysis_dir, manifest_filename)
+    previous_entries = load_manifest(manifest_file)
+    files = find_files(analysis_dir = analysis_dir, exclusion_patterns = exclusion_patterns)
+    logger.info('Recording checksums for {0} files in directory: {1}'.format(len(files), analysis_dir))
+
+    pool = ThreadPool(max(1, threads))
+    try:
+        entries = pool.map(_file_entry, [(analysis_dir, relpath, previous_entries.get(relpath, None)) for relpath in files])
+    finally:
+        pool.close()
+        pool.join()
+
+    # write to a temporary file first, so an interrupted snapshot does not clobber the previous manifest
+    tmp_file = manifest_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write('\t'.join(_manifest_header) + '\n')
+        for entry in entries:
+            f.write('\t'.join(entry) + '\n')
+    os.rename(tmp_file, manifest_file)
+    logger.info('Checksum manifest saved to file: {0}'.format(manifest_file))
+    return(manifest_file)
+
+def commit_snapshot(analysis_dir, manifest_file, message = 'snsxt checksum snapshot'):
+    """
+    Commits the checksum manifest to the analysis directory's git repo
+
+    Parameters
+    ----------
+    analysis_dir: str
+        path to the analysis directory
+    manifest_file: str
+        path to the manifest file
+    message: str
+        the commit message
+    """
+    subprocess.check_call(['git', 'add', '--force', os.path.relpath(manifest_file, analysis_dir)], cwd = analysis_dir)
+    # nothing to commit if the manifest did not change
+    if subprocess.call(['git', 'diff', '--cached', '--quiet'], cwd = analysis_dir) != 0:
+        subprocess.check_call(['git', 'commit', '--quiet', '-m', message], cwd = analysis_dir)
+
+def main(**kwargs):
+    """
+    Main control function for the script
+
+    Keyword Arguments
+    -----------------
+    analysis_dir: str
+        path to the analysis directory
+    manifest_file: str
+        path to the manifest file to write
+    threads: int
+        number of files to checksum at the same time
+    commit: bool
+        whether to commit the manifest to the analysis directory's git repo
+    """
+    analysis_dir = os.path.realpath(kwargs.pop('analysis_dir'))
+    manifest_file = kwargs.pop('manifest_file', None)
+    threads = kwargs.pop('threads', 4)
+    commit = kwargs.pop('commit', False)
+
+    manifest_file = snapshot(analysis_dir = analysis_dir, manifest_file = manifest_file, threads = threads)
+    if commit:
+        commit_snapshot(analysis_dir = analysis_dir, manifest_file = manifest_file)
+
+def parse():
+    """
+    Parses the script args
+    """
+    parser = argparse.ArgumentParser(description = 'Record a checksum manifest of the files in an analysis directory')
+    parser.add_argument('-d', '--analysis_dir', dest = 'analysis_dir', default = os.getcwd(), help = 'Path to the analysis directory')
+    parser.add_argument('-o', '--output', dest = 'manifest_file', default = None, help = 'Manifest file to write; defaults to {0} in the analysis directory'.format(manifest_filename))
+    parser.add_argument('-j', '--threads', dest = 'threads', type = int, default = 4, help = 'Number of files to checksum at the same time')
+    parser.add_argument('--commit', dest = 'commit', action = 'store_true', help = "Commit the manifest to the analysis directory's git repo")
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, stream = sys.stdout, format = '%(message)s')
+    main(**vars(args))
+
+if __name__ == "__main__":
+    parse()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import re
+import task_classes
+from task_classes import QsubSampleTask
+
+class BamCoverage(QsubSampleTask):
+    """
+    Calculates the coverage of each target region for every sample in the analysis directly from the sample's indexed .bam file, as a lighter alternative to ``GATKDepthOfCoverageCustom`` for the per-target average coverage and coverage threshold percents
+
+    The qsub job for each sample runs the ``run_script``, which only reads the target regions from the .bam file and splits them among several processes. It uses the same coverage thresholds and base and mapping quality filters as GATK DepthOfCoverage, from the ``coverage_config_file``, and writes a ``.sample_interval_summary`` file in the same format, so it can be used with ``SummaryAvgCoverage``.
+    """
+    # the names the .bam index can have, e.g. 'Sample1.bam.bai' from samtools or 'Sample1.bai' from Picard
+    bam_index_extensions = ['.bam.bai', '.bai']
+
+    def __init__(self, analysis, taskname = 'BamCoverage', config_file = 'BamCoverage.yml', extra_handlers = None):
+        """
+        Parameters
+        ----------
+        analysis: SnsWESAnalysisOutput
+            the `sns` pipeline output object to run the task on. If ``None`` is passed, ``self.analysis`` is retrieved instead.
+        extra_handlers: list
+            a list of extra Filehandlers to use for logging
+        """
+        QsubSampleTask.__init__(self, taskname = taskname, config_file = config_file, analysis = analysis, extra_handlers = extra_handlers)
+        self.run_script_path = os.path.join(self.main_configs['tasks_scripts_dir'], self.task_configs['run_script'])
+        self.coverage_configs = task_classes.config.load_task_configs(os.path.join(self.main_configs['tasks_config_dir'], self.task_configs['coverage_config_file']))
+        """
+        The configs with the coverage thresholds and filters to use
+        """
+
+    def bam_coverage_cmd(self, sampleID, bam_file, targets_bed, output_file):
+        """
+        Build the terminal command to calculate the coverage of the target regions for a single sample
+        """
+        thresholds_arg = ' '.join(['-ct ' + str(x) for x in self.coverage_configs['thresholds']])
+        command = """
+    "{0}" "{1}" \\
+    --bam "{2}" \\
+    --targets "{3}" \\
+    --sample "{4}" \\
+    --output "{5}" \\
+    {6} \\
+    -mbq {7} \\
+    -mmq {8} \\
+    --threads {9}
+    """.format(
+    self.task_configs['python_bin'], # 0
+    self.run_script_path, # 1
+    bam_file, # 2
+    targets_bed, # 3
+    sampleID, # 4
+    output_file, # 5
+    thresholds_arg, # 6
+    self.coverage_configs['minBaseQuality'], # 7
+    self.coverage_configs['minMappingQuality'], # 8
+    self.task_configs['threads'] # 9
+    )
+        return(command)
+
+    def main(self, sample):
+        """
+        Submits a qsub job to calculate the coverage of the target regions for a single sample
+
+        Parameters
+        ----------
+        sample: SnsAnalysisSample
+            a single sample from the analysis
+
+        Returns
+        -------
+        qsub.Job
+            a single qsub job object
+        """
+        self.logger.debug('Sample is: {0}'.format(sample.id))
+
+        # get the dir for the qsub logs
+        qsub_log_dir = sample.list_none(sample.analysis_config['dirs']['logs-qsub'])
+
+        sample_bam = self.get_sample_file_inputpath(sampleID = sample.id, suffix = self.input_suffix)
+        targets_bed = sample.list_none(self.get_sample_static_file(sample = sample, name = 'targets_bed'))
+        output_file = self.get_sample_file_outpath(sampleID = sample.id, suffix = self.output_suffix)
+
+        # the index is needed to read only the target regions
+        bam_indexes = [os.path.splitext(sample_bam)[0] + ext for ext in self.bam_index_extensions]
+        bam_index = ([path for path in bam_indexes if os.path.exists(path)] or bam_indexes)[0]
+
+        # make sure the files and locations exist
+        self.validate_items([sample_bam, bam_index, targets_bed, qsub_log_dir])
+
+        # make the shell command to run
+        command = self.bam_coverage_cmd(sampleID = sample.id, bam_file = sample_bam, targets_bed = targets_bed, output_file = output_file)
+        self.logger.debug(command)
+
+        # submit the command as a qsub job on the HPC, with a slot for each process
+        params = '{0} -pe threaded {1}'.format(self.job_management.default_qsub_params, self.task_configs['threads'])
+        job = self.submit_qsub(command = command, name = self.taskname + '.' + sample.id, params = params, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
+        return(job)
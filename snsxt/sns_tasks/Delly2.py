@@ -76,7 +76,7 @@ class Delly2(QsubSampleTask):
         qsub_log_dir = sample.list_none(sample.analysis_config['dirs']['logs-qsub'])
         self.logger.debug('qsub_log_dir: {0}'.format(qsub_log_dir))
 
-        sample_bam = sample.list_none(sample.get_output_files(analysis_step = self.task_configs['input_dir'], pattern = self.task_configs['input_pattern']))
+        sample_bam = sample.list_none(self.get_sample_output_files(sample = sample, analysis_step = self.task_configs['input_dir'], pattern = self.task_configs['input_pattern']))
 
         # make sure the files and locations exist
         self.validate_items([sample_bam, qsub_log_dir])
@@ -86,9 +86,11 @@ class Delly2(QsubSampleTask):
 
         # make the shell command to run
         command = self.delly2_cmd(sampleID = sample.id, bam_file = sample_bam, output_dir = self.output_dir)
+        # run it on the node's local disk, if enabled; all of the sample's output files start with its ID
+        command = self.stage_command(command = command, inputs = [sample_bam, self.task_configs['hg19_fa']], outputs = [os.path.join(self.output_dir, sample.id + '.')])
 
         # submit the command as a qsub job on the HPC
         # commands to create debug jobs
-        job = self.qsub.submit(command = command, name = self.taskname + '.' + sample.id, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1) #
+        job = self.submit_qsub(command = command, name = self.taskname + '.' + sample.id, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1) #
 
         return(job)
@@ -56,6 +56,6 @@ class DemoMultiQsubSampleTask(MultiQsubSampleTask):
         # make the shell command to run
         job_name = self.taskname + '.' + sample.id
         command = 'sleep 30'
-        job1 = self.qsub.submit(command = command, name = "one" + job_name, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
-        job2 = self.qsub.submit(command = command, name = "two" + job_name, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
+        job1 = self.submit_qsub(command = command, name = "one" + job_name, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
+        job2 = self.submit_qsub(command = command, name = "two" + job_name, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
         return([job1, job2])
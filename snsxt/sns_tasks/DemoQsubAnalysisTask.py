@@ -60,6 +60,6 @@ class DemoQsubAnalysisTask(QsubAnalysisTask):
         self.logger.debug('command will be:\n{0}'.format(command))
 
         # submit the command as a qsub job on the HPC
-        job = self.qsub.submit(command = command, name = self.taskname + '.' + analysis.id, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
+        job = self.submit_qsub(command = command, name = self.taskname + '.' + analysis.id, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
 
         return(job)
@@ -9,6 +9,8 @@ from task_classes import QsubSampleTask
 class GATKDepthOfCoverageCustom(QsubSampleTask):
     """
     Class for running custom thresholds GATK DepthOfCoverage with the sns pipeline
+
+    If ``batch_size`` in the task's config file is more than 1, the samples are run in batches, with one DepthOfCoverage run on all of the .bam files in each batch, and the output is split back into the per-sample files with the ``split_script``
     """
     def __init__(self, analysis, taskname = 'GATK_DepthOfCoverage_custom', config_file = 'GATK_DepthOfCoverage_custom.yml', extra_handlers = None):
         """
@@ -27,7 +29,7 @@ class GATKDepthOfCoverageCustom(QsubSampleTask):
 
     def gatk_DepthOfCoverage_cmd(self, sampleID, bam_file, intervals_bed_file, output_dir):
         """
-        Build the terminal commands to run GATK DepthOfCoverage on a single sample
+        Build the terminal commands to run GATK DepthOfCoverage on a single sample, or on a batch of samples if ``bam_file`` is a list of .bam files; ``sampleID`` is the basename of the output files
 
         ex:
         $gatk_cmd -T DepthOfCoverage -dt NONE $gatk_log_level_arg \
@@ -53,6 +55,10 @@ class GATKDepthOfCoverageCustom(QsubSampleTask):
         downsampling_type = self.task_configs['downsampling_type']
         thresholds_arg = self.make_tresholds_arg()
         output_summary_file = os.path.join(output_dir, '{0}'.format(sampleID))
+        if isinstance(bam_file, list):
+            input_files = ' '.join(['--input_file {0}'.format(item) for item in bam_file])
+        else:
+            input_files = '--input_file {0}'.format(bam_file)
 
         gatk_cmd = """
     java -Xms16G -Xmx16G -jar {0} -T DepthOfCoverage \
@@ -68,7 +74,7 @@ class GATKDepthOfCoverageCustom(QsubSampleTask):
     --nBins {8} \
     --start {9} \
     --stop {10} \
-    --input_file {11} \
+    {11} \
     --outputFormat {12} \
     --out {13}
     """.format(
@@ -83,7 +89,7 @@ class GATKDepthOfCoverageCustom(QsubSampleTask):
     nBins,
     start,
     stop,
-    bam_file,
+    input_files,
     outputFormat,
     output_summary_file
     )
@@ -99,15 +105,12 @@ class GATKDepthOfCoverageCustom(QsubSampleTask):
         self.logger.debug('Sample is: {0}'.format(sample))
         self.logger.debug(sample.static_files)
 
-        # TODO: does this need to be here??
-        self.setup_report()
-
         # get the dir for the qsub logs
         qsub_log_dir = sample.list_none(sample.analysis_config['dirs']['logs-qsub'])
         self.logger.debug('qsub_log_dir: {0}'.format(qsub_log_dir))
 
         sample_bam = self.get_sample_file_inputpath(sampleID = sample.id, suffix = self.input_suffix)
-        targets_bed = sample.list_none(sample.get_files('targets_bed'))
+        targets_bed = sample.list_none(self.get_sample_static_file(sample = sample, name = 'targets_bed'))
 
         # make sure the files and locations exist
         self.validate_items([sample_bam, qsub_log_dir])
@@ -117,8 +120,64 @@ class GATKDepthOfCoverageCustom(QsubSampleTask):
 
         # make the shell command to run
         command = self.gatk_DepthOfCoverage_cmd(sampleID = sample.id, bam_file = sample_bam, output_dir = self.output_dir, intervals_bed_file = targets_bed)
+        # run it on the node's local disk, if enabled; the output files all start with the '--out' prefix
+        command = self.stage_command(command = command, inputs = [sample_bam, targets_bed, self.task_configs['ref_fasta']], outputs = [os.path.join(self.output_dir, sample.id)])
         self.logger.debug(command)
 
         # submit the command as a qsub job on the HPC
-        job = self.qsub.submit(command = command, name = self.taskname + '.' + sample.id, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1) #
+        job = self.submit_qsub(command = command, name = self.taskname + '.' + sample.id, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1) #
         return(job)
+
+    def split_cmd(self, sampleIDs, batch_prefix, output_dir):
+        """
+        Build the terminal command to split the output of a batch DepthOfCoverage run into the per-sample files
+        """
+        split_script = os.path.join(self.main_configs['tasks_scripts_dir'], self.task_configs['split_script'])
+        command = """
+    python "{0}" --prefix "{1}" --output-dir "{2}" {3}
+    """.format(split_script, batch_prefix, output_dir, ' '.join(sampleIDs))
+        return(command)
+
+    def main_batch(self, samples, batch_number):
+        """
+        Runs GATK DepthOfCoverage on a batch of samples from an sns analysis in a single qsub job, and splits the output into the files for each sample
+        samples is a list of SnsAnalysisSample objects
+        return the qsub job for the batch
+        """
+        # get the dir for the qsub logs; the same for all samples in the analysis
+        qsub_log_dir = samples[0].list_none(samples[0].analysis_config['dirs']['logs-qsub'])
+        targets_bed = samples[0].list_none(self.get_sample_static_file(sample = samples[0], name = 'targets_bed'))
+        sample_bams = [self.get_sample_file_inputpath(sampleID = sample.id, suffix = self.input_suffix) for sample in samples]
+
+        # make sure the files and locations exist
+        self.validate_items(sample_bams + [qsub_log_dir])
+
+        # the multi-sample output goes in a subdir, so it is not mistaken for a sample's output
+        batch_dir = self.tools.mkdirs(path = os.path.join(self.output_dir, 'batches'), return_path = True)
+        batchID = 'batch{0}'.format(batch_number)
+        sampleIDs = [sample.id for sample in samples]
+
+        # make the shell commands to run
+        command = self.gatk_DepthOfCoverage_cmd(sampleID = batchID, bam_file = sample_bams, output_dir = batch_dir, intervals_bed_file = targets_bed)
+        command += self.split_cmd(sampleIDs = sampleIDs, batch_prefix = os.path.join(batch_dir, batchID), output_dir = self.output_dir)
+        # run it on the node's local disk, if enabled; the split per-sample files are written straight to the output dir
+        command = self.stage_command(command = command, inputs = sample_bams + [targets_bed, self.task_configs['ref_fasta']], outputs = [os.path.join(batch_dir, batchID)])
+        self.logger.debug(command)
+
+        # submit the command as a qsub job on the HPC
+        job = self.submit_qsub(command = command, name = self.taskname + '.' + batchID, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
+        return(job)
+
+    def get_job_units(self, samples, *args, **kwargs):
+        """
+        Gets one unit of work per batch of samples if the task's ``batch_size`` is more than 1, or else one per sample; see ``SampleTask.get_job_units()``
+        """
+        batch_size = self.task_configs.get('batch_size', 1) or 1
+        if batch_size <= 1:
+            return(QsubSampleTask.get_job_units(self, samples, *args, **kwargs))
+        samples = list(samples)
+        units = []
+        for batch_number, i in enumerate(range(0, len(samples), batch_size), 1):
+            batch = samples[i:i + batch_size]
+            units.append((','.join([sample.id for sample in batch]), lambda batch = batch, batch_number = batch_number: self.main_batch(samples = batch, batch_number = batch_number)))
+        return(units)
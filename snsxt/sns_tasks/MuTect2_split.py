@@ -289,12 +289,16 @@ class MuTect2Split(MultiQsubSampleTask):
 
                 # make the shell command to run
                 MuTect2_command = self.MuTect2_split_cmd(input_file_tumor = tumor_bam, input_file_normal = normal_bam, intervals_file = targets_file, output_file = output_file)
+                # run it on the node's local disk, if enabled; the jobs for the other chroms on the same node reuse the staged .bam files
+                MuTect2_command = self.stage_command(command = MuTect2_command,
+                                                    inputs = [tumor_bam, normal_bam, targets_file, self.task_configs['reference_sequence'], self.task_configs['dbsnp'], self.task_configs['cosmic']],
+                                                    outputs = [output_file])
 
                 # name for the qsub job
                 job_name = self.taskname + '.' + tumor_normal_chrom_ID # MuTect2Split.SeraCare-1to1-Positive_HapMap-B17-1267_chr5
 
                 # submit the qsub job
-                job = self.qsub.submit(command = MuTect2_command, name = job_name, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
+                job = self.submit_qsub(command = MuTect2_command, name = job_name, pack_key = chrom, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
 
                 # add it to the jobs list
                 jobs.append(job)
@@ -328,7 +332,7 @@ class MuTect2Split(MultiQsubSampleTask):
         self.logger.debug('pairs_sheet is: {0}'.format(pairs_sheet))
 
         # get list of all sample IDs in the analysis
-        sampleIDs = [s.id for s in self.analysis.get_samples() ]
+        sampleIDs = self.get_samples().ids
 
         # get the dir for the qsub logs
         qsub_log_dir = sample.list_none(sample.analysis_config['dirs']['logs-qsub'])
@@ -337,7 +341,7 @@ class MuTect2Split(MultiQsubSampleTask):
         sample_bam = self.get_sample_file_inputpath(sampleID = sample.id, suffix = self.input_suffix)
 
         # get the path to the input targets .bed file
-        targets_bed = sample.list_none(sample.get_files('targets_bed'))
+        targets_bed = sample.list_none(self.get_sample_static_file(sample = sample, name = 'targets_bed'))
 
         # add all items required so far to the expected items list for the sample, and validate them
         self.add_and_validate_MuTect2_files(sampleID = sample.id, items = [pairs_sheet, qsub_log_dir, sample_bam, targets_bed])
@@ -15,7 +15,7 @@ class SummaryAvgCoverage(AnalysisTask):
         """
         """
         AnalysisTask.__init__(self, taskname = taskname, config_file = config_file, analysis = analysis, extra_handlers = extra_handlers)
-        self.task_configs['run_script_path'] = os.path.join(self.main_configs['tasks_scripts_dir'], self.task_configs['run_script'])
+        self.run_script_path = os.path.join(self.main_configs['tasks_scripts_dir'], self.task_configs['run_script'])
         # /ifs/data/molecpathlab/scripts/snsxt/snsxt/sns_tasks/scripts/calculate_average_coverages.R
 
     def make_run_script_cmd(self, input_dir, output_dir, run_script):
@@ -39,11 +39,11 @@ class SummaryAvgCoverage(AnalysisTask):
         self.logger.debug('Analysis is: {0}'.format(analysis))
 
         # shell command to run
-        command = self.make_run_script_cmd(input_dir = self.input_dir, output_dir = self.output_dir, run_script = self.task_configs['run_script_path'])
+        command = self.make_run_script_cmd(input_dir = self.input_dir, output_dir = self.output_dir, run_script = self.run_script_path)
         self.logger.debug(command)
 
         # need to change cwd for R commands to source the external tools file
-        with self.tools.DirHop(os.path.dirname(self.task_configs['run_script_path'])) as d:
+        with self.tools.DirHop(os.path.dirname(self.run_script_path)) as d:
             run_cmd = self.tools.SubprocessCmd(command = command).run()
             self.logger.debug(run_cmd.proc_stderr)
 
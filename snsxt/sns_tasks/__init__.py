@@ -1,24 +1,129 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-Initialize the sns_tasks module and import task classes
+Initialize the sns_tasks module and register the task classes
+
+Task classes are not imported when this module is loaded; the ``task_modules`` manifest maps every task name to the module that holds its class, and a module is only imported the first time its task is requested with ``get_task_class()``. This keeps program startup fast when the task list only references a few tasks (or none at all).
 """
+import os
+import re
+import importlib
+
+# path to this module's dir
+scriptdir = os.path.dirname(os.path.realpath(__file__))
+
+task_modules = {
 # demo classes
-from DemoQsubSampleTask import DemoQsubSampleTask
-from DemoQsubAnalysisTask import DemoQsubAnalysisTask
-from DemoMultiQsubSampleTask import DemoMultiQsubSampleTask
-from DemoSnsTask import DemoSnsTask
+'DemoQsubSampleTask': 'DemoQsubSampleTask',
+'DemoQsubAnalysisTask': 'DemoQsubAnalysisTask',
+'DemoMultiQsubSampleTask': 'DemoMultiQsubSampleTask',
+'DemoSnsTask': 'DemoSnsTask',
 
 # sns tasks
-from _SnsSetupPairs import SnsSetupPairs
-from StartSns import StartSns
-from SnsWes import SnsWes
-from SnsWesPairsSnv import SnsWesPairsSnv
-from SnsRnaStar import SnsRnaStar
+'SnsSetupPairs': '_SnsSetupPairs',
+'StartSns': 'StartSns',
+'SnsWes': 'SnsWes',
+'SnsWesPairsSnv': 'SnsWesPairsSnv',
+'SnsRnaStar': 'SnsRnaStar',
 
 # task classes
-from HapMapVariantRef import HapMapVariantRef
-from GATKDepthOfCoverageCustom import GATKDepthOfCoverageCustom
-from SummaryAvgCoverage import SummaryAvgCoverage
-from Delly2 import Delly2
-from MuTect2_split import MuTect2Split
+'HapMapVariantRef': 'HapMapVariantRef',
+'GATKDepthOfCoverageCustom': 'GATKDepthOfCoverageCustom',
+'BamCoverage': 'BamCoverage',
+'SummaryAvgCoverage': 'SummaryAvgCoverage',
+'Delly2': 'Delly2',
+'MuTect2Split': 'MuTect2_split'
+}
+"""
+Manifest of the available analysis tasks, in the format ``{task_name: module_name}``. New task classes should be added here in order to be made accessible to the rest of the program.
+"""
+
+# modules in this dir that do not contain analysis tasks
+_non_task_modules = ('__init__', 'task_classes', 'template')
+
+_class_pattern = re.compile(r'^class\s+(\w+)\s*\(([^)]*)\)', re.MULTILINE)
+
+task_base_classes = ('AnalysisTask', 'AnnotationInplace', 'SampleTask', 'QsubSampleTask', 'QsubAnalysisTask', 'MultiQsubSampleTask', 'SnsTask')
+"""
+The base classes of the analysis tasks in ``task_classes``; only the classes derived from them are found by ``find_task_modules()``
+"""
+
+
+def find_task_modules(search_dir = scriptdir):
+    """
+    Builds a task manifest by scanning the source of the modules in the ``search_dir`` for the definitions of classes derived from the ``task_base_classes``, or from other task classes, without importing them
+
+    Parameters
+    ----------
+    search_dir: str
+        path to the directory containing task modules
+
+    Returns
+    -------
+    dict
+        a dictionary in the format ``{task_name: module_name}``
+    """
+    # the module and base class names of every class
+    classes = {}
+    for filename in sorted(os.listdir(search_dir)):
+        module_name, ext = os.path.splitext(filename)
+        if ext != '.py' or module_name in _non_task_modules:
+            continue
+        with open(os.path.join(search_dir, filename)) as f:
+            for class_name, bases in _class_pattern.findall(f.read()):
+                # e.g. 'task_classes.QsubSampleTask'
+                classes[class_name] = (module_name, [base.strip().split('.')[-1] for base in bases.split(',')])
+    manifest = {}
+    found = True
+    # classes can be derived from task classes in other modules
+    while found:
+        found = False
+        for class_name, (module_name, bases) in classes.items():
+            if class_name not in manifest and any([base in task_base_classes or base in manifest for base in bases]):
+                manifest[class_name] = module_name
+                found = True
+    return(manifest)
+
+def get_task_module(task_name):
+    """
+    Gets the name of the module containing the task's class. Tasks missing from ``task_modules`` are searched for in the source files of this directory, and added to the manifest if found.
+
+    Parameters
+    ----------
+    task_name: str
+        the name of an analysis task
+
+    Returns
+    -------
+    str or None
+        the name of the module containing the task class, or ``None`` if the task could not be found
+    """
+    if task_name not in task_modules:
+        module_name = find_task_modules().get(task_name, None)
+        if module_name:
+            task_modules[task_name] = module_name
+    return(task_modules.get(task_name, None))
+
+def get_task_class(task_name):
+    """
+    Imports the module for the task and returns the task's class
+
+    Parameters
+    ----------
+    task_name: str
+        the name of an analysis task
+
+    Returns
+    -------
+    Class or None
+        the Class object matching the ``task_name``, or ``None`` if the task could not be found
+    """
+    module_name = get_task_module(task_name)
+    if not module_name:
+        return(None)
+    module = importlib.import_module('.' + module_name, __name__)
+    task_class = getattr(module, task_name, None)
+    # keep the class accessible as a module attribute, as before
+    if task_class:
+        globals()[task_name] = task_class
+    return(task_class)
@@ -5,8 +5,10 @@ Module for the base ``AnalysisTask`` and ``AnnotationInplace`` object classes
 """
 import os
 import sys
-import yaml
+import time
+import pipes
 import shutil
+import importlib
 
 
 # ~~~~ LOAD MORE PACKAGES ~~~~~~ #
@@ -23,12 +25,38 @@ from util import qsub
 from util import splitbed
 from util.classes import LoggedObject
 import job_management
+# already loaded by job_management
+import job_packing
+import metrics
 import _exceptions as _e
 import config
 sys.path.pop(0)
 
 configs = config.config
 
+# ~~~~~ FUNCTIONS ~~~~~ #
+def load_module(name):
+    """
+    Imports one of the program's modules the first time a task uses it, instead of when the task classes are loaded, to keep the program startup fast
+
+    Parameters
+    ----------
+    name: str
+        the name of a module in the program's dir, e.g. ``'staging'``
+
+    Returns
+    -------
+    module
+        the module
+    """
+    if name not in sys.modules:
+        sys.path.insert(0, parent_parentdir)
+        try:
+            importlib.import_module(name)
+        finally:
+            sys.path.pop(0)
+    return(sys.modules[name])
+
 # ~~~~~ CLASSES ~~~~~ #
 class AnalysisTask(LoggedObject):
     """
@@ -83,6 +111,17 @@ class AnalysisTask(LoggedObject):
             # set some extra attributes for convenience
             self._init_task_attrs()
 
+        self.packer = None
+        """
+        Collects the task's qsub commands to submit them packed into fewer jobs, if the task configs have a ``packing`` item; see ``job_packing``
+        """
+        if config_file and self.task_configs.get('packing', None):
+            self.packer = job_packing.JobPacker(task = self.taskname, **self.task_configs['packing'])
+
+        self.catalogue = None
+        """
+        The catalogue of the files in the analysis directory; see ``catalogue``
+        """
         if analysis:
             # setup the input and output locations
             self._init_locs()
@@ -91,6 +130,11 @@ class AnalysisTask(LoggedObject):
             # setup the report
             self.setup_report()
 
+    # only imported when a task first stages its files; see ``load_module()``
+    @property
+    def staging(self):
+        return(load_module('staging'))
+
     def __repr__():
         return('{0}'.format(self.taskname))
 
@@ -135,10 +179,14 @@ class AnalysisTask(LoggedObject):
         self.logger.debug('task output_dir: {0}'.format(self.output_dir))
         self.input_dir = os.path.join(self.analysis.dir, self.task_configs['input_dir'])
         self.validate_items([self.output_dir, self.input_dir])
+        # shared by all tasks; only the directories changed since the last task are listed again
+        self.catalogue = load_module('catalogue').get_catalogue(analysis_dir = self.analysis.dir,
+                                                index_file = os.path.join(self.analysis.dir, self.main_configs['catalogue_index_file']),
+                                                exclusion_dirs = self.main_configs['catalogue_exclude_dirs'])
 
     def _task_config_from_file(self, config_file):
         """
-        Loads a YAML formatted config file and adds it to the object's ``task_configs`` dictionary
+        Loads a YAML formatted config file and sets it as the object's read-only ``task_configs`` dictionary
 
         Parameters
         ----------
@@ -148,9 +196,8 @@ class AnalysisTask(LoggedObject):
         config_filepath = os.path.join(self.main_configs['tasks_config_dir'], config_file)
         self.logger.debug('Loading task config file: {0}'.format(config_filepath))
         self.validate_items([config_filepath])
-        with open(config_filepath, "r") as f:
-            self.task_configs = yaml.load(f)
-            self.task_configs['config_file'] = config_filepath
+        # cached & read-only; the file is only parsed again if it changes
+        self.task_configs = config.load_task_configs(config_filepath)
 
     def get_path(self, dirpath, file_basename, validate = False):
         """
@@ -235,6 +282,65 @@ class AnalysisTask(LoggedObject):
         path = self.get_path(dirpath = self.input_dir, file_basename = file_basename, validate = validate)
         return(path)
 
+    def get_samples(self, analysis = None):
+        """
+        Gets the samples of the analysis, from the analysis's shared ``sample_collection``; the samples are only made once for all tasks, and are light objects that share the analysis config
+
+        Parameters
+        ----------
+        analysis: SnsWESAnalysisOutput
+            the `sns` pipeline output object. If ``None`` is passed, ``self.analysis`` is used instead.
+
+        Returns
+        -------
+        sample_collection.SampleCollection
+            the samples; iterate over it to get each sample, or use its ``ids``
+        """
+        if not analysis:
+            analysis = self.analysis
+        return(load_module('sample_collection').get_collection(analysis = analysis, analysis_catalogue = self.catalogue))
+
+    def get_sample_output_files(self, sample, analysis_step, pattern):
+        """
+        Gets a sample's output files from an analysis step, from the analysis ``catalogue``. Falls back to searching the analysis directory with ``sample.get_output_files()`` if no files are found.
+
+        Parameters
+        ----------
+        sample: SnsAnalysisSample
+            a single sample from the analysis
+        analysis_step: str
+            the name of the analysis step's subdirectory, e.g. ``'BAM-GATK-RA-RC'``
+        pattern: str
+            filename pattern of the files, e.g. ``'*.dd.ra.rc.bam'``
+
+        Returns
+        -------
+        list
+            the paths to the files
+        """
+        files = []
+        if self.catalogue:
+            files = self.catalogue.find(analysis_step = analysis_step, sampleID = sample.id, pattern = pattern)
+        if not files:
+            files = sample.get_output_files(analysis_step = analysis_step, pattern = pattern)
+        return(files)
+
+    def get_sample_static_file(self, sample, name):
+        """
+        Gets a file from the top level of the analysis directory, e.g. ``'targets_bed'``, from the analysis ``catalogue``. Falls back to ``sample.get_files()`` if the file is not found.
+
+        Returns
+        -------
+        list
+            the paths to the file
+        """
+        files = []
+        if self.catalogue:
+            files = self.catalogue.get_static_file(name)
+        if not files:
+            files = sample.get_files(name)
+        return(files)
+
     def get_expected_output_files(self):
         """
         Gets the paths to all files expected to be output by the task.
@@ -290,6 +396,156 @@ class AnalysisTask(LoggedObject):
         return(expected_email_files)
 
 
+    def submit_qsub(self, command, name, pack_key = None, **kwargs):
+        """
+        Submits a qsub job for the task. Failed jobs are resubmitted according to the task's retry policy, set with the ``retry`` item in the task's config file; see ``job_management.default_retry_policy``.
+
+        If the task's config file has a ``packing`` item, the command is not submitted yet; it is added to the task's ``packer``, and submitted in a packed job by ``submit_packed_jobs()``.
+
+        Parameters
+        ----------
+        command: str
+            the shell command to run in the job
+        name: str
+            the name of the job
+        pack_key: str
+            the shard key used to estimate the command's duration when it is packed, e.g. the chromosome
+        kwargs: dict
+            extra args to pass to ``qsub.submit()``
+
+        Returns
+        -------
+        qsub.Job or job_packing.PackedCommand
+            the submitted job, or the packed command
+
+        Examples
+        --------
+        Example usage::
+
+            job = self.submit_qsub(command = command, name = self.taskname + '.' + sample.id, stdout_log_dir = qsub_log_dir, stderr_log_dir = qsub_log_dir, verbose = True, sleeps = 1)
+
+        """
+        if self.packer:
+            return(self.packer.add(command = command, name = name, key = pack_key, **kwargs))
+        return(self.job_management.submit_job(command = command, name = name, task = self.taskname, retry_policy = self.task_configs.get('retry', None), **kwargs))
+
+    def stage_command(self, command, inputs, outputs):
+        """
+        Wraps a qsub command to run on the compute node's local disk, if the task's config file has a ``staging`` item with ``enabled: True``. The input files on the shared filesystem are copied to a cache on the node, and the outputs are written to a local work directory and copied back when the command succeeds; see ``staging``. The staging stats of the jobs are appended to the ``staging_stats_file`` in the analysis directory.
+
+        Parameters
+        ----------
+        command: str
+            the shell command to run in the job
+        inputs: list
+            paths to the input files of the command
+        outputs: list
+            paths to the output files of the command, or the prefixes of its output files
+
+        Returns
+        -------
+        str
+            the wrapped command, or ``command`` if staging is not enabled for the task
+        """
+        if not self.task_configs.get('staging', {}).get('enabled', False):
+            return(command)
+        script = os.path.splitext(self.staging.__file__)[0] + '.py'
+        args = [sys.executable, script, '--task', self.taskname, '--cache-size', str(self.main_configs['staging_cache_size'])]
+        if self.main_configs['staging_cache_dir']:
+            args += ['--cache-dir', self.main_configs['staging_cache_dir']]
+        for prefix in self.main_configs['staging_shared_prefixes']:
+            args += ['--shared-prefix', prefix]
+        if self.analysis:
+            args += ['--stats-file', os.path.join(self.analysis.dir, self.main_configs['staging_stats_file'])]
+        for path in inputs:
+            args += ['--input', path]
+        for path in outputs:
+            args += ['--output', path]
+        args += ['--', command]
+        return(' '.join([pipes.quote(str(arg)) for arg in args]))
+
+    def record_submissions(self, jobs, start, sample = None):
+        """
+        Records the submission metrics of the jobs made by one call of the task's ``main()``; the time since ``start`` is shared between the jobs. Packed commands are skipped, their packed jobs are recorded when ``submit_packed_jobs()`` submits them.
+
+        Parameters
+        ----------
+        jobs: qsub.Job or list
+            the job or list of jobs, or ``None`` if no jobs were submitted
+        start: float
+            the time at which the submission started
+        sample: str
+            the ID of the sample the jobs belong to
+
+        Returns
+        -------
+        list
+            the jobs
+        """
+        if not jobs:
+            return([])
+        if not isinstance(jobs, list):
+            jobs = [jobs]
+        wall_time = (time.time() - start) / len(jobs)
+        for job in jobs:
+            if not isinstance(job, job_packing.PackedCommand):
+                metrics.record_submission(job, task = self.taskname, sample = sample, wall_time = wall_time)
+        return(jobs)
+
+    def submit_packed_jobs(self, jobs):
+        """
+        Submits the commands collected by the task's ``packer`` in packed jobs
+
+        Parameters
+        ----------
+        jobs: list
+            the items returned by ``submit_qsub()``
+
+        Returns
+        -------
+        list
+            the ``qsub.Job`` objects in ``jobs``, with the packed commands replaced by the packed jobs
+        """
+        if not self.packer or not self.packer.commands:
+            return(jobs)
+        start = time.time()
+        packed_jobs = self.packer.submit(submit_func = self.job_management.submit_job, task = self.taskname, retry_policy = self.task_configs.get('retry', None))
+        self.record_submissions(jobs = packed_jobs, start = start)
+        return([job for job in jobs if not isinstance(job, job_packing.PackedCommand)] + packed_jobs)
+
+    def run_jobs(self, units, qsub_wait = True):
+        """
+        Submits the qsub jobs of a task one unit of work at a time, e.g. one per sample, then submits the packed commands and waits for the jobs. The ``run()`` methods of the qsub task classes only differ in the units they pass in.
+
+        Parameters
+        ----------
+        units: list
+            the units of work, in the format ``[(label, make_jobs)]``; ``make_jobs`` is called with no args and returns the ``qsub.Job`` object(s) of the unit, and ``label`` is the sample ID(s) the jobs are recorded under, or ``None``
+        qsub_wait: bool
+            whether the task should wait for the qsub jobs to finish before continuing; default is ``True``
+
+        Returns
+        -------
+        list or None
+            a list of ``qsub.Job`` objects if ``qsub_wait`` is ``False``, otherwise returns ``None`` after waiting for all jobs to finish
+        """
+        # empty list to hold the qsub jobs
+        jobs = []
+        for label, make_jobs in units:
+            start = time.time()
+            jobs.extend(self.record_submissions(jobs = make_jobs(), start = start, sample = label))
+        # submit the packed commands of all units, if the task packs them
+        jobs = self.submit_packed_jobs(jobs)
+        self.logger.debug('Submitted jobs: {0}'.format([job.id for job in jobs]))
+
+        # montitor the qsub jobs until they are all completed
+        if qsub_wait:
+            self.logger.debug('Jobs will be monitored for completion and validated')
+            self.job_management.monitor_validate_jobs(jobs = jobs)
+            return(None)
+        else:
+            return(jobs)
+
     def validate_items(self, items):
         """
         Runs validations on a list of items. Makes sure that all paths passed exist.
@@ -374,18 +630,19 @@ class AnalysisTask(LoggedObject):
         if not output_dir:
             output_dir = getattr(self, 'output_dir', None) # self.output_dir
         if output_dir:
-            report_files = self.get_report_files()
-            self.logger.debug("Report files are: {0}".format(report_files))
-            # copy over the report files from the config
-            for item in report_files:
-                output_file = os.path.join(output_dir, os.path.basename(item))
-                self.logger.debug("Copying report file '{0}' to '{1}' ".format(item, output_file))
-                shutil.copy2(item, output_file)
-            # copy over the config file itself as well if present
-            if self.task_configs.get('config_file', None):
-                output_file = os.path.join(output_dir, 'config.yml')
-                self.logger.debug("Copying cofig file '{0}' to '{1}' ".format(self.task_configs['config_file'], output_file))
-                shutil.copy2(self.task_configs['config_file'], output_file)
+            with metrics.timer('report_setup', task = self.taskname):
+                report_files = self.get_report_files()
+                self.logger.debug("Report files are: {0}".format(report_files))
+                # copy over the report files from the config
+                for item in report_files:
+                    output_file = os.path.join(output_dir, os.path.basename(item))
+                    self.logger.debug("Copying report file '{0}' to '{1}' ".format(item, output_file))
+                    shutil.copy2(item, output_file)
+                # copy over the config file itself as well if present
+                if self.task_configs.get('config_file', None):
+                    output_file = os.path.join(output_dir, 'config.yml')
+                    self.logger.debug("Copying cofig file '{0}' to '{1}' ".format(self.task_configs['config_file'], output_file))
+                    shutil.copy2(self.task_configs['config_file'], output_file)
         else:
             self.logger.debug('No report files set for task')
 
@@ -42,18 +42,6 @@ class QsubAnalysisTask(AnalysisTask):
         """
         if not analysis:
             analysis = getattr(self, 'analysis', None)
-        # empty list to hold the qsub jobs
-        jobs = []
         # run the task on the analysis; should return a qsub Job object
-        job = self.main(analysis = analysis, *args, **kwargs)
-        if job:
-            jobs.append(job)
-            self.logger.debug('Submitted jobs: {0}'.format([job.id for job in jobs]))
-
-        if qsub_wait:
-            # montitor the qsub jobs until they are all completed
-            self.logger.debug('Jobs will be monitored for completion and validated')
-            self.job_management.monitor_validate_jobs(jobs = jobs)
-            return(None)
-        else:
-            return(jobs)
+        units = [(None, lambda: self.main(analysis = analysis, *args, **kwargs))]
+        return(self.run_jobs(units = units, qsub_wait = qsub_wait))
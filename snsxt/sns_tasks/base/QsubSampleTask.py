@@ -45,22 +45,5 @@ class QsubSampleTask(SampleTask):
             analysis = getattr(self, 'analysis', None)
 
         # get all the Sample objects for the analysis
-        samples = analysis.get_samples()
-
-        # empty list to hold the qsub jobs
-        jobs = []
-
-        for sample in samples:
-            # run the task on each sample; should return a qsub Job object
-            job = self.main(sample = sample, *args, **kwargs)
-            if job:
-                jobs.append(job)
-        self.logger.debug('Submitted jobs: {0}'.format([job.id for job in jobs]))
-
-        # montitor the qsub jobs until they are all completed
-        if qsub_wait:
-            self.logger.debug('Jobs will be monitored for completion and validated')
-            self.job_management.monitor_validate_jobs(jobs = jobs)
-            return(None)
-        else:
-            return(jobs)
+        samples = self.get_samples(analysis = analysis)
+        return(self.run_jobs(units = self.get_job_units(samples, *args, **kwargs), qsub_wait = qsub_wait))
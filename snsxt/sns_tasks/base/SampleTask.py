@@ -97,7 +97,7 @@ class SampleTask(AnalysisTask):
         suffixes = []
 
         # get all the Sample objects for the analysis
-        samples = analysis.get_samples()
+        samples = self.get_samples(analysis = analysis)
 
         # check if there are output_suffix or output_suffixes set
         if getattr(self, 'output_suffix', None):
@@ -124,6 +124,26 @@ class SampleTask(AnalysisTask):
 
         return(expected_output)
 
+    def get_job_units(self, samples, *args, **kwargs):
+        """
+        Gets the units of work that the ``run()`` methods of the qsub sample tasks submit the jobs of, one per sample; see ``AnalysisTask.run_jobs()``
+
+        Parameters
+        ----------
+        samples: list
+            the Sample objects of the analysis
+        args: list
+            a list of extra positional arguments to pass to ``self.main()``
+        kwargs: dict
+            a dictionary of extra positional arguments to pass to ``self.main()``
+
+        Returns
+        -------
+        list
+            the units, in the format ``[(sampleID, make_jobs)]``
+        """
+        return([(sample.id, lambda sample = sample: self.main(sample = sample, *args, **kwargs)) for sample in samples])
+
     def run(self, analysis = None, *args, **kwargs):
         """
         Runs a task that operates on every sample in the analysis individually
@@ -149,7 +169,7 @@ class SampleTask(AnalysisTask):
         if not analysis:
             analysis = getattr(self, 'analysis', None)
         # get all the Sample objects for the analysis
-        samples = analysis.get_samples()
+        samples = self.get_samples(analysis = analysis)
         for sample in samples:
             self.logger.debug('Running task {0} on sample {1}'.format(self.taskname, sample.id))
             self.main(sample = sample, *args, **kwargs)
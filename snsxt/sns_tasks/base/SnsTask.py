@@ -35,10 +35,6 @@ class SnsTask(AnalysisTask):
             self.analysis_dir = analysis_dir
             self._init_locs()
 
-        if config_file:
-            # get the 'task_configs' from external YAML file, load them in self.task_configs
-            self._task_config_from_file(config_file = config_file) #
-
     def _init_locs(self):
         """
         Initializes directory location attributes for the task
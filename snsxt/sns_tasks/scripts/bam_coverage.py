@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Calculates the coverage of the target regions of a .bam file, and writes it in the format of the ``.sample_interval_summary`` .csv file from GATK DepthOfCoverage
+
+Only the target regions are read from the .bam file, using its index. The depth at each base counts the reads that pass the same filters as DepthOfCoverage: reads that are unmapped, secondary, failing QC, duplicates, or below the minimum mapping quality are skipped, as are bases below the minimum base quality and deletions. The regions are split among several processes.
+
+Columns of the output file, for each target: ``Target``, ``total_coverage``, ``average_coverage``, ``<sampleID>_total_cvg``, ``<sampleID>_mean_cvg``, ``<sampleID>_granular_Q1``, ``<sampleID>_granular_median``, ``<sampleID>_granular_Q3``, and ``<sampleID>_%_above_<threshold>`` for each threshold (the percent of bases with a depth of at least the threshold).
+
+Requires the ``pysam`` and ``numpy`` packages.
+
+Usage
+-----
+Example usage::
+
+    $ bam_coverage.py --bam Sample1.dd.ra.rc.bam --targets targets.bed --sample Sample1 --output Sample1.sample_interval_summary -ct 10 -ct 50 --threads 4
+
+"""
+import os
+import csv
+import argparse
+import multiprocessing
+import numpy as np
+import pysam
+
+
+# ~~~~~ GLOBALS ~~~~~ #
+_bam = None
+_settings = {}
+
+# reads with these flags are skipped: unmapped, secondary, failing QC, duplicate
+skip_flags = 0x4 | 0x100 | 0x200 | 0x400
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def read_targets(targets_file):
+    """
+    Reads the regions from a .bed file
+
+    Returns
+    -------
+    list
+        a list of ``(chrom, start, stop)`` tuples, with 0-based start and exclusive stop coordinates
+    """
+    regions = []
+    with open(targets_file) as f:
+        for line in f:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            parts = line.split('\t')
+            regions.append((parts[0], int(parts[1]), int(parts[2])))
+    return(regions)
+
+def get_target_label(chrom, start, stop):
+    """
+    Gets the label GATK uses for a region, e.g. ``chr1:1001-1100``, in 1-based coordinates
+    """
+    if stop - start == 1:
+        return('{0}:{1}'.format(chrom, stop))
+    return('{0}:{1}-{2}'.format(chrom, start + 1, stop))
+
+def _init_worker(bam_file, settings):
+    """
+    Opens the .bam file once in each worker process
+    """
+    global _bam
+    global _settings
+    _bam = pysam.AlignmentFile(bam_file, 'rb')
+    _settings = settings
+
+def _keep_read(read):
+    return(not read.flag & skip_flags and read.mapping_quality >= _settings['min_mapping_quality'])
+
+def get_depths(region):
+    """
+    Gets the depth at each base of a region
+
+    Returns
+    -------
+    numpy.ndarray
+        the depths
+    """
+    chrom, start, stop = region
+    counts = _bam.count_coverage(chrom, start, stop, quality_threshold = _settings['min_base_quality'], read_callback = _keep_read)
+    return(np.sum(np.array(counts, dtype = np.int64), axis = 0))
+
+def summarize_region(region):
+    """
+    Calculates the coverage stats of a region
+
+    Returns
+    -------
+    list
+        the values for the region's row in the output file
+    """
+    depths = get_depths(region)
+    total = int(depths.sum())
+    mean = float(total) / len(depths) if len(depths) else 0.0
+    # the depths at the quartiles, without interpolation
+    sorted_depths = np.sort(depths)
+    quartiles = [int(sorted_depths[int(q * (len(sorted_depths) - 1))]) if len(sorted_depths) else 0 for q in (0.25, 0.5, 0.75)]
+    above = ['{0:.1f}'.format(100.0 * np.count_nonzero(depths >= threshold) / len(depths) if len(depths) else 0.0) for threshold in _settings['thresholds']]
+    mean = '{0:.2f}'.format(mean)
+    return([get_target_label(*region), total, mean, total, mean] + quartiles + above)
+
+def bam_coverage(bam_file, targets_file, sampleID, output_file, thresholds, min_base_quality = 20, min_mapping_quality = 20, threads = 1):
+    """
+    Calculates the coverage of the target regions of a .bam file, and writes it to a ``.sample_interval_summary`` file
+
+    Parameters
+    ----------
+    bam_file: str
+        path to the indexed .bam file
+    targets_file: str
+        path to the .bed file of target regions
+    sampleID: str
+        the sample ID to use in the column names
+    output_file: str
+        path to the output .csv file
+    thresholds: list
+        the depths to report the percent of bases at or above
+    min_base_quality: int
+        bases below this quality are not counted
+    min_mapping_quality: int
+        reads below this mapping quality are not counted
+    threads: int
+        number of processes to split the regions among
+    """
+    regions = read_targets(targets_file)
+    settings = {'thresholds': thresholds, 'min_base_quality': min_base_quality, 'min_mapping_quality': min_mapping_quality}
+    header = ['Target', 'total_coverage', 'average_coverage'] + ['{0}_{1}'.format(sampleID, name) for name in ['total_cvg', 'mean_cvg', 'granular_Q1', 'granular_median', 'granular_Q3']]
+    header += ['{0}_%_above_{1}'.format(sampleID, threshold) for threshold in thresholds]
+
+    if threads > 1:
+        pool = multiprocessing.Pool(processes = threads, initializer = _init_worker, initargs = (bam_file, settings))
+        try:
+            # results come back in the order of the regions
+            rows = pool.map(summarize_region, regions, chunksize = max(1, len(regions) // (threads * 8)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_worker(bam_file, settings)
+        rows = [summarize_region(region) for region in regions]
+
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        writer = csv.writer(f, lineterminator = '\n')
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+    # rename when complete, so a partial file is never validated
+    os.rename(tmp_file, output_file)
+
+def main():
+    """
+    Main control function for the program
+    """
+    parser = argparse.ArgumentParser(description = 'Calculate the coverage of target regions of a .bam file, in the GATK DepthOfCoverage .sample_interval_summary format')
+    parser.add_argument('--bam', dest = 'bam_file', required = True, help = 'Indexed .bam file')
+    parser.add_argument('--targets', dest = 'targets_file', required = True, help = '.bed file of target regions')
+    parser.add_argument('--sample', dest = 'sampleID', required = True, help = 'Sample ID to use in the column names')
+    parser.add_argument('--output', dest = 'output_file', required = True, help = 'Output .csv file')
+    parser.add_argument('-ct', dest = 'thresholds', type = int, action = 'append', default = [], help = 'Depth to report the percent of bases at or above; can be given many times')
+    parser.add_argument('-mbq', '--minBaseQuality', dest = 'min_base_quality', type = int, default = 20, help = 'Minimum base quality')
+    parser.add_argument('-mmq', '--minMappingQuality', dest = 'min_mapping_quality', type = int, default = 20, help = 'Minimum read mapping quality')
+    parser.add_argument('--threads', dest = 'threads', type = int, default = 1, help = 'Number of processes to use')
+    args = parser.parse_args()
+    bam_coverage(**vars(args))
+
+if __name__ == "__main__":
+    main()
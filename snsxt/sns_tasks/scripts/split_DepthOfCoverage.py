@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Splits the .csv output of a GATK DepthOfCoverage run on several samples into the files that a run on each sample alone would make, named ``<output_dir>/<sampleID>.<suffix>``
+
+Assumes the read group sample name (``SM``) of each sample's .bam file is its sample ID.
+
+- ``.sample_summary``: the sample's row, and a ``Total`` row with the sample's total and mean coverage
+- ``.sample_statistics``, ``.sample_cumulative_coverage_counts``, ``.sample_cumulative_coverage_proportions``: the sample's ``sample_<sampleID>`` row
+- ``.sample_interval_summary``: the ``Target`` column, the sample's columns, and the ``total_coverage`` and ``average_coverage`` columns set to the sample's
+- ``.sample_interval_statistics``: this table counts the intervals over each depth in at least N of the samples, so it can not be split; it is recomputed for the sample from the average coverage of each interval in the sample's interval summary
+
+Usage
+-----
+Example usage::
+
+    $ split_DepthOfCoverage.py --prefix QC-Coverage-Custom/batches/batch1 --output-dir QC-Coverage-Custom Sample1 Sample2 Sample3
+
+"""
+import os
+import re
+import csv
+import sys
+import argparse
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def read_csv(path):
+    """
+    Reads a .csv file into a header list and a list of row lists
+    """
+    with open(path) as f:
+        rows = [row for row in csv.reader(f)]
+    return((rows[0], rows[1:]))
+
+def write_csv(path, header, rows):
+    """
+    Writes a .csv file under a temporary name, then renames it, so a partial file is never seen
+    """
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        writer = csv.writer(f, lineterminator = '\n')
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+    os.rename(tmp_file, path)
+
+def get_row(rows, name, path):
+    """
+    Gets the row with the given name in the first column
+    """
+    for row in rows:
+        if row[0] == name:
+            return(row)
+    raise ValueError('No row for {0} in file: {1}'.format(name, path))
+
+def split_sample_summary(prefix, sampleIDs, output_dir):
+    path = prefix + '.sample_summary'
+    header, rows = read_csv(path)
+    for sampleID in sampleIDs:
+        row = get_row(rows, sampleID, path)
+        total = ['Total'] + row[1:3] + ['N/A'] * (len(header) - 3)
+        write_csv(os.path.join(output_dir, sampleID + '.sample_summary'), header, [row, total])
+
+def split_source_rows(prefix, suffix, sampleIDs, output_dir):
+    path = prefix + suffix
+    header, rows = read_csv(path)
+    for sampleID in sampleIDs:
+        row = get_row(rows, 'sample_' + sampleID, path)
+        write_csv(os.path.join(output_dir, sampleID + suffix), header, [row])
+
+def split_interval_summary(prefix, sampleIDs, output_dir):
+    """
+    Splits the interval summary; each sample has a block of columns starting with ``<sampleID>_total_cvg``
+
+    Returns
+    -------
+    dict
+        the average coverage of each interval, per sample
+    """
+    path = prefix + '.sample_interval_summary'
+    header, rows = read_csv(path)
+    # the sample blocks, found by their first column
+    starts = [i for i, name in enumerate(header) if name.endswith('_total_cvg')]
+    blocks = {}
+    for start, end in zip(starts, starts[1:] + [len(header)]):
+        blocks[header[start][:-len('_total_cvg')]] = (start, end)
+    mean_coverages = {}
+    for sampleID in sampleIDs:
+        if sampleID not in blocks:
+            raise ValueError('No columns for {0} in file: {1}'.format(sampleID, path))
+        start, end = blocks[sampleID]
+        sample_rows = [[row[0], row[start], row[start + 1]] + row[start:end] for row in rows]
+        write_csv(os.path.join(output_dir, sampleID + '.sample_interval_summary'), header[0:3] + header[start:end], sample_rows)
+        mean_coverages[sampleID] = [float(row[start + 1]) for row in rows]
+    return(mean_coverages)
+
+def make_interval_statistics(prefix, mean_coverages, output_dir):
+    path = prefix + '.sample_interval_statistics'
+    header, rows = read_csv(path)
+    # the depth of each column, e.g. 'depth>=10'
+    depths = [float(re.search(r'[0-9.]+', name).group(0)) for name in header[1:]]
+    for sampleID, coverages in mean_coverages.items():
+        counts = [len([coverage for coverage in coverages if coverage >= depth]) for depth in depths]
+        write_csv(os.path.join(output_dir, sampleID + '.sample_interval_statistics'), header, [['At_least_1_samples'] + counts])
+
+def split_depth_of_coverage(prefix, sampleIDs, output_dir):
+    """
+    Splits the output of a multi-sample DepthOfCoverage run into per-sample files
+
+    Parameters
+    ----------
+    prefix: str
+        the ``--out`` prefix of the DepthOfCoverage run
+    sampleIDs: list
+        the IDs of the samples in the run
+    output_dir: str
+        the directory to write the per-sample files to
+    """
+    split_sample_summary(prefix, sampleIDs, output_dir)
+    for suffix in ['.sample_statistics', '.sample_cumulative_coverage_counts', '.sample_cumulative_coverage_proportions']:
+        split_source_rows(prefix, suffix, sampleIDs, output_dir)
+    mean_coverages = split_interval_summary(prefix, sampleIDs, output_dir)
+    make_interval_statistics(prefix, mean_coverages, output_dir)
+
+def main():
+    """
+    Main control function for the program
+    """
+    parser = argparse.ArgumentParser(description = 'Split multi-sample GATK DepthOfCoverage output into per-sample files')
+    parser.add_argument('sampleIDs', nargs = '+', help = 'IDs of the samples in the DepthOfCoverage run')
+    parser.add_argument('--prefix', dest = 'prefix', required = True, help = 'The --out prefix of the DepthOfCoverage run')
+    parser.add_argument('--output-dir', dest = 'output_dir', required = True, help = 'Directory to write the per-sample files to')
+    args = parser.parse_args()
+    split_depth_of_coverage(prefix = args.prefix, sampleIDs = args.sampleIDs, output_dir = args.output_dir)
+
+if __name__ == "__main__":
+    main()
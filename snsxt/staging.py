@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Runs a qsub job's command on node-local scratch space instead of the shared filesystem
+
+Tasks like ``GATKDepthOfCoverageCustom``, ``Delly2``, and ``MuTect2Split`` read their .bam files straight from the shared filesystem, and dozens of their jobs running at once saturate it. For tasks with staging enabled, the job's command is wrapped to run through this script on the compute node, which:
+
+- copies each input file on the shared filesystem (with its index files, e.g. .bai, .fai, .dict) into a cache on the node's local disk; files already in the cache from an earlier job on the same node are reused, and the least recently used files are removed when the cache is over its size limit
+- rewrites the input and output paths in the command to the local copies and a local work directory, and runs it there
+- if the command succeeds, copies the output files back to their directories, under a temporary name first and then renamed into place, so a partial output file is never seen
+- appends the number of bytes staged, cache hits, and cache misses to a stats file; see ``summarize()``
+
+Examples
+--------
+Example usage::
+
+    $ snsxt/staging.py --input /ifs/data/Sample1.dd.ra.rc.bam --output /ifs/data/QC-Coverage-Custom/Sample1 --stats-file snsxt_staging.tsv -- 'java -jar GenomeAnalysisTK.jar -T DepthOfCoverage --input_file /ifs/data/Sample1.dd.ra.rc.bam --out /ifs/data/QC-Coverage-Custom/Sample1'
+
+    $ snsxt/staging.py --report snsxt_staging.tsv
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import sys
+import time
+import glob
+import fcntl
+import shutil
+import socket
+import getpass
+import hashlib
+import tempfile
+import argparse
+import subprocess
+import collections
+
+# ~~~~~ GLOBALS ~~~~~ #
+companion_extensions = {
+'.bam': ['.bam.bai', '.bai'],
+'.fa': ['.fa.fai', '.dict'],
+'.fasta': ['.fasta.fai', '.dict'],
+'.vcf': ['.vcf.idx'],
+'.gz': ['.gz.tbi']
+}
+"""
+Index files that are staged along with an input file, by the input file's extension; each entry replaces the extension of the input file's path
+"""
+
+stats_fields = ['timestamp', 'host', 'job_id', 'task', 'exit_code', 'bytes_staged', 'cache_hits', 'cache_misses', 'bytes_written', 'wall_time']
+"""
+Columns of the staging stats file
+"""
+
+default_cache_parent_dir = '/tmp'
+"""
+Local directory that the default cache dir is made in; SGE removes the per-job ``$TMPDIR`` when the job ends, so the cache is not kept there
+"""
+
+_stamp_filename = '.source'
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def get_companion_files(path):
+    """
+    Gets the index files of an input file which exist, e.g. the .bai file of a .bam file
+
+    Parameters
+    ----------
+    path: str
+        path to the input file
+
+    Returns
+    -------
+    list
+        the paths to the index files
+    """
+    base, ext = os.path.splitext(path)
+    companions = []
+    for companion_ext in companion_extensions.get(ext, []):
+        companion = base + companion_ext
+        if os.path.exists(companion):
+            companions.append(companion)
+    return(companions)
+
+def get_default_cache_dir():
+    """
+    Gets the default directory for the cache on the node's local disk, ``/tmp/snsxt_cache-<user>``, which is kept between jobs
+    """
+    return(os.path.join(default_cache_parent_dir, 'snsxt_cache-{0}'.format(getpass.getuser())))
+
+def is_shared(path, shared_prefixes):
+    """
+    Checks whether a path is on the shared filesystem
+    """
+    path = os.path.abspath(path)
+    return(any(path == prefix or path.startswith(prefix.rstrip('/') + '/') for prefix in shared_prefixes))
+
+def _copy(source, destination):
+    """
+    Copies a file under a temporary name, then renames it to the destination, so the destination is never a partial file
+
+    Returns
+    -------
+    int
+        the number of bytes copied
+    """
+    tmp_file = '{0}.tmp.{1}.{2}'.format(destination, socket.gethostname(), os.getpid())
+    shutil.copyfile(source, tmp_file)
+    os.rename(tmp_file, destination)
+    return(os.path.getsize(destination))
+
+def summarize(stats_file):
+    """
+    Summarizes the staging stats of the jobs, per task
+
+    Parameters
+    ----------
+    stats_file: str
+        path to the stats file written by the jobs
+
+    Returns
+    -------
+    list
+        a list of dictionaries with the ``task``, number of ``jobs``, ``bytes_staged``, ``cache_hits``, ``cache_misses``, ``hit_rate``, and ``bytes_written``
+    """
+    groups = collections.OrderedDict()
+    if not os.path.exists(stats_file):
+        return([])
+    with open(stats_file) as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != len(stats_fields) or parts[0] == stats_fields[0]:
+                continue
+            row = dict(zip(stats_fields, parts))
+            group = groups.setdefault(row['task'], {'task': row['task'], 'jobs': 0, 'bytes_staged': 0, 'cache_hits': 0, 'cache_misses': 0, 'bytes_written': 0})
+            group['jobs'] += 1
+            for key in ['bytes_staged', 'cache_hits', 'cache_misses', 'bytes_written']:
+                group[key] += int(row[key])
+    for group in groups.values():
+        lookups = group['cache_hits'] + group['cache_misses']
+        group['hit_rate'] = float(group['cache_hits']) / lookups if lookups else 0.0
+    return(list(groups.values()))
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class StageCache(object):
+    """
+    A cache of input files on the node's local disk, shared by all of the jobs that run on the node. Each input file is kept in its own subdirectory along with its index files, and is copied again if the original file changes. Jobs lock the subdirectories they use, so files are not removed while a job is using them.
+    """
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Parameters
+        ----------
+        cache_dir: str
+            the directory for the cache on the local disk
+        max_bytes: int
+            the size above which the least recently used files are removed from the cache
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.bytes_staged = 0
+        self.hits = 0
+        self.misses = 0
+        self._locks = []
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # made by another job at the same time
+                if not os.path.isdir(cache_dir):
+                    raise
+
+    def _entry_dir(self, path):
+        return(os.path.join(self.cache_dir, hashlib.md5(os.path.abspath(path).encode('utf-8')).hexdigest()))
+
+    def stage(self, path):
+        """
+        Gets a local copy of a file and its index files, copying them into the cache if they are not there or have changed. The entry is locked until ``release()`` is called.
+
+        Parameters
+        ----------
+        path: str
+            path to the file on the shared filesystem
+
+        Returns
+        -------
+        str
+            the path to the local copy
+        """
+        entry_dir = self._entry_dir(path)
+        if not os.path.isdir(entry_dir):
+            try:
+                os.makedirs(entry_dir)
+            except OSError:
+                if not os.path.isdir(entry_dir):
+                    raise
+        lock = open(os.path.join(entry_dir, '.lock'), 'a')
+        # exclusive while copying, then shared while the job uses the files
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            stats = os.stat(path)
+            source = '{0}\t{1}\t{2:.0f}'.format(os.path.abspath(path), stats.st_size, stats.st_mtime)
+            stamp_file = os.path.join(entry_dir, _stamp_filename)
+            current = None
+            if os.path.exists(stamp_file):
+                with open(stamp_file) as f:
+                    current = f.read()
+            if current == source:
+                self.hits += 1
+            else:
+                self.misses += 1
+                for item in [path] + get_companion_files(path):
+                    self.bytes_staged += _copy(item, os.path.join(entry_dir, os.path.basename(item)))
+                with open(stamp_file, 'w') as f:
+                    f.write(source)
+            # mark the entry as recently used
+            os.utime(stamp_file, None)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+        self._locks.append(lock)
+        return(os.path.join(entry_dir, os.path.basename(path)))
+
+    def release(self):
+        """
+        Unlocks the entries used by this job
+        """
+        for lock in self._locks:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+        self._locks = []
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is under its size limit; entries used by a running job are skipped
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            stamp_file = os.path.join(entry_dir, _stamp_filename)
+            if not os.path.exists(stamp_file):
+                continue
+            size = sum([os.path.getsize(os.path.join(entry_dir, item)) for item in os.listdir(entry_dir)])
+            entries.append((os.path.getmtime(stamp_file), size, entry_dir))
+            total += size
+        for last_used, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with open(os.path.join(entry_dir, '.lock'), 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    continue
+                # remove the stamp first, so a partly removed entry is copied again when it is next used
+                os.remove(os.path.join(entry_dir, _stamp_filename))
+                for item in os.listdir(entry_dir):
+                    if item != '.lock':
+                        os.remove(os.path.join(entry_dir, item))
+            total -= size
+            logger.debug('Removed from the staging cache: {0}'.format(entry_dir))
+
+
+def run_staged(command, inputs, outputs, cache_dir, max_bytes, shared_prefixes = ('/ifs',), stats_file = None, task = ''):
+    """
+    Runs a command with its inputs staged to the local disk, and copies its outputs back
+
+    Parameters
+    ----------
+    command: str
+        the shell command
+    inputs: list
+        paths to the input files of the command; only the ones on the shared filesystem are staged
+    outputs: list
+        paths to the output files of the command, or output prefixes; every file written to the work directory that starts with an output's name is copied back to the output's directory
+    cache_dir: str
+        the directory for the cache on the local disk
+    max_bytes: int
+        the size limit of the cache
+    shared_prefixes: list
+        the paths of the shared filesystem
+    stats_file: str
+        path to the file to append the staging stats to
+    task: str
+        the name of the analysis task, for the stats
+
+    Returns
+    -------
+    int
+        the exit code of the command
+    """
+    start = time.time()
+    cache = StageCache(cache_dir = cache_dir, max_bytes = max_bytes)
+    work_dir = tempfile.mkdtemp(prefix = 'snsxt_work.', dir = os.path.dirname(os.path.abspath(cache_dir)))
+    bytes_written = 0
+    # stays empty in the stats if staging fails before the command runs
+    exit_code = None
+    try:
+        # rewrite the longest paths first, so a path is not rewritten inside a longer one
+        for path in sorted(set(inputs), key = len, reverse = True):
+            if is_shared(path, shared_prefixes) and os.path.isfile(path):
+                command = command.replace(path, cache.stage(path))
+        for path in sorted(set(outputs), key = len, reverse = True):
+            command = command.replace(path, os.path.join(work_dir, os.path.basename(path)))
+        cache.evict()
+
+        exit_code = subprocess.call(command, shell = True, executable = '/bin/bash')
+
+        if exit_code == 0:
+            copied = set()
+            for path in outputs:
+                for item in glob.glob(os.path.join(work_dir, os.path.basename(path)) + '*'):
+                    if item in copied or not os.path.isfile(item):
+                        continue
+                    bytes_written += _copy(item, os.path.join(os.path.dirname(path), os.path.basename(item)))
+                    copied.add(item)
+    finally:
+        cache.release()
+        shutil.rmtree(work_dir, ignore_errors = True)
+        if stats_file:
+            values = [time.time(), socket.gethostname(), os.environ.get('JOB_ID', ''), task, '' if exit_code is None else exit_code,
+                    cache.bytes_staged, cache.hits, cache.misses, bytes_written, '{0:.1f}'.format(time.time() - start)]
+            with open(stats_file, 'a') as f:
+                f.write('\t'.join([str(value) for value in values]) + '\n')
+    return(exit_code)
+
+def parse():
+    """
+    Parses the script args
+    """
+    parser = argparse.ArgumentParser(description = 'Run a command with its input files staged to node-local disk')
+    parser.add_argument('-i', '--input', dest = 'inputs', action = 'append', default = [], help = 'Input file of the command; can be given many times')
+    parser.add_argument('-o', '--output', dest = 'outputs', action = 'append', default = [], help = 'Output file or output prefix of the command; can be given many times')
+    parser.add_argument('--cache-dir', dest = 'cache_dir', default = None, help = 'Directory for the cache of input files on the local disk; defaults to /tmp/snsxt_cache-<user>, since $TMPDIR is removed when the job ends')
+    parser.add_argument('--cache-size', dest = 'cache_size', type = float, default = 100, help = 'Size limit of the cache, in GB')
+    parser.add_argument('--shared-prefix', dest = 'shared_prefixes', action = 'append', default = None, help = 'Path of the shared filesystem; only inputs under it are staged. Defaults to /ifs')
+    parser.add_argument('--stats-file', dest = 'stats_file', default = None, help = 'File to append the staging stats to')
+    parser.add_argument('--task', dest = 'task', default = '', help = 'Name of the analysis task, for the stats')
+    parser.add_argument('--report', dest = 'report', default = None, metavar = 'STATS_FILE', help = 'Print a summary of a stats file and exit')
+    parser.add_argument('command', nargs = '?', default = None, help = 'The shell command to run')
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, stream = sys.stderr, format = '%(message)s')
+
+    if args.report:
+        for row in summarize(args.report):
+            print('{task}\t{jobs} jobs\t{bytes_staged} bytes staged\t{cache_hits} cache hits\t{cache_misses} cache misses\thit rate {hit_rate:.2f}'.format(**row))
+        return()
+
+    cache_dir = args.cache_dir or get_default_cache_dir()
+    exit_code = run_staged(command = args.command, inputs = args.inputs, outputs = args.outputs,
+                            cache_dir = cache_dir, max_bytes = int(args.cache_size * 1024 ** 3),
+                            shared_prefixes = args.shared_prefixes or ['/ifs'], stats_file = args.stats_file, task = args.task)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    parse()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Records the time spent in the program's startup phases and module imports
+
+This module must only import from the Python standard library, since it is imported before anything else in order to time the other imports.
+
+Examples
+--------
+Example usage::
+
+    import startup_profile
+    if startup_profile.is_requested():
+        startup_profile.install_import_hook()
+
+    with startup_profile.phase('config_load'):
+        import config
+
+    startup_profile.remove_import_hook()
+    startup_profile.write_profile(output_file = 'startup.json')
+
+"""
+import os
+import sys
+import time
+import json
+import socket
+import collections
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+# ~~~~~ GLOBALS ~~~~~ #
+start_time = time.time()
+"""
+Time at which this module was first imported; used as the start of the program
+"""
+
+phases = collections.OrderedDict()
+"""
+Wall time in seconds spent in each named startup phase, in the order the phases were run
+"""
+
+imports = collections.OrderedDict()
+"""
+Wall time in seconds spent on the first import of each module, including the imports it triggered
+"""
+
+cli_flag = '--profile-startup'
+"""
+Command line option of the scripts that turns on startup profiling; the import hook is only installed when it is passed
+"""
+
+_original_import = builtins.__import__
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class phase(object):
+    """
+    Context manager that adds the time spent inside it to the named phase, in the program's ``phases`` or in the ``record`` dict passed
+
+    Examples
+    --------
+    Example usage::
+
+        with startup_profile.phase('logging_setup'):
+            logger = log.log_setup(config_yaml = config_yaml, logger_name = "run")
+
+    """
+    def __init__(self, name, record = None):
+        self.name = name
+        if record is None:
+            record = phases
+        self.record = record
+
+    def __enter__(self):
+        self.start = time.time()
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self.start
+        self.record[self.name] = self.record.get(self.name, 0.0) + elapsed
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def _timed_import(name, *args, **kwargs):
+    """
+    Replacement for the builtin ``__import__`` which records the time taken by the first import of each module
+    """
+    if name in sys.modules or name in imports:
+        return(_original_import(name, *args, **kwargs))
+    start = time.time()
+    try:
+        return(_original_import(name, *args, **kwargs))
+    finally:
+        imports[name] = time.time() - start
+
+def is_requested(argv = None):
+    """
+    Checks whether startup profiling was requested on the command line, before the args are parsed; the timed imports add overhead, so the import hook should only be installed when this is ``True``
+
+    Parameters
+    ----------
+    argv: list
+        the command line args; defaults to ``sys.argv``
+
+    Returns
+    -------
+    bool
+        whether the ``cli_flag`` is in the args, alone or as ``--profile-startup=<file>``
+    """
+    if argv is None:
+        argv = sys.argv
+    return(any(arg.split('=', 1)[0] == cli_flag for arg in argv[1:]))
+
+def install_import_hook():
+    """
+    Starts recording the time taken by module imports
+    """
+    builtins.__import__ = _timed_import
+
+def remove_import_hook():
+    """
+    Stops recording the time taken by module imports
+    """
+    builtins.__import__ = _original_import
+
+def get_profile(**kwargs):
+    """
+    Gets the timings recorded so far
+
+    Parameters
+    ----------
+    kwargs: dict
+        extra items to include in the profile
+
+    Returns
+    -------
+    dict
+        a dictionary with the total elapsed time, the per-phase and per-import timings, and details about the host the program ran on
+    """
+    profile = collections.OrderedDict()
+    profile['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))
+    profile['hostname'] = socket.gethostname()
+    profile['python'] = sys.version.split()[0]
+    profile['argv'] = sys.argv
+    profile['total'] = time.time() - start_time
+    profile['phases'] = phases
+    profile['imports'] = imports
+    profile.update(kwargs)
+    return(profile)
+
+def write_profile(output_file, **kwargs):
+    """
+    Writes the timings recorded so far to a JSON file
+
+    Parameters
+    ----------
+    output_file: str
+        path to the JSON file to write
+    kwargs: dict
+        extra items to include in the profile
+
+    Returns
+    -------
+    str
+        the path to the JSON file
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    with open(output_file, "w") as f:
+        json.dump(get_profile(**kwargs), f, indent = 4)
+    return(output_file)
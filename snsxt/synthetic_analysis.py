@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generates synthetic ``sns`` analysis output directories, for benchmarking the program without a real sequencing run
+
+The directory has the layout of an ``sns wes`` analysis: the samples sheet, pairs sheet, targets and probes .bed files, and settings in the top level, and a subdirectory for every analysis step listed in the ``analysis_output_index`` of ``config/sns-wes.yml`` holding a placeholder file for every sample and file type of the step (e.g. ``BAM-GATK-RA-RC/Sample1.dd.ra.rc.bam``). Placeholder files are empty, or sparse files of the given size, so trees of thousands of samples only take a few MB of disk space.
+
+``SyntheticAnalysis`` stands in for the ``SnsWESAnalysisOutput`` object from ``sns_classes`` for a generated directory, with the attributes and methods that the tasks use.
+
+Examples
+--------
+Example usage::
+
+    import synthetic_analysis
+    analysis_dir = synthetic_analysis.make_analysis_dir(output_dir = '/tmp/analysis', num_samples = 100, num_targets = 5000)
+    analysis = synthetic_analysis.SyntheticAnalysis(analysis_dir = analysis_dir)
+    run_tasks.run_tasks(tasks = {'Delly2': None}, analysis = analysis)
+
+"""
+# ~~~~~ LOGGING ~~~~~~ #
+import logging
+logger = logging.getLogger(__name__)
+
+# ~~~~~ LOAD MORE PACKAGES ~~~~~ #
+import os
+import csv
+import glob
+import random
+import collections
+import config
+import catalogue
+
+# ~~~~~ GLOBALS ~~~~~ #
+chromosome_target_bases = collections.OrderedDict([
+('chr1', 5200000), ('chr2', 3500000), ('chr3', 2900000), ('chr4', 2000000), ('chr5', 2300000), ('chr6', 2500000),
+('chr7', 2400000), ('chr8', 1800000), ('chr9', 2100000), ('chr10', 2100000), ('chr11', 2900000), ('chr12', 2600000),
+('chr13', 900000), ('chr14', 1500000), ('chr15', 1600000), ('chr16', 2100000), ('chr17', 2800000), ('chr18', 800000),
+('chr19', 3000000), ('chr20', 1200000), ('chr21', 500000), ('chr22', 1100000), ('chrX', 1600000), ('chrY', 100000)
+])
+"""
+Approximate bases of exome capture targets on each chromosome (hg19), which the target regions are spread over in proportion to; gene dense chromosomes such as chr1, chr17, and chr19 have many more targets than chr13, chr18, or chrY
+"""
+
+chromosomes = list(chromosome_target_bases.keys())
+"""
+Chromosomes that the target regions are spread over
+"""
+
+sample_prefix = 'Sample'
+"""
+Prefix of the generated sample IDs, which are numbered from 1
+"""
+
+skip_steps = ['_parent', 'sns', 'summary', 'logs-qsub']
+"""
+Items of the ``analysis_output_index`` that do not hold a file per sample and file type
+"""
+
+
+# ~~~~~ FUNCTIONS ~~~~~ #
+def get_step_file_types(config_file = None):
+    """
+    Gets the file types of each analysis step from the ``analysis_output_index`` of an ``sns`` config file
+
+    Parameters
+    ----------
+    config_file: str
+        path to the YAML file; defaults to ``sns-wes.yml`` in the ``config`` dir
+
+    Returns
+    -------
+    dict
+        the file suffixes of each analysis step, in the format ``{analysis_step: [suffixes]}``
+    """
+    if not config_file:
+        config_file = os.path.join(config.scriptdir, 'sns-wes.yml')
+    index = config.load_yaml(config_file)['analysis_output_index']
+    step_file_types = {}
+    for step, items in index.items():
+        if step in skip_steps:
+            continue
+        step_file_types[step] = list((items or {}).get('file_types', []))
+    return(step_file_types)
+
+def get_sampleIDs(num_samples):
+    """
+    Gets the IDs of the synthetic samples, e.g. ``['Sample1', 'Sample2']``
+    """
+    return(['{0}{1}'.format(sample_prefix, i) for i in range(1, num_samples + 1)])
+
+def make_placeholder(path, size = 0):
+    """
+    Creates a placeholder file; files with a size are made sparse, so they do not take up disk space
+    """
+    with open(path, 'w') as f:
+        if size:
+            f.truncate(size)
+
+def get_targets_per_chromosome(num_targets):
+    """
+    Splits a number of target regions among the ``chromosomes`` in proportion to their ``chromosome_target_bases``
+
+    Returns
+    -------
+    collections.OrderedDict
+        the number of targets on each chromosome, in the format ``{chrom: num_targets}``
+    """
+    total_bases = float(sum(chromosome_target_bases.values()))
+    exact = [num_targets * chromosome_target_bases[chrom] / total_bases for chrom in chromosomes]
+    counts = [int(value) for value in exact]
+    # the targets left over from rounding down go to the chromosomes with the largest remainders
+    by_remainder = sorted(range(len(chromosomes)), key = lambda i: (counts[i] - exact[i], i))
+    for i in by_remainder[:num_targets - sum(counts)]:
+        counts[i] += 1
+    return(collections.OrderedDict(zip(chromosomes, counts)))
+
+def write_targets_bed(path, num_targets, seed = 0):
+    """
+    Writes a .bed file of target regions of 50 - 500bp, spread over the ``chromosomes`` in proportion to their ``chromosome_target_bases`` and sorted by position
+    """
+    rand = random.Random(seed)
+    written = 0
+    with open(path, 'w') as f:
+        for chrom, per_chrom in get_targets_per_chromosome(num_targets).items():
+            start = 10000
+            for j in range(per_chrom):
+                start += rand.randint(1000, 50000)
+                stop = start + rand.randint(50, 500)
+                f.write('{0}\t{1}\t{2}\ttarget_{3}\t0\t+\n'.format(chrom, start, stop, written + 1))
+                start = stop
+                written += 1
+    return(path)
+
+def write_pairs_sheet(path, sampleIDs, pair_fraction = 0.5):
+    """
+    Writes a ``samples.pairs.csv`` sheet. The first ``pair_fraction`` of the samples are paired in order as tumor and normal (``Sample1`` with ``Sample2``, ...); the others are listed with an ``NA`` normal.
+    """
+    num_paired = int(len(sampleIDs) * pair_fraction) // 2 * 2
+    with open(path, 'w') as f:
+        writer = csv.writer(f, lineterminator = '\n')
+        writer.writerow(['#SAMPLE-T', '#SAMPLE-N'])
+        for i in range(0, num_paired, 2):
+            writer.writerow([sampleIDs[i], sampleIDs[i + 1]])
+        for sampleID in sampleIDs[num_paired:]:
+            writer.writerow([sampleID, 'NA'])
+    return(path)
+
+def write_samples_sheet(path, sampleIDs, fastq_dir, lanes = 4):
+    """
+    Writes a ``samples.fastq-raw.csv`` sheet, with a row for the R1 and R2 .fastq files of each lane of each sample
+    """
+    with open(path, 'w') as f:
+        writer = csv.writer(f, lineterminator = '\n')
+        for sampleID in sampleIDs:
+            for lane in range(1, lanes + 1):
+                fastq = os.path.join(fastq_dir, '{0}_S1_L{1:03d}_R{{0}}_001.fastq.gz'.format(sampleID, lane))
+                writer.writerow([sampleID, fastq.format(1), fastq.format(2)])
+    return(path)
+
+def make_analysis_dir(output_dir, num_samples = 10, num_targets = 1000, pair_fraction = 0.5, placeholder_size = 0, step_file_types = None, seed = 0):
+    """
+    Generates a synthetic ``sns wes`` analysis output directory
+
+    Parameters
+    ----------
+    output_dir: str
+        path to the directory to create; must not exist yet
+    num_samples: int
+        number of samples in the analysis
+    num_targets: int
+        number of regions in the targets and probes .bed files
+    pair_fraction: float
+        fraction of the samples that are in a tumor-normal pair in the pairs sheet
+    placeholder_size: int
+        size in bytes of each placeholder file
+    step_file_types: dict
+        the file suffixes of each analysis step; defaults to the ones in ``sns-wes.yml``, see ``get_step_file_types()``
+    seed: int
+        seed for the random target regions, so that the same args make the same directory
+
+    Returns
+    -------
+    str
+        the path to the analysis directory
+    """
+    if os.path.exists(output_dir):
+        raise ValueError('Output directory already exists: {0}'.format(output_dir))
+    if step_file_types is None:
+        step_file_types = get_step_file_types()
+    logger.debug('Generating synthetic analysis with {0} samples in: {1}'.format(num_samples, output_dir))
+    sampleIDs = get_sampleIDs(num_samples)
+    os.makedirs(output_dir)
+
+    write_samples_sheet(path = os.path.join(output_dir, catalogue.static_files['samples_fastq_raw']), sampleIDs = sampleIDs, fastq_dir = os.path.join(output_dir, 'fastq'))
+    write_pairs_sheet(path = os.path.join(output_dir, catalogue.static_files['paired_samples']), sampleIDs = sampleIDs, pair_fraction = pair_fraction)
+    write_targets_bed(path = os.path.join(output_dir, catalogue.static_files['targets_bed']), num_targets = num_targets, seed = seed)
+    write_targets_bed(path = os.path.join(output_dir, catalogue.static_files['probes_bed']), num_targets = num_targets, seed = seed)
+    with open(os.path.join(output_dir, catalogue.static_files['settings']), 'w') as f:
+        f.write('GENOME-DIR|/ref/hg19\nREF-FASTA|/ref/hg19/genome.fa\n')
+    with open(os.path.join(output_dir, catalogue.static_files['summary_combined']), 'w') as f:
+        f.write('#SAMPLE\n' + '\n'.join(sampleIDs) + '\n')
+
+    for step, file_types in step_file_types.items():
+        step_dir = os.path.join(output_dir, step)
+        os.makedirs(step_dir)
+        for sampleID in sampleIDs:
+            for file_type in file_types:
+                make_placeholder(path = os.path.join(step_dir, sampleID + file_type), size = placeholder_size)
+
+    # the qsub logs of the sns pipeline's jobs
+    qsub_log_dir = os.path.join(output_dir, 'logs-qsub')
+    os.makedirs(qsub_log_dir)
+    for i, sampleID in enumerate(sampleIDs):
+        for log_type in ['o', 'po']:
+            make_placeholder(path = os.path.join(qsub_log_dir, 'sns.wes.{0}.{1}{2}'.format(sampleID, log_type, 1000000 + i)))
+    return(output_dir)
+
+
+# ~~~~~ CLASSES ~~~~~ #
+class SyntheticSample(object):
+    """
+    A sample in a synthetic analysis, with the same attributes and methods that the tasks use from the ``sns_classes`` sample objects
+    """
+    def __init__(self, id, analysis):
+        self.id = id
+        self.analysis = analysis
+        self.analysis_config = analysis.analysis_config
+        self.static_files = analysis.static_files
+
+    def __repr__(self):
+        return(self.id)
+
+    def list_none(self, items):
+        return(self.analysis.list_none(items))
+
+    def get_output_files(self, analysis_step, pattern):
+        """
+        Gets the sample's files in an analysis step that match a pattern
+        """
+        paths = glob.glob(os.path.join(self.analysis.dir, analysis_step, pattern))
+        return(sorted([path for path in paths if os.path.basename(path).startswith(self.id + '.')]))
+
+    def get_files(self, name):
+        """
+        Gets a file shared by the samples of the analysis, e.g. ``'targets_bed'``
+        """
+        if name not in catalogue.static_files:
+            return([])
+        return([path for path in [os.path.join(self.analysis.dir, catalogue.static_files[name])] if os.path.exists(path)])
+
+
+class SyntheticAnalysis(object):
+    """
+    Stands in for the ``SnsWESAnalysisOutput`` object of an analysis made with ``make_analysis_dir()``
+
+    Attributes
+    ----------
+    dir: str
+        path to the analysis directory
+    analysis_config: dict
+        the paths of the analysis's directories, in the format ``{'dirs': {analysis_step: [path]}}``
+    static_files: dict
+        the paths to the files in the top level of the analysis directory, by the names used for them in ``sample.get_files()``
+    """
+    def __init__(self, analysis_dir, analysis_id = 'synthetic_analysis', results_id = 'results'):
+        self.dir = os.path.abspath(analysis_dir)
+        self.id = analysis_id
+        self.results_id = results_id
+        self.is_valid = True
+        self.validations = {}
+        dirs = {}
+        for name in sorted(os.listdir(self.dir)):
+            if os.path.isdir(os.path.join(self.dir, name)):
+                dirs[name] = [os.path.join(self.dir, name)]
+        self.analysis_config = {'dirs': dirs}
+        self.static_files = dict([(name, os.path.join(self.dir, filename)) for name, filename in catalogue.static_files.items()])
+
+    def __repr__(self):
+        return(self.id)
+
+    def list_none(self, items):
+        """
+        Gets the only item in a list, ``None`` if the list is empty, or the list itself if it has more than one item
+        """
+        if not items:
+            return(None)
+        if len(items) == 1:
+            return(items[0])
+        return(items)
+
+    def get_dirs(self, name):
+        return(self.analysis_config['dirs'].get(name, []))
+
+    def get_samples(self):
+        """
+        Gets a new object for every sample in the analysis's samples sheet, like ``SnsWESAnalysisOutput.get_samples()``
+        """
+        sampleIDs = []
+        with open(self.static_files['samples_fastq_raw']) as f:
+            for row in csv.reader(f):
+                if row and row[0] not in sampleIDs:
+                    sampleIDs.append(row[0])
+        return([SyntheticSample(id = sampleID, analysis = self) for sampleID in sampleIDs])
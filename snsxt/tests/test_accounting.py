@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``accounting`` module
+"""
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import unittest
+import accounting
+
+qacct_output = """==============================================================
+qname        all.q
+hostname     node001
+jobname      Delly2.Sample1
+jobnumber    4134723
+qsub_time    Tue Feb 13 10:00:00 2018
+start_time   Tue Feb 13 10:05:00 2018
+failed       0
+exit_status  0
+ru_wallclock 100.000s
+cpu          95.500
+maxvmem      1.500G
+==============================================================
+qname        all.q
+hostname     node002
+jobname      Delly2.Sample2
+jobnumber    4134724
+failed       100 : assumedly after job
+exit_status  137
+maxvmem      512.000M
+"""
+
+class TestIterQacctRecords(unittest.TestCase):
+    def test_records(self):
+        records = list(accounting.iter_qacct_records(qacct_output.splitlines(True)))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['jobnumber'], '4134723')
+        self.assertEqual(records[0]['qsub_time'], 'Tue Feb 13 10:00:00 2018')
+        self.assertEqual(records[0]['ru_wallclock'], '100.000s')
+        self.assertEqual(records[1]['failed'], '100 : assumedly after job')
+        self.assertEqual(records[1]['exit_status'], '137')
+
+    def test_empty(self):
+        self.assertEqual(list(accounting.iter_qacct_records([])), [])
+        self.assertEqual(list(accounting.iter_qacct_records(['=' * 62 + '\n'])), [])
+
+
+class TestParseMemory(unittest.TestCase):
+    def test_units(self):
+        self.assertEqual(accounting.parse_memory('1.500G'), 1.5 * 1024 ** 3)
+        self.assertEqual(accounting.parse_memory('512.000M'), 512 * 1024 ** 2)
+        self.assertEqual(accounting.parse_memory('2k'), 2048)
+        self.assertEqual(accounting.parse_memory(' 100 '), 100)
+
+    def test_invalid(self):
+        self.assertIsNone(accounting.parse_memory('NA'))
+        self.assertIsNone(accounting.parse_memory(''))
+
+
+class TestPercentile(unittest.TestCase):
+    def test_interpolation(self):
+        values = [4, 1, 3, 2]
+        self.assertEqual(accounting.percentile(values, 0), 1)
+        self.assertEqual(accounting.percentile(values, 100), 4)
+        self.assertEqual(accounting.percentile(values, 50), 2.5)
+        self.assertAlmostEqual(accounting.percentile(values, 90), 3.7)
+
+    def test_single_and_empty(self):
+        self.assertEqual(accounting.percentile([7], 99), 7)
+        self.assertIsNone(accounting.percentile([], 50))
+
+
+class TestCollect(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # stands in for qacct; writes more to stderr than a pipe holds
+        self.qacct = os.path.join(self.tmp_dir, 'qacct')
+        with open(self.qacct, 'w') as f:
+            f.write('#!{0}\nimport sys\nsys.stderr.write("warning\\n" * 100000)\nsys.stdout.write({1!r})\nsys.exit(0)\n'.format(sys.executable, qacct_output))
+        os.chmod(self.qacct, stat.S_IRWXU)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_collect(self):
+        jobs = {'4134723': {'task': 'Delly2', 'sample': 'Sample1', 'timestamp': 1518534000}, '4134725': {'task': 'Delly2', 'sample': 'Sample3'}}
+        rows = accounting.collect(jobs = jobs, qacct_command = self.qacct)
+        self.assertEqual([(row['job_id'], row['sample'], row['exit_status'], row['wallclock']) for row in rows], [('4134723', 'Sample1', '0', 100.0)])
+        self.assertEqual(rows[0]['wait_time'], 300)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
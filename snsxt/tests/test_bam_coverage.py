@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``bam_coverage`` script
+"""
+import os
+import sys
+import types
+import shutil
+import tempfile
+import unittest
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+# numpy and pysam are only installed on the HPC nodes; empty stand-in modules let the parts of the script that do not use them be tested anywhere
+stub_modules = [name for name, module in [('numpy', numpy), ('pysam', pysam)] if module is None]
+for name in stub_modules:
+    sys.modules[name] = types.ModuleType(name)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'sns_tasks', 'scripts'))
+import bam_coverage
+sys.path.pop(0)
+for name in stub_modules:
+    del sys.modules[name]
+
+class FakeBam(object):
+    """
+    Stands in for a ``pysam.AlignmentFile``; returns the same depths at each position for every region
+    """
+    def __init__(self, depths):
+        self.depths = depths
+        self.calls = []
+
+    def count_coverage(self, chrom, start, stop, quality_threshold, read_callback):
+        self.calls.append((chrom, start, stop, quality_threshold))
+        # the counts of A, C, G, T at each base; the depth is their sum
+        return([[depth // 2 for depth in self.depths], [depth - depth // 2 for depth in self.depths], [0] * len(self.depths), [0] * len(self.depths)])
+
+class FakeRead(object):
+    def __init__(self, flag = 0, mapping_quality = 60):
+        self.flag = flag
+        self.mapping_quality = mapping_quality
+
+
+class TestBamCoverage(unittest.TestCase):
+    def setUp(self):
+        bam_coverage._settings = {'thresholds': [10, 50], 'min_base_quality': 20, 'min_mapping_quality': 20}
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        bam_coverage._bam = None
+        bam_coverage._settings = {}
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_target_label(self):
+        self.assertEqual(bam_coverage.get_target_label('chr1', 1000, 1100), 'chr1:1001-1100')
+        # single base regions have no range
+        self.assertEqual(bam_coverage.get_target_label('chr1', 1000, 1001), 'chr1:1001')
+
+    def test_read_targets(self):
+        targets_file = os.path.join(self.tmp_dir, 'targets.bed')
+        with open(targets_file, 'w') as f:
+            f.write('track name=targets\n# comment\nchr1\t100\t200\tgene1\n\nchr2\t300\t301\n')
+        self.assertEqual(bam_coverage.read_targets(targets_file), [('chr1', 100, 200), ('chr2', 300, 301)])
+
+    def test_init_worker(self):
+        opened = []
+        fake_pysam = types.ModuleType('pysam')
+        fake_pysam.AlignmentFile = lambda path, mode: opened.append((path, mode)) or FakeBam(depths = [])
+        real_pysam = bam_coverage.pysam
+        bam_coverage.pysam = fake_pysam
+        try:
+            bam_coverage._init_worker('Sample1.bam', {'min_mapping_quality': 30})
+        finally:
+            bam_coverage.pysam = real_pysam
+        self.assertEqual(opened, [('Sample1.bam', 'rb')])
+        self.assertEqual(bam_coverage._settings, {'min_mapping_quality': 30})
+        # the mapping quality filter comes from the worker's settings
+        self.assertFalse(bam_coverage._keep_read(FakeRead(mapping_quality = 25)))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_summarize_region(self):
+        bam_coverage._bam = FakeBam(depths = [0, 10, 20, 30, 40, 50, 60, 70])
+        row = bam_coverage.summarize_region(('chr2', 100, 108))
+        self.assertEqual(bam_coverage._bam.calls, [('chr2', 100, 108, 20)])
+        self.assertEqual(row, ['chr2:101-108', 280, '35.00', 280, '35.00', 10, 30, 50, '87.5', '37.5'])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_summarize_region_no_coverage(self):
+        bam_coverage._bam = FakeBam(depths = [0, 0, 0, 0])
+        row = bam_coverage.summarize_region(('chrX', 0, 4))
+        self.assertEqual(row, ['chrX:1-4', 0, '0.00', 0, '0.00', 0, 0, 0, '0.0', '0.0'])
+
+    def test_keep_read(self):
+        self.assertTrue(bam_coverage._keep_read(FakeRead()))
+        # duplicates and low mapping quality reads are not counted
+        self.assertFalse(bam_coverage._keep_read(FakeRead(flag = 0x400)))
+        self.assertFalse(bam_coverage._keep_read(FakeRead(mapping_quality = 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``job_management`` module
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+try:
+    # needs the util submodule
+    import job_management
+    import executors
+    import _exceptions as _e
+except ImportError:
+    job_management = None
+
+@unittest.skipIf(job_management is None, 'the util submodule is not checked out')
+class TestCheckExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = job_management.executor
+        self.task_list = {'sns': {'SnsWes': None}, 'tasks': {'Delly2': None}}
+
+    def tearDown(self):
+        job_management.executor = self.executor
+
+    def test_sge(self):
+        job_management.executor = executors.get_executor('sge')
+        job_management.check_executor(task_list = self.task_list)
+
+    def test_sns_tasks(self):
+        # the sns pipeline's jobs can only be monitored on the cluster
+        for name in ['local', 'dry-run']:
+            job_management.executor = executors.get_executor(name)
+            with self.assertRaises(_e.ArgumentError):
+                job_management.check_executor(task_list = self.task_list)
+
+    def test_no_sns_tasks(self):
+        job_management.executor = executors.get_executor('dry-run')
+        job_management.check_executor(task_list = {'sns': None, 'tasks': {'Delly2': None}})
+
+
+class FakeJob(object):
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+@unittest.skipIf(job_management is None, 'the util submodule is not checked out')
+class TestGuardCommand(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.status_dir = job_management.status_dir
+        job_management.status_dir = self.tmp_dir
+        self.output_file = os.path.join(self.tmp_dir, 'output.txt')
+
+    def tearDown(self):
+        job_management.status_dir = self.status_dir
+        shutil.rmtree(self.tmp_dir)
+
+    def run_command(self, command):
+        with open(os.devnull, 'w') as devnull:
+            return(subprocess.call(['bash', '-c', command], stderr = devnull))
+
+    def test_marks_success(self):
+        command = job_management.guard_command(command = 'echo 1 > "{0}"'.format(self.output_file), name = 'Delly2.Sample1')
+        self.assertEqual(self.run_command(command), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'Delly2.Sample1.ok')))
+        # a failed command keeps its exit status, and is not marked
+        command = job_management.guard_command(command = 'exit 3', name = 'Delly2.Sample2')
+        self.assertEqual(self.run_command(command), 3)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'Delly2.Sample2.ok')))
+
+    def test_held_job(self):
+        hold_jobs = [FakeJob(id = '101', name = 'Delly2.Sample1'), FakeJob(id = '102', name = 'Delly2.Sample2')]
+        command = job_management.guard_command(command = 'echo 1 > "{0}"'.format(self.output_file), name = 'MuTect2Split.Sample1', hold_jobs = hold_jobs)
+        open(os.path.join(self.tmp_dir, 'Delly2.Sample1.ok'), 'w').close()
+        # one of the jobs it waits for failed
+        self.assertEqual(self.run_command(command), 1)
+        self.assertFalse(os.path.exists(self.output_file))
+        open(os.path.join(self.tmp_dir, 'Delly2.Sample2.ok'), 'w').close()
+        self.assertEqual(self.run_command(command), 0)
+        self.assertTrue(os.path.exists(self.output_file))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'MuTect2Split.Sample1.ok')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``job_packing`` module
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import job_packing
+
+def make_command(name, estimate, order, packable = True):
+    return(job_packing.PackedCommand(command = 'echo ' + name, name = name, key = name, estimate = estimate, order = order, submit_kwargs = {}, packable = packable))
+
+
+class FakeJob(object):
+    def __init__(self, id, name, log_dir):
+        self.id = id
+        self.name = name
+        self.log_dir = log_dir
+
+
+class TestPackCommands(unittest.TestCase):
+    def test_first_fit_decreasing(self):
+        commands = [make_command('a', 10, 0), make_command('b', 50, 1), make_command('c', 40, 2), make_command('d', 20, 3)]
+        packs = job_packing.pack_commands(commands = commands, target_runtime = 60)
+        # b (50) + a (10), c (40) + d (20); each pack keeps the order the commands were added in
+        self.assertEqual([[command.name for command in pack] for pack in packs], [['a', 'b'], ['c', 'd']])
+
+    def test_long_command_alone(self):
+        commands = [make_command('a', 100, 0), make_command('b', 10, 1), make_command('c', 10, 2)]
+        packs = job_packing.pack_commands(commands = commands, target_runtime = 60)
+        self.assertEqual([[command.name for command in pack] for pack in packs], [['a'], ['b', 'c']])
+
+    def test_not_packable(self):
+        commands = [make_command('a', 10, 0, packable = False), make_command('b', 10, 1), make_command('c', 10, 2, packable = False)]
+        packs = job_packing.pack_commands(commands = commands, target_runtime = 60)
+        self.assertEqual(sorted([[command.name for command in pack] for pack in packs]), [['a'], ['b'], ['c']])
+
+
+class TestJobPacker(unittest.TestCase):
+    def test_max_duration(self):
+        packer = job_packing.JobPacker(task = 'MuTect2Split', max_duration = 300)
+        packer.history = {'MuTect2Split': {'chr1': [400, 500], 'chr21': [30, 40]}}
+        self.assertFalse(packer.add(command = 'echo 1', name = 'chr1', key = 'chr1').packable)
+        self.assertTrue(packer.add(command = 'echo 21', name = 'chr21', key = 'chr21').packable)
+        # no recorded durations
+        self.assertFalse(packer.add(command = 'echo 22', name = 'chr22', key = 'chr22').packable)
+
+    def test_submit_unpacked(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        submitted = []
+        def submit(command, name, **kwargs):
+            submitted.append((command, name))
+            return(FakeJob(id = len(submitted), name = name, log_dir = log_dir))
+        packer = job_packing.JobPacker(task = 'MuTect2Split', max_duration = 300)
+        packer.history = {'MuTect2Split': {'chr21': [30, 40], 'chr22': [30, 40]}}
+        packer.add(command = 'echo 1', name = 'MuTect2Split.chr1', key = 'chr1', stdout_log_dir = log_dir)
+        packer.add(command = 'echo 21', name = 'MuTect2Split.chr21', key = 'chr21', stdout_log_dir = log_dir)
+        packer.add(command = 'echo 22', name = 'MuTect2Split.chr22', key = 'chr22', stdout_log_dir = log_dir)
+        jobs = packer.submit(submit_func = submit)
+        self.assertEqual(len(jobs), 2)
+        # the command without recorded durations is submitted as it is, under its own name
+        self.assertEqual(submitted[0], ('echo 1', 'MuTect2Split.chr1'))
+        self.assertEqual(job_packing.unpacked_jobs.pop('1'), ('MuTect2Split', 'chr1'))
+        self.assertTrue(submitted[1][1].startswith('MuTect2Split.pack'))
+        self.assertNotIn('2', job_packing.unpacked_jobs)
+
+
+class TestRecordAccountingDurations(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.history_file = os.path.join(self.tmp_dir, 'job_durations.json')
+        job_packing.unpacked_jobs.update({'101': ('MuTect2Split', 'chr1'), '102': ('MuTect2Split', 'chr2'), '103': ('Delly2', None)})
+
+    def tearDown(self):
+        for job_id in ['101', '102', '103']:
+            job_packing.unpacked_jobs.pop(job_id, None)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_record(self):
+        rows = [{'job_id': '101', 'failed': '0', 'exit_status': '0', 'wallclock': 250.4},
+                {'job_id': '102', 'failed': '0', 'exit_status': '1', 'wallclock': 10.0},
+                {'job_id': '103', 'failed': '0', 'exit_status': '0', 'wallclock': 600.0},
+                # not submitted by a packer
+                {'job_id': '104', 'failed': '0', 'exit_status': '0', 'wallclock': 60.0}]
+        job_packing.record_accounting_durations(rows, path = self.history_file)
+        with open(self.history_file) as f:
+            # failed jobs are not recorded
+            self.assertEqual(json.load(f), {'MuTect2Split': {'chr1': [250]}, 'Delly2': {'': [600]}})
+
+
+class PackFilesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.history_file = job_packing.history_file
+        job_packing.history_file = os.path.join(self.log_dir, 'job_durations.json')
+        self.job = FakeJob(id = '1234', name = 'MuTect2Split.pack1.99', log_dir = self.log_dir)
+        self.commands_file, self.status_file = job_packing.get_pack_files(self.job)
+
+    def tearDown(self):
+        job_packing.history_file = self.history_file
+        shutil.rmtree(self.log_dir)
+
+    def write(self, path, lines):
+        with open(path, 'w') as f:
+            f.write(''.join([line + '\n' for line in lines]))
+
+
+class TestReadStatus(PackFilesTestCase):
+    def test_missing(self):
+        self.assertEqual(job_packing.read_status(self.status_file), {})
+
+    def test_last_status_and_bad_lines(self):
+        self.write(self.status_file, [
+        '0\tchr1\t1\t20\t1200',
+        '0\tchr1\t0\t25\t1234',
+        '1\tchr2\tx\t10\t1234',
+        '2\tchr3\t0',
+        '3\tchr4\t0\t5\t1234'
+        ])
+        statuses = job_packing.read_status(self.status_file)
+        self.assertEqual(sorted(statuses.keys()), ['0', '3'])
+        self.assertEqual(statuses['0'], {'name': 'chr1', 'exit_code': 0, 'seconds': 25, 'job_id': '1234'})
+
+
+class TestCheckPack(PackFilesTestCase):
+    def test_not_packed(self):
+        self.assertIsNone(job_packing.check_pack(self.job, task = 'MuTect2Split'))
+
+    def test_failed_and_missing_commands(self):
+        self.write(self.commands_file, ['0\tcmd.chr1\tchr1', '1\tcmd.chr2\tchr2', '2\tcmd.chr3\tchr3', '3\tcmd.chr4\tchr4'])
+        self.write(self.status_file, [
+        # succeeded in an earlier run of the pack; not recorded again
+        '0\tcmd.chr1\t0\t30\t1000',
+        '1\tcmd.chr2\t0\t40\t1234',
+        '2\tcmd.chr3\t137\t50\t1234'
+        ])
+        failed = job_packing.check_pack(self.job, task = 'MuTect2Split')
+        self.assertEqual(failed, [('cmd.chr3', 137), ('cmd.chr4', None)])
+        with open(job_packing.history_file) as f:
+            self.assertEqual(json.load(f), {'MuTect2Split': {'chr2': [40]}})
+
+    def test_all_succeeded(self):
+        self.write(self.commands_file, ['0\tcmd.chr1\tchr1'])
+        self.write(self.status_file, ['0\tcmd.chr1\t0\t30\t1234'])
+        self.assertEqual(job_packing.check_pack(self.job), [])
+        self.assertFalse(os.path.exists(job_packing.history_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``log_scanner`` module
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import config
+import log_scanner
+
+class TestLogScanner(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.scanner = log_scanner.LogScanner(signatures = config.config['log_scanner_signatures'], max_matches = 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_log(self, lines):
+        path = os.path.join(self.tmp_dir, 'job.o1')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return(path)
+
+    def test_killed(self):
+        path = self.write_log([
+        'INFO  12:00:01 Killed 2 duplicate reads',
+        'Killed',
+        '/var/spool/sge/node1/job_scripts/12345: line 12: 34567 Killed                  java -Xmx16G -jar GenomeAnalysisTK.jar'
+        ])
+        matches = self.scanner.scan_file(path, complete = True)
+        # only the shell's message for the killed command
+        self.assertEqual([signature for signature, line in matches], ['killed'])
+        self.assertTrue(matches[0][1].endswith('GenomeAnalysisTK.jar'))
+
+    def test_concurrent_scans(self):
+        path = self.write_log(['step {0}'.format(i) if i % 100 else 'Segmentation fault' for i in range(20000)])
+        results = []
+        def scan():
+            results.append(self.scanner.scan_file(path, complete = True))
+        threads = [threading.Thread(target = scan) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # each line is only counted once, however many scans run at the same time
+        for matches in results:
+            self.assertEqual(len(matches), 200)
+
+    def test_incremental(self):
+        path = self.write_log(['Segmentation fault'])
+        self.assertEqual(len(self.scanner.scan_file(path)), 1)
+        with open(path, 'a') as f:
+            f.write('java.lang.OutOfMemoryError: Java heap space\npartial line')
+        # the last line is left until the file is complete
+        self.assertEqual([signature for signature, line in self.scanner.scan_file(path)], ['segfault', 'java_oom'])
+        self.assertEqual(self.scanner.cache[path]['offset'], os.path.getsize(path) - len('partial line'))
+
+
+if __name__ == '__main__':
+    unittest.main()
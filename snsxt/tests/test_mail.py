@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``mail`` module
+"""
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+try:
+    # needs the util submodule
+    import mail
+except ImportError:
+    mail = None
+
+@unittest.skipIf(mail is None, 'the util submodule is not checked out')
+class TestPackageEmailFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.archive_file = os.path.join(self.tmp_dir, 'attachments.zip')
+        self.file_sizes = []
+        for name, size in [('a.txt', 2000), ('b.txt', 3000)]:
+            path = os.path.join(self.tmp_dir, name)
+            with open(path, 'wb') as f:
+                # does not compress
+                f.write(os.urandom(size))
+            self.file_sizes.append((path, size))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_small(self):
+        items = mail.package_email_files(archive_file = self.archive_file, file_sizes = self.file_sizes, archive_threshold = 10000, max_size = 10000)
+        self.assertEqual(items, [path for path, size in self.file_sizes])
+        self.assertFalse(os.path.exists(self.archive_file))
+
+    def test_archive_overhead(self):
+        compressed_sizes = mail.write_archive(archive_file = self.archive_file, items = [path for path, size in self.file_sizes])
+        # both files fit by their compressed sizes, but not with the archive's headers
+        max_size = sum(compressed_sizes.values()) + 10
+        items = mail.package_email_files(archive_file = self.archive_file, file_sizes = self.file_sizes, archive_threshold = 1000, max_size = max_size)
+        self.assertEqual(items, [self.archive_file])
+        self.assertLessEqual(os.path.getsize(self.archive_file), max_size)
+        self.assertEqual(zipfile.ZipFile(self.archive_file).namelist(), ['a.txt'])
+
+    def test_nothing_fits(self):
+        items = mail.package_email_files(archive_file = self.archive_file, file_sizes = self.file_sizes, archive_threshold = 1000, max_size = 1000)
+        self.assertEqual(items, [])
+        self.assertFalse(os.path.exists(self.archive_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
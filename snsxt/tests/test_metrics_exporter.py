@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``metrics_exporter`` module
+"""
+import unittest
+import metrics_exporter
+
+def make_record(event, timestamp, **fields):
+    record = {'event': event, 'timestamp': timestamp}
+    record.update(fields)
+    return(record)
+
+
+class TestMetricsExporter(unittest.TestCase):
+    def setUp(self):
+        self.exporter = metrics_exporter.MetricsExporter()
+
+    def get_value(self, name):
+        return(dict([(metric, value) for metric, labels, value in self.exporter.get_samples() if not labels])[name])
+
+    def test_validation_backlog(self):
+        self.exporter.update(make_record('validation_queued', 1, task = 'Delly2', files = 4))
+        self.exporter.update(make_record('validation_queued', 2, task = 'MuTect2Split', files = 6))
+        # a task that validates its own output does not change the backlog
+        self.exporter.update(make_record('validation', 3, task = 'SummaryAvgCoverage', files_validated = 2, wall_time = 1.0))
+        self.assertEqual(self.get_value('snsxt_validation_backlog_files'), 10)
+        self.exporter.update(make_record('validation', 4, task = 'background_output_files', files_validated = 10, wall_time = 1.0))
+        self.exporter.update(make_record('validation_dequeued', 4, task = 'background_output_files', files = 10))
+        self.assertEqual(self.get_value('snsxt_validation_backlog_files'), 0)
+        self.assertEqual(self.get_value('snsxt_files_validated_total'), 12)
+
+    def test_failed_validation(self):
+        self.exporter.update(make_record('validation_queued', 1, task = 'Delly2', files = 4))
+        self.exporter.update(make_record('validation', 2, task = 'background_output_files', files_validated = 4, wall_time = 1.0, error = 'ValidationError'))
+        self.exporter.update(make_record('validation_dequeued', 2, task = 'background_output_files', files = 4))
+        self.assertEqual(self.get_value('snsxt_validation_backlog_files'), 0)
+        self.assertEqual(self.get_value('snsxt_files_validated_total'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
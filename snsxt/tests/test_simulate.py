@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``simulate`` module
+"""
+import unittest
+import simulate
+import synthetic_analysis
+
+no_durations = {'durations': {}, 'memory': {}}
+
+def make_jobs(task, durations, cores = 1, memory = 1):
+    return([simulate.SimJob(name = '{0}.{1}'.format(task, i + 1), task = task, commands = [simulate.SimCommand(name = '{0}.{1}'.format(task, i + 1), task = task, unit = 'Sample1', key = '',
+            duration = duration, cores = cores, memory = memory)]) for i, duration in enumerate(durations)])
+
+
+class TestMakeJobs(unittest.TestCase):
+    def setUp(self):
+        self.workload = simulate.make_workload(num_samples = 4, pair_fraction = 1)
+        self.task_commands = simulate.make_commands(tasks = ['MuTect2Split'], workload = self.workload, durations = no_durations, seed = 0)
+
+    def test_chromosome_sharding(self):
+        jobs = simulate.make_jobs(task_commands = self.task_commands, sharding = 'chromosome')['MuTect2Split']
+        # a job per chromosome per pair, as long as the chromosome's share of the targets
+        self.assertEqual(len(jobs), 2 * len(synthetic_analysis.chromosomes))
+        durations = dict([(job.name, job.duration) for job in jobs])
+        self.assertGreater(durations['MuTect2Split.Sample1_Sample2_chr1'], durations['MuTect2Split.Sample1_Sample2_chr21'])
+        self.assertGreater(durations['MuTect2Split.Sample1_Sample2_chr21'], durations['MuTect2Split.Sample1_Sample2_chrY'])
+
+    def test_balanced_sharding(self):
+        chromosome_jobs = simulate.make_jobs(task_commands = self.task_commands, sharding = 'chromosome')['MuTect2Split']
+        jobs = simulate.make_jobs(task_commands = self.task_commands, sharding = 'balanced', shards = 4)['MuTect2Split']
+        self.assertEqual(len(jobs), 2 * 4)
+        self.assertEqual(len(set([round(job.duration, 6) for job in jobs])), 1)
+        # the same total work, split into equal shards
+        self.assertAlmostEqual(sum([job.duration for job in jobs]), sum([job.duration for job in chromosome_jobs]))
+
+    def test_packed(self):
+        jobs = simulate.make_jobs(task_commands = self.task_commands, sharding = 'chromosome', packing = 'packed')['MuTect2Split']
+        self.assertLess(len(jobs), 2 * len(synthetic_analysis.chromosomes))
+        self.assertEqual(sum([job.commands for job in jobs]), 2 * len(synthetic_analysis.chromosomes))
+
+
+class TestSimulate(unittest.TestCase):
+    def test_simulate(self):
+        task_jobs = {'Delly2': make_jobs('Delly2', [100, 100, 100])}
+        result = simulate.simulate(task_jobs = task_jobs, barriers = [], slots = 2, memory = 8, queue_latency = 0, job_overhead = 0, submit_interval = 0)
+        # two jobs run at once, then the third
+        self.assertEqual(result['makespan'], 200)
+        self.assertEqual(result['jobs'], 3)
+        self.assertEqual(result['utilization'], 0.75)
+        self.assertEqual(result['max_queue_wait'], 100)
+
+    def test_barriers(self):
+        def get_task_jobs():
+            return(simulate.collections.OrderedDict([('Delly2', make_jobs('Delly2', [100, 10])), ('BamCoverage', make_jobs('BamCoverage', [10, 10]))]))
+        result = simulate.simulate(task_jobs = get_task_jobs(), barriers = [], slots = 2, memory = 8, queue_latency = 5, job_overhead = 0, submit_interval = 0)
+        self.assertEqual(result['makespan'], 105)
+        # the second task's jobs are only submitted once all of the first task's jobs are done
+        result = simulate.simulate(task_jobs = get_task_jobs(), barriers = ['Delly2'], slots = 2, memory = 8, queue_latency = 5, job_overhead = 0, submit_interval = 0)
+        self.assertEqual(result['makespan'], 120)
+        self.assertEqual(result['tasks']['BamCoverage']['first_start'], 110)
+
+    def test_too_large(self):
+        with self.assertRaises(ValueError):
+            simulate.simulate(task_jobs = {'Delly2': make_jobs('Delly2', [100], memory = 16)}, barriers = [], slots = 2, memory = 8)
+
+    def test_seeded(self):
+        durations = {'durations': {'Delly2': {'': [600, 1200, 1800, 2400]}}, 'memory': {}}
+        task_list = simulate.collections.OrderedDict([('Delly2', None), ('MuTect2Split', None)])
+        workload = simulate.make_workload(num_samples = 10)
+        cluster = {'slots': 16, 'memory': 128, 'queue_latency': 15, 'job_overhead': 10, 'submit_interval': 1}
+        reports = [simulate.run_simulations(task_list = task_list, workload = workload, durations = durations, cluster = cluster, seed = seed) for seed in [1, 1, 2]]
+        self.assertEqual(reports[0], reports[1])
+        self.assertNotEqual(reports[0]['results'], reports[2]['results'])
+        self.assertEqual(len(reports[0]['results']), len(simulate.order_policies) * len(simulate.sharding_policies) * len(simulate.packing_policies))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``sns_tasks`` task manifest
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import sns_tasks
+
+class TestFindTaskModules(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_module(self, name, text):
+        with open(os.path.join(self.tmp_dir, name + '.py'), 'w') as f:
+            f.write(text)
+
+    def test_task_classes_only(self):
+        self.write_module('Coverage', 'from task_classes import QsubSampleTask\nclass Helper(object):\n    pass\n\nclass Coverage(QsubSampleTask):\n    pass\n')
+        # derived from a task class in another module
+        self.write_module('CoverageCustom', 'import Coverage\nclass CoverageCustom(Coverage.Coverage):\n    pass\n')
+        self.write_module('task_classes', 'class QsubSampleTask(object):\n    pass\n')
+        self.assertEqual(sns_tasks.find_task_modules(search_dir = self.tmp_dir), {'Coverage': 'Coverage', 'CoverageCustom': 'CoverageCustom'})
+
+    def test_manifest(self):
+        # every task in the repo's manifest is found by the scan
+        found = sns_tasks.find_task_modules()
+        for task_name, module_name in sns_tasks.task_modules.items():
+            self.assertEqual(found.get(task_name, None), module_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``split_DepthOfCoverage`` script
+"""
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'sns_tasks', 'scripts'))
+import split_DepthOfCoverage
+sys.path.pop(0)
+
+# the interval summary of a DepthOfCoverage run on two samples, with one threshold
+interval_summary = [
+['Target', 'total_coverage', 'average_coverage', 'Sample1_total_cvg', 'Sample1_mean_cvg', 'Sample1_granular_Q1', 'Sample1_%_above_10', 'Sample2_total_cvg', 'Sample2_mean_cvg', 'Sample2_granular_Q1', 'Sample2_%_above_10'],
+['chr1:101-200', '3000', '15.00', '2000', '20.00', '18', '100.0', '1000', '10.00', '9', '50.0'],
+['chr1:301-400', '500', '2.50', '100', '1.00', '1', '0.0', '400', '4.00', '3', '0.0'],
+['chr2:101-200', '6000', '30.00', '4000', '40.00', '38', '100.0', '2000', '20.00', '19', '100.0']
+]
+
+interval_statistics = [
+['Source_of_reads', 'depth>=0', 'depth>=5', 'depth>=10', 'depth>=30'],
+['At_least_1_samples', '3', '2', '2', '1'],
+['At_least_2_samples', '3', '2', '2', '0']
+]
+
+class TestSplitDepthOfCoverage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.tmp_dir, 'batch1')
+        for suffix, rows in [('.sample_interval_summary', interval_summary), ('.sample_interval_statistics', interval_statistics)]:
+            with open(self.prefix + suffix, 'w') as f:
+                csv.writer(f, lineterminator = '\n').writerows(rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read_csv(self, name):
+        with open(os.path.join(self.tmp_dir, name)) as f:
+            return([row for row in csv.reader(f)])
+
+    def test_split_interval_summary(self):
+        mean_coverages = split_DepthOfCoverage.split_interval_summary(prefix = self.prefix, sampleIDs = ['Sample1', 'Sample2'], output_dir = self.tmp_dir)
+        self.assertEqual(mean_coverages, {'Sample1': [20.0, 1.0, 40.0], 'Sample2': [10.0, 4.0, 20.0]})
+        # the totals are the sample's own, in the columns of a single sample run
+        self.assertEqual(self.read_csv('Sample2.sample_interval_summary'), [
+        ['Target', 'total_coverage', 'average_coverage', 'Sample2_total_cvg', 'Sample2_mean_cvg', 'Sample2_granular_Q1', 'Sample2_%_above_10'],
+        ['chr1:101-200', '1000', '10.00', '1000', '10.00', '9', '50.0'],
+        ['chr1:301-400', '400', '4.00', '400', '4.00', '3', '0.0'],
+        ['chr2:101-200', '2000', '20.00', '2000', '20.00', '19', '100.0']
+        ])
+        self.assertEqual(self.read_csv('Sample1.sample_interval_summary')[1], ['chr1:101-200', '2000', '20.00', '2000', '20.00', '18', '100.0'])
+
+    def test_split_interval_summary_missing_sample(self):
+        with self.assertRaises(ValueError):
+            split_DepthOfCoverage.split_interval_summary(prefix = self.prefix, sampleIDs = ['Sample3'], output_dir = self.tmp_dir)
+
+    def test_make_interval_statistics(self):
+        mean_coverages = split_DepthOfCoverage.split_interval_summary(prefix = self.prefix, sampleIDs = ['Sample1', 'Sample2'], output_dir = self.tmp_dir)
+        split_DepthOfCoverage.make_interval_statistics(prefix = self.prefix, mean_coverages = mean_coverages, output_dir = self.tmp_dir)
+        self.assertEqual(self.read_csv('Sample1.sample_interval_statistics'), [interval_statistics[0], ['At_least_1_samples', '3', '2', '2', '1']])
+        self.assertEqual(self.read_csv('Sample2.sample_interval_statistics'), [interval_statistics[0], ['At_least_1_samples', '3', '2', '2', '0']])
+
+
+if __name__ == '__main__':
+    unittest.main()
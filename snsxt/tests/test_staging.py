@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ``staging`` module
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import staging
+
+class StagingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # stands in for the shared filesystem
+        self.shared_dir = os.path.join(self.tmp_dir, 'ifs')
+        self.cache_dir = os.path.join(self.tmp_dir, 'local', 'snsxt_cache')
+        os.makedirs(self.shared_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_file(self, name, size):
+        path = os.path.join(self.shared_dir, name)
+        with open(path, 'w') as f:
+            f.write('x' * size)
+        return(path)
+
+
+class TestStageCache(StagingTestCase):
+    def test_stage(self):
+        bam = self.make_file('Sample1.bam', 100)
+        bai = self.make_file('Sample1.bai', 10)
+        cache = staging.StageCache(cache_dir = self.cache_dir, max_bytes = 1000)
+        local_bam = cache.stage(bam)
+        self.assertTrue(local_bam.startswith(self.cache_dir))
+        self.assertEqual(os.path.basename(local_bam), 'Sample1.bam')
+        # the index file is staged along with the .bam file
+        self.assertTrue(os.path.exists(os.path.join(os.path.dirname(local_bam), 'Sample1.bai')))
+        self.assertEqual((cache.hits, cache.misses, cache.bytes_staged), (0, 1, 110))
+        cache.release()
+
+        # reused from the cache by the next job
+        cache = staging.StageCache(cache_dir = self.cache_dir, max_bytes = 1000)
+        self.assertEqual(cache.stage(bam), local_bam)
+        self.assertEqual((cache.hits, cache.misses, cache.bytes_staged), (1, 0, 0))
+        cache.release()
+
+        # copied again when the original changes
+        with open(bam, 'a') as f:
+            f.write('y')
+        cache = staging.StageCache(cache_dir = self.cache_dir, max_bytes = 1000)
+        cache.stage(bam)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(os.path.getsize(local_bam), 101)
+        cache.release()
+
+    def test_evict(self):
+        paths = [self.make_file('Sample{0}.bam'.format(i), 100) for i in range(3)]
+        # room for two entries; each entry also holds its small stamp file
+        cache = staging.StageCache(cache_dir = self.cache_dir, max_bytes = 350)
+        local_paths = []
+        for i, path in enumerate(paths):
+            local_paths.append(cache.stage(path))
+            # entries are evicted by last use time
+            stamp_file = os.path.join(os.path.dirname(local_paths[-1]), '.source')
+            os.utime(stamp_file, (time.time() - 100 + i, time.time() - 100 + i))
+        cache.release()
+        cache.evict()
+        self.assertFalse(os.path.exists(local_paths[0]))
+        self.assertTrue(os.path.exists(local_paths[1]))
+        self.assertTrue(os.path.exists(local_paths[2]))
+
+    def test_evict_skips_locked_entries(self):
+        paths = [self.make_file('Sample{0}.bam'.format(i), 100) for i in range(2)]
+        cache = staging.StageCache(cache_dir = self.cache_dir, max_bytes = 0)
+        local_paths = [cache.stage(path) for path in paths]
+        cache.evict()
+        self.assertTrue(all(os.path.exists(path) for path in local_paths))
+        cache.release()
+        cache.evict()
+        self.assertFalse(any(os.path.exists(path) for path in local_paths))
+
+
+class TestRunStaged(StagingTestCase):
+    def read_stats(self, stats_file):
+        with open(stats_file) as f:
+            return([dict(zip(staging.stats_fields, line.rstrip('\n').split('\t'))) for line in f])
+
+    def test_paths_rewritten(self):
+        bam = self.make_file('Sample1.bam', 100)
+        output_dir = os.path.join(self.shared_dir, 'output')
+        os.makedirs(output_dir)
+        output_prefix = os.path.join(output_dir, 'Sample1')
+        stats_file = os.path.join(self.tmp_dir, 'snsxt_staging.tsv')
+        # the command records the paths it was given, and writes two files with the output prefix
+        command = 'echo {0} > {1}.paths; echo {1} >> {1}.paths; cat {0} > {1}.txt'.format(bam, output_prefix)
+        exit_code = staging.run_staged(command = command, inputs = [bam], outputs = [output_prefix],
+                                        cache_dir = self.cache_dir, max_bytes = 1000, shared_prefixes = [self.shared_dir],
+                                        stats_file = stats_file, task = 'Delly2')
+        self.assertEqual(exit_code, 0)
+        with open(output_prefix + '.paths') as f:
+            input_path, output_path = f.read().split()
+        self.assertTrue(input_path.startswith(self.cache_dir))
+        self.assertNotEqual(os.path.dirname(output_path), output_dir)
+        self.assertEqual(os.path.basename(output_path), 'Sample1')
+        self.assertEqual(os.path.getsize(output_prefix + '.txt'), 100)
+        stats = self.read_stats(stats_file)
+        self.assertEqual(len(stats), 1)
+        self.assertEqual((stats[0]['task'], stats[0]['exit_code'], stats[0]['cache_misses'], stats[0]['bytes_staged']), ('Delly2', '0', '1', '100'))
+
+    def test_outputs_not_copied_on_failure(self):
+        output_prefix = os.path.join(self.shared_dir, 'Sample1')
+        exit_code = staging.run_staged(command = 'echo foo > {0}.txt; exit 3'.format(output_prefix), inputs = [], outputs = [output_prefix],
+                                        cache_dir = self.cache_dir, max_bytes = 1000, shared_prefixes = [self.shared_dir])
+        self.assertEqual(exit_code, 3)
+        self.assertFalse(os.path.exists(output_prefix + '.txt'))
+
+    def test_stats_written_on_error(self):
+        stats_file = os.path.join(self.tmp_dir, 'snsxt_staging.tsv')
+        call = staging.subprocess.call
+        def fail(*args, **kwargs):
+            raise OSError('no shell')
+        staging.subprocess.call = fail
+        try:
+            self.assertRaises(OSError, staging.run_staged, command = 'true', inputs = [], outputs = [],
+                            cache_dir = self.cache_dir, max_bytes = 1000, stats_file = stats_file, task = 'Delly2')
+        finally:
+            staging.subprocess.call = call
+        stats = self.read_stats(stats_file)
+        self.assertEqual((stats[0]['task'], stats[0]['exit_code']), ('Delly2', ''))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,7 @@ import os
 from util import log
 from util import tools
 import logging
+import metrics
 import _exceptions as _e
 
 logger = logging.getLogger(__name__)
@@ -27,7 +28,13 @@ def validate_background_output_files():
     """
     if background_output_files:
         logger.debug('Background output files will be validated')
-        validate_items(items = background_output_files)
+        try:
+            with metrics.timer('validation', task = 'background_output_files', files_validated = len(background_output_files)) as validation_metrics:
+                validate_items(items = background_output_files)
+                validation_metrics['bytes_written'] = metrics.get_bytes(background_output_files)
+        finally:
+            # the files are no longer waiting to be validated, whether or not they were valid
+            metrics.record('validation_dequeued', task = 'background_output_files', files = len(background_output_files))
     else:
         logger.debug('No background jobs were found for validation')
 